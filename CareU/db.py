@@ -0,0 +1,22 @@
+# CareU/db.py
+"""Database helpers shared by the apps."""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def add_deltas(model, lookup, deltas, create=True):
+    """
+    Add `deltas` ({field: amount}) to the `model` row matching `lookup` with
+    one F() UPDATE. If no row matches and `create` is set, insert one holding
+    the deltas; when a concurrent writer wins that insert, the delta is added
+    on top of its row instead.
+    """
+    rows = model._default_manager.filter(**lookup)
+    increments = {name: F(name) + delta for name, delta in deltas.items()}
+    if rows.update(**increments) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model._default_manager.create(**lookup, **deltas)
+    except IntegrityError:
+        rows.update(**increments)
@@ -79,6 +79,16 @@ DATABASES = {
     }
 }
 
+# --------------------------------------------------------------------------------------
+# Authentication backends
+# --------------------------------------------------------------------------------------
+# ProfileModelBackend loads request.user with its Profile in one query. It
+# subclasses ModelBackend, so listing ModelBackend too would only make a
+# failed login check the password a second time.
+AUTHENTICATION_BACKENDS = [
+    'usermanagement.backends.ProfileModelBackend',
+]
+
 # --------------------------------------------------------------------------------------
 # Password validation
 # --------------------------------------------------------------------------------------
@@ -0,0 +1,126 @@
+# healthdata/activity_level.py
+"""
+Activity level inferred from ActivityData step and active-minute history.
+
+The level is classified from the daily averages over the last WINDOW_DAYS
+(needs MIN_DAYS days with data) and stored on Profile.inferred_activity_level,
+which HealthCalculator.get_activity_level prefers over the self-reported
+level. It is one of the target inputs, so a change bumps the profile version
+and the memoized TDEE/protein targets are recomputed once, not per call.
+
+Each ActivityData write re-infers its user (one aggregate over at most
+WINDOW_DAYS days); `manage.py rebuild_activity_levels` re-infers everyone
+(one of the nightly jobs listed in healthdata.scheduler).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from usermanagement.models import Profile
+from .models import ActivityData
+from .reminders_engine import HealthCalculator
+
+WINDOW_DAYS = 14
+MIN_DAYS = 7
+
+LEVELS = [choice for choice, _ in Profile.ACTIVITY_CHOICES]
+
+# Daily average from which a level starts, highest first
+STEP_LEVELS = (
+    ('very_active', 12500),
+    ('active', 10000),
+    ('moderate', 7500),
+    ('light', 5000),
+    ('sedentary', 0),
+)
+ACTIVE_MINUTE_LEVELS = (
+    ('very_active', 75),
+    ('active', 45),
+    ('moderate', 22),  # ~150 min/week
+    ('light', 10),
+    ('sedentary', 0),
+)
+
+
+def classify(days, steps, active_minutes):
+    """
+    Activity level for `days` logged days with the given totals, or None
+    with too little data. The higher of the step and active-minute levels wins.
+    """
+    if days < MIN_DAYS:
+        return None
+    by_steps = next(level for level, floor in STEP_LEVELS if steps / days >= floor)
+    by_minutes = next(level for level, floor in ACTIVE_MINUTE_LEVELS if active_minutes / days >= floor)
+    return max(by_steps, by_minutes, key=LEVELS.index)
+
+
+def window_totals(user_ids, today=None, days=WINDOW_DAYS):
+    """{user_id: (days, steps, active_minutes)} over the last `days` days, in one grouped query."""
+    today = today or timezone.localdate()
+    rows = (
+        ActivityData.objects
+        .filter(user_id__in=list(user_ids), date__gt=today - timedelta(days=days), date__lte=today)
+        .order_by()
+        .values('user_id')
+        .annotate(days=Count('date', distinct=True), steps=Sum('steps'), minutes=Sum('active_minutes'))
+        .values_list('user_id', 'days', 'steps', 'minutes')
+    )
+    return {user_id: (days, steps or 0, minutes or 0) for user_id, days, steps, minutes in rows}
+
+
+def infer_level(user_id, today=None):
+    totals = window_totals([user_id], today).get(user_id)
+    return classify(*totals) if totals else None
+
+
+def refresh_activity_level(user_id):
+    """
+    Re-infer one user's level and save it if it changed (the profile save
+    recomputes the targets). Returns True if the level changed.
+    """
+    level = infer_level(user_id)
+    profile = Profile.objects.filter(user_id=user_id).first()
+    if profile is None or profile.inferred_activity_level == level:
+        return False
+    profile.inferred_activity_level = level
+    profile.save(update_fields=['inferred_activity_level'])
+    return True
+
+
+def rebuild_activity_levels(user_ids=None, batch_size=1000):
+    """
+    Re-infer the level of every profile (or the given user ids), in batches.
+    Changed profiles get a version bump and fresh targets in one
+    bulk_update per batch. Returns the number of profiles changed.
+    """
+    today = timezone.localdate()
+    profiles = Profile.objects.order_by('pk')
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=list(user_ids))
+
+    changed = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so the version bumps and targets below can't race a save
+            batch = list(profiles.select_for_update().filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            totals = window_totals([profile.user_id for profile in batch], today)
+
+            updated = []
+            for profile in batch:
+                level = classify(*totals[profile.user_id]) if profile.user_id in totals else None
+                if profile.inferred_activity_level != level:
+                    profile.inferred_activity_level = level
+                    profile.version += 1
+                    HealthCalculator.store_targets(profile)
+                    updated.append(profile)
+            Profile.objects.bulk_update(
+                updated, ['inferred_activity_level', 'version', *Profile.TARGET_FIELDS], batch_size=batch_size
+            )
+        changed += len(updated)
+    return changed
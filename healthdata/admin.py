@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import NutritionEntry, HealthReminder, ActivityData, SleepData, HealthMetrics
+from .models import (
+    NutritionEntry, HealthReminder, ActivityData, SleepData, HealthMetrics, ReminderRefresh,
+    DailyNutritionSummary, RuleEvaluationState, VitalBaseline, SleepRollup,
+)
 
 
 @admin.register(NutritionEntry)
@@ -38,7 +41,7 @@ class HealthReminderAdmin(admin.ModelAdmin):
             'fields': ('user', 'reminder_type', 'priority', 'title')
         }),
         ('Content', {
-            'fields': ('message', 'explanation', 'actionable_steps')
+            'fields': ('message', 'template_id', 'template_params', 'explanation', 'actionable_steps')
         }),
         ('Status', {
             'fields': ('created_at', 'dismissed_at', 'acted_upon', 'acted_upon_at')
@@ -68,3 +71,45 @@ class HealthMetricsAdmin(admin.ModelAdmin):
     list_display = ('user', 'logged_at', 'weight_kg', 'heart_rate_resting')
     list_filter = ('logged_at',)
     search_fields = ('user__username',)
+
+@admin.register(ReminderRefresh)
+class ReminderRefreshAdmin(admin.ModelAdmin):
+    list_display = ('user', 'changed_at', 'last_run_at', 'is_pending', 'pending_rules')
+    search_fields = ('user__username',)
+    readonly_fields = ('changed_at', 'last_run_at', 'pending_rules')
+
+    def is_pending(self, obj):
+        return obj.is_pending
+
+    is_pending.boolean = True
+    is_pending.short_description = 'Pending'
+
+@admin.register(DailyNutritionSummary)
+class DailyNutritionSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'calories', 'protein_g', 'carbs_g', 'fat_g', 'entry_count')
+    list_filter = ('date',)
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+
+
+@admin.register(RuleEvaluationState)
+class RuleEvaluationStateAdmin(admin.ModelAdmin):
+    list_display = ('user', 'rule', 'evaluated_on', 'triggered', 'updated_at')
+    list_filter = ('rule', 'triggered')
+    search_fields = ('user__username',)
+    readonly_fields = ('watermark', 'evaluated_on', 'triggered', 'updated_at')
+
+
+@admin.register(VitalBaseline)
+class VitalBaselineAdmin(admin.ModelAdmin):
+    list_display = ('user', 'metric', 'samples', 'mean', 'variance', 'last_value', 'last_logged_at')
+    list_filter = ('metric',)
+    search_fields = ('user__username',)
+    readonly_fields = ('samples', 'mean', 'variance', 'recent', 'last_value', 'last_logged_at', 'updated_at')
+
+
+@admin.register(SleepRollup)
+class SleepRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'computed_on', 'nights_7', 'avg_total_7', 'avg_total_30', 'regularity_index', 'flags')
+    list_filter = ('computed_on',)
+    search_fields = ('user__username',)
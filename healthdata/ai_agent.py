@@ -1,21 +1,23 @@
 # healthdata/ai_agent.py
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass
-from datetime import timedelta
-from typing import Callable, List, Optional
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
 from django.contrib.auth import get_user_model
 
-from healthdata.models import NutritionEntry
-try:
-    from healthdata.models import ActivityData, SleepData, HealthMetrics  # present in your repo after pull
-except Exception:  # keep resilient if someone renames/removes a model
-    ActivityData = None
-    SleepData = None
-    HealthMetrics = None
-
-from usermanagement.models import ProviderAlert
+from healthdata import instrumentation, vectorized
+from healthdata.models import (
+    ActivityData, DailyNutritionSummary, HealthMetrics, NutritionEntry, RuleEvaluationState, SleepData,
+    SleepRollup,
+)
+from healthdata.rules import RuleOutcome, RuleSpec, compile_rules
+from usermanagement.models import ConsentingUser, ProviderAlert
 
 User = get_user_model()
 
@@ -28,112 +30,425 @@ class RuleResult:
     message: str
     provider_hint: Optional[str] = None
 
+    @classmethod
+    def from_spec(cls, spec: RuleSpec, triggered: bool) -> "RuleResult":
+        return cls(
+            triggered,
+            alert_type=spec.alert_type,
+            severity=spec.severity,
+            message=spec.message,
+            provider_hint=spec.provider_hint,
+        )
+
+    @classmethod
+    def from_outcome(cls, outcome: RuleOutcome) -> "RuleResult":
+        return cls.from_spec(outcome.spec, outcome.triggered)
+
+
+# Input tables a rule may declare in `reads`, with the column that moves
+# whenever a row is added or edited
+WATERMARK_FIELDS = {
+    NutritionEntry: "updated_at",
+    ActivityData: "updated_at",
+    SleepData: "updated_at",
+    HealthMetrics: "updated_at",
+}
+
+# Derived tables, watermarked through the table they are maintained from
+ROLLUP_INPUTS = {
+    DailyNutritionSummary: NutritionEntry,
+    SleepRollup: SleepData,
+}
+
 
 @dataclass
 class RiskRule:
     name: str
     evaluator: Callable[[User], RuleResult]
     enabled: bool = True
+    spec: Optional[RuleSpec] = None    # set for declarative rules (compiled to SQL)
+    dedup_hours: int = 24
+    reads: Tuple[type, ...] = ()       # input tables; rules without any are never skipped
 
-
-def _sustained_low_calories(user: User) -> RuleResult:
-    qs = NutritionEntry.objects.filter(user=user).order_by("-logged_at")[:7]
-    if not qs:
-        return RuleResult(False, "", "", "")
-    avg_cal = sum(e.calories for e in qs) / len(qs)
-    if avg_cal < 1000:  # demo threshold; make configurable later
-        return RuleResult(
-            True,
-            alert_type="Nutrition:LowIntake",
-            severity="moderate",
-            message="Calorie intake is consistently low over ~1 week.",
-            provider_hint="Discuss nutrition sufficiency and fatigue/dehydration risks."
+    @classmethod
+    def from_spec(cls, spec: RuleSpec) -> "RiskRule":
+        return cls(
+            spec.name,
+            partial(_evaluate_spec, spec),
+            enabled=spec.enabled,
+            spec=spec,
+            dedup_hours=spec.dedup_hours,
+            reads=(ROLLUP_INPUTS.get(spec.source, spec.source),),
         )
-    return RuleResult(False, "", "", "")
-
-
-def _activity_drop(user: User) -> RuleResult:
-    if ActivityData is None:
-        return RuleResult(False, "", "", "")
-    end = timezone.now().date()
-    mid = end - timedelta(days=7)
-    start = mid - timedelta(days=7)
-
-    w2 = ActivityData.objects.filter(user=user, date__gt=mid, date__lte=end)
-    w1 = ActivityData.objects.filter(user=user, date__gt=start, date__lte=mid)
-
-    def total_steps(qs): return sum(getattr(a, "steps", 0) or 0 for a in qs)
-    t1, t2 = total_steps(w1), total_steps(w2)
-    if t1 > 0 and t2 < 0.6 * t1:
-        return RuleResult(
-            True,
-            alert_type="Activity:SharpDrop",
-            severity="moderate",
-            message="Activity dropped >40% vs prior week.",
-            provider_hint="Explore reasons (injury/illness/schedule). Consider gentle ramp-up."
-        )
-    return RuleResult(False, "", "", "")
-
-
-def _sleep_insufficient(user: User) -> RuleResult:
-    if SleepData is None:
-        return RuleResult(False, "", "", "")
-    last = list(SleepData.objects.filter(user=user).order_by("-date")[:5])
-    if not last:
-        return RuleResult(False, "", "", "")
-    bad = sum(1 for s in last if (getattr(s, "duration_hours", 0) or 0) < 5)
-    if bad >= 3:
-        return RuleResult(
-            True,
-            alert_type="Sleep:Insufficient",
-            severity="info",
-            message="Frequent short sleep across recent nights.",
-            provider_hint="Reinforce sleep hygiene; review stress/schedule factors."
-        )
-    return RuleResult(False, "", "", "")
+
+    @property
+    def stats_name(self) -> str:
+        return f"agent.{self.name}"
+
+    def watermark(self, watermarks: Dict[type, str]) -> str:
+        return "|".join(watermarks[model] for model in self.reads)
 
 
-RULES: List[RiskRule] = [
-    RiskRule("Sustained Low Calories", _sustained_low_calories, enabled=True),
-    RiskRule("Sharp Activity Drop", _activity_drop, enabled=True),
-    RiskRule("Insufficient Sleep", _sleep_insufficient, enabled=True),
+def _evaluate_spec(spec: RuleSpec, user: User) -> RuleResult:
+    """Evaluate a single declarative rule for one user (standalone use)."""
+    outcome, = compile_rules([spec]).evaluate_user(user)
+    return RuleResult.from_outcome(outcome)
+
+
+RULE_SPECS: List[RuleSpec] = [
+    RuleSpec(
+        "Sustained Low Calories",
+        metric="daily_calories", window_days=7, aggregate="avg",
+        comparator="lt", threshold=1000,  # demo threshold; make configurable later
+        severity="moderate",
+        alert_type="Nutrition:LowIntake",
+        message="Calorie intake is consistently low over ~1 week.",
+        provider_hint="Discuss nutrition sufficiency and fatigue/dehydration risks.",
+    ),
+    RuleSpec(
+        "Sharp Activity Drop",
+        metric="steps", window_days=7, aggregate="sum",
+        comparator="lt", threshold=0.6, baseline_offset_days=7,  # >40% below prior week
+        severity="moderate",
+        alert_type="Activity:SharpDrop",
+        message="Activity dropped >40% vs prior week.",
+        provider_hint="Explore reasons (injury/illness/schedule). Consider gentle ramp-up.",
+    ),
+    RuleSpec(
+        "Insufficient Sleep",
+        # 3+ nights under 5h in the last 5, from a rollup computed today or
+        # yesterday (i.e. before tonight's rebuild)
+        metric="short_sleep_nights", window_days=2, aggregate="max",
+        comparator="gte", threshold=3,
+        severity="info",
+        alert_type="Sleep:Insufficient",
+        message="Frequent short sleep across recent nights.",
+        provider_hint="Reinforce sleep hygiene; review stress/schedule factors.",
+    ),
+    RuleSpec(
+        "Irregular Sleep Schedule",
+        metric="sleep_regularity", window_days=7, aggregate="min",
+        comparator="lt", threshold=60,  # regularity index (0-100) from the sleep rollup
+        severity="info",
+        alert_type="Sleep:Irregular",
+        message="Bed and wake times vary widely from night to night.",
+        provider_hint="Discuss a consistent sleep schedule; check shift work or travel.",
+    ),
 ]
 
+RULES: List[RiskRule] = [RiskRule.from_spec(spec) for spec in RULE_SPECS]
+
+# Rule groups aevaluate_user runs at the same time (one DB connection each)
+ASYNC_RULE_CONCURRENCY = 4
+
+# Instrumentation names of the shared queries behind declarative rules
+COMPILED_RULES_STATS = "agent.(compiled rules)"
+COHORT_RULES_STATS = "agent.(cohort rules)"
 
-def _recent_duplicate_exists(user: User, alert_type: str, hours: int = 24) -> bool:
+
+def run_rules(user: User, rules: Optional[List[RiskRule]] = None) -> List[Tuple[RiskRule, RuleResult]]:
+    """
+    Evaluate enabled rules for a user.
+    Declarative rules are compiled together (one grouped query per source
+    table, however many rules); custom evaluators are called one by one.
+    """
+    rules = [rule for rule in (RULES if rules is None else rules) if rule.enabled]
+    declarative = [rule for rule in rules if rule.spec is not None]
+
+    outcomes = {}
+    if declarative:
+        with instrumentation.measure(COMPILED_RULES_STATS):
+            compiled = compile_rules(rule.spec for rule in declarative)
+            outcomes = {o.spec.name: o for o in compiled.evaluate_user(user)}
+
+    results = []
+    for rule in rules:
+        if rule.spec is not None:
+            outcome = outcomes.get(rule.spec.name)
+            if outcome is None:
+                continue  # spec itself disabled
+            result = RuleResult.from_outcome(outcome)
+            instrumentation.record(rule.stats_name, calls=1, triggered=int(result.triggered))
+        else:
+            with instrumentation.measure(rule.stats_name) as measurement:
+                result = rule.evaluator(user)
+                measurement.triggered = result.triggered
+        results.append((rule, result))
+    return results
+
+
+def _dedup_window_hours(rules) -> int:
+    return max((rule.dedup_hours for rule in rules), default=24)
+
+
+def _recent_alerts_query(user_ids, hours: Optional[int] = None):
+    if hours is None:
+        hours = _dedup_window_hours(RULES)
     cutoff = timezone.now() - timedelta(hours=hours)
-    return ProviderAlert.objects.filter(
-        user=user, alert_type=alert_type, created_at__gte=cutoff
-    ).exists()
+    return (
+        ProviderAlert.objects
+        .filter(user_id__in=list(user_ids), created_at__gte=cutoff)
+        .order_by()
+        .values("user_id", "alert_type")
+        .annotate(last=Max("created_at"))
+        .values_list("user_id", "alert_type", "last")
+    )
 
 
-def evaluate_user(user: User) -> List[ProviderAlert]:
-    """Run enabled rules for a user, consent-aware, suppress dupes, create ProviderAlert rows."""
-    created: List[ProviderAlert] = []
+def recent_alert_times(user_ids, hours: Optional[int] = None) -> Dict[Tuple[int, str], datetime]:
+    """
+    Latest alert per (user, alert type) within the last `hours` (default:
+    the longest dedup window of RULES), for any number of users in one
+    grouped query (scalars only).
+    """
+    rows = _recent_alerts_query(user_ids, hours)
+    return {(user_id, alert_type): last for user_id, alert_type, last in rows}
 
-    # Gate by consent on Profile (matches your current consent flow)
-    try:
-        if not bool(getattr(user.profile, "data_sharing_consent", False)):
-            return created
-    except Exception:
-        # If profile missing in dev, don't block
-        pass
-
-    for rule in RULES:
-        if not rule.enabled:
-            continue
-        res = rule.evaluator(user)
-        if not res.triggered:
-            continue
-        if _recent_duplicate_exists(user, res.alert_type, hours=24):
+
+def _new_alerts(user: User, results: List[Tuple[RiskRule, RuleResult]], last_sent=None) -> List[ProviderAlert]:
+    """
+    Unsaved ProviderAlerts for the triggered results, minus recent dupes.
+    `last_sent` is a prefetched recent_alert_times() covering this user;
+    fetched here (one query) when not given.
+    """
+    triggered = [(rule, res) for rule, res in results if res.triggered]
+    if not triggered:
+        return []
+    if last_sent is None:
+        last_sent = recent_alert_times([user.pk], hours=_dedup_window_hours(rule for rule, _ in triggered))
+
+    alerts: List[ProviderAlert] = []
+    now = timezone.now()
+    for rule, res in triggered:
+        last = last_sent.get((user.pk, res.alert_type))
+        if last is not None and last >= now - timedelta(hours=rule.dedup_hours):
+            instrumentation.record(rule.stats_name, suppressed=1)
             continue
-        with transaction.atomic():
-            hint = f"\n\nHint for provider: {res.provider_hint}" if getattr(res, "provider_hint", None) else ""
-            alert = ProviderAlert.objects.create(
-                user=user,
-                alert_type=res.alert_type,
-                message=f"{res.message}{hint}",
-                severity=res.severity,  # 'low' | 'moderate' | 'high'
+        hint = f"\n\nHint for provider: {res.provider_hint}" if getattr(res, "provider_hint", None) else ""
+        alerts.append(ProviderAlert(
+            user=user,
+            alert_type=res.alert_type,
+            message=f"{res.message}{hint}",
+            severity=res.severity,  # 'low' | 'moderate' | 'high'
+        ))
+    return alerts
+
+
+def save_alerts(alerts: List[ProviderAlert]) -> List[ProviderAlert]:
+    """Write collected alerts (any number of users) with one bulk insert."""
+    if not alerts:
+        return []
+    with transaction.atomic():
+        return ProviderAlert.objects.bulk_create(alerts, batch_size=500)
+
+
+def data_watermarks(user: User, tables) -> Dict[type, str]:
+    """
+    Fingerprint (row count, newest timestamp) of the user's rows in each
+    table, in one query. Any insert, edit or delete changes it.
+    """
+    tables = list(tables)
+    columns = {}
+    for i, model in enumerate(tables):
+        rows = model.objects.filter(user=OuterRef("pk")).order_by().values("user")
+        columns[f"rows_{i}"] = Subquery(rows.annotate(n=Count("pk")).values("n"))
+        columns[f"last_{i}"] = Subquery(rows.annotate(last=Max(WATERMARK_FIELDS[model])).values("last"))
+    values = User.objects.filter(pk=user.pk).values(**columns).get()
+
+    watermarks = {}
+    for i, model in enumerate(tables):
+        last = values[f"last_{i}"]
+        watermarks[model] = f"{values[f'rows_{i}'] or 0}:{last.isoformat() if last else ''}"
+    return watermarks
+
+
+def _stale_rules(user: User, rules: List[RiskRule]):
+    """
+    Split off the rules whose inputs changed since they last ran.
+    Returns (rules to run, {rule name: watermark to record}).
+    """
+    tracked = [rule for rule in rules if rule.reads]
+    if not tracked:
+        return rules, {}
+
+    watermarks = data_watermarks(user, {model for rule in tracked for model in rule.reads})
+    marks = {rule.name: rule.watermark(watermarks) for rule in tracked}
+    states = {
+        state.rule: state
+        for state in RuleEvaluationState.objects.filter(user=user, rule__in=list(marks))
+    }
+    today = timezone.localdate()
+    stale = []
+    for rule in rules:
+        if rule.reads and rule.name in states and states[rule.name].is_current(marks[rule.name], today):
+            instrumentation.record(rule.stats_name, skipped=1)
+        else:
+            stale.append(rule)
+    return stale, marks
+
+
+def _record_states(user: User, outcomes: Dict[str, bool], marks: Dict[str, str]) -> None:
+    """Upsert the watermark each rule was just evaluated against (one query)."""
+    today = timezone.localdate()
+    RuleEvaluationState.objects.bulk_create(
+        [
+            RuleEvaluationState(
+                user=user, rule=name, watermark=marks[name], evaluated_on=today, triggered=triggered,
             )
-            created.append(alert)
-    return created
+            for name, triggered in outcomes.items() if name in marks
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "rule"],
+        update_fields=["watermark", "evaluated_on", "triggered", "updated_at"],
+    )
+
+
+def run_if_changed(user: User, name: str, reads, check: Callable[[User], object], force: bool = False):
+    """
+    Memoize a custom check the same way as the agent's rules: call
+    check(user) only if the `reads` tables changed, the day rolled over, or
+    its last call returned something. Returns the result, or None if skipped.
+    """
+    rule = RiskRule(name, check, reads=tuple(reads))
+    stale, marks = ([rule], {}) if force else _stale_rules(user, [rule])
+    if not stale:
+        return None
+    result = check(user)
+    if marks:
+        _record_states(user, {name: result is not None}, marks)
+    return result
+
+
+def evaluate_user(user: User, force: bool = False, save: bool = True, last_sent=None,
+                  only=None, consented: Optional[bool] = None) -> List[ProviderAlert]:
+    """
+    Run enabled rules for a user, consent-aware, suppress dupes, create ProviderAlert rows.
+    Rules whose input tables are unchanged since their last (non-triggered)
+    run today are skipped; force=True runs everything. `only` restricts the
+    run to the named rules (the rule worker passes the queued ones).
+    Sweeps pass save=False to collect the (unsaved) alerts of many users
+    for one save_alerts() call, a prefetched `last_sent`, and `consented`
+    from one ConsentingUser lookup for the whole batch.
+    """
+    # Gate by consent (the materialized ConsentingUser set)
+    if consented is None:
+        consented = ConsentingUser.includes(user.pk)
+    if not consented:
+        return []
+
+    rules = [rule for rule in RULES if rule.enabled and (only is None or rule.name in only)]
+    marks = {}
+    if not force:
+        rules, marks = _stale_rules(user, rules)
+    if not rules:
+        return []
+
+    results = run_rules(user, rules)
+    alerts = _new_alerts(user, results, last_sent)
+    if marks:
+        _record_states(user, {rule.name: res.triggered for rule, res in results}, marks)
+    return save_alerts(alerts) if save else alerts
+
+
+def evaluate_users(users, save: bool = True, last_sent=None, consenting=None) -> List[ProviderAlert]:
+    """
+    evaluate_user for a batch of users (the nightly sweep), consent-aware.
+    Every enabled rule runs (no memoization). With NumPy installed,
+    declarative rules are evaluated as arrays over the whole batch (one
+    query per source table, windows ending today) and only custom rules run
+    per user; without it each user goes through run_rules(). `consenting`
+    is a prefetched ConsentingUser.among() of the batch.
+    """
+    users = list(users)
+    if consenting is None:
+        consenting = ConsentingUser.among(user.pk for user in users)
+    users = [user for user in users if user.pk in consenting]
+    rules = [rule for rule in RULES if rule.enabled]
+    if not users or not rules:
+        return []
+    if last_sent is None:
+        last_sent = recent_alert_times([user.pk for user in users], hours=_dedup_window_hours(rules))
+
+    alerts: List[ProviderAlert] = []
+    if not vectorized.available():
+        for user in users:
+            alerts.extend(_new_alerts(user, run_rules(user, rules), last_sent))
+        return save_alerts(alerts) if save else alerts
+
+    specs = [rule.spec for rule in rules if rule.spec is not None and rule.spec.enabled]
+    with instrumentation.measure(COHORT_RULES_STATS):
+        cohort, outcomes = vectorized.evaluate_cohort(specs, (user.pk for user in users))
+    triggered: Dict[int, List[RiskRule]] = {}
+    for rule in rules:
+        if rule.spec is None or rule.spec.name not in outcomes:
+            continue
+        rows = vectorized.np.flatnonzero(outcomes[rule.spec.name].triggered)
+        instrumentation.record(rule.stats_name, calls=len(cohort), triggered=len(rows))
+        for user_id in cohort.user_ids[rows].tolist():
+            triggered.setdefault(user_id, []).append(rule)
+
+    custom = [rule for rule in rules if rule.spec is None]
+    for user in users:
+        results = [(rule, RuleResult.from_spec(rule.spec, True)) for rule in triggered.get(user.pk, [])]
+        if custom:
+            results.extend(run_rules(user, custom))
+        alerts.extend(_new_alerts(user, results, last_sent))
+    return save_alerts(alerts) if save else alerts
+
+
+def _rule_groups(rules: List[RiskRule]) -> List[List[RiskRule]]:
+    """
+    Split rules into groups that can run concurrently: declarative rules
+    share one compiled query per source table, custom rules run alone.
+    """
+    groups: Dict[object, List[RiskRule]] = {}
+    for rule in rules:
+        key = rule.spec.source if rule.spec is not None else rule.name
+        groups.setdefault(key, []).append(rule)
+    return list(groups.values())
+
+
+def _run_rules_in_thread(user: User, rules: List[RiskRule]) -> List[Tuple[RiskRule, RuleResult]]:
+    # Runs on an executor thread with its own connection; don't leave it open
+    try:
+        return run_rules(user, rules)
+    finally:
+        connections.close_all()
+
+
+async def aevaluate_user(user: User, force: bool = False,
+                         concurrency: int = ASYNC_RULE_CONCURRENCY) -> List[ProviderAlert]:
+    """
+    Async evaluate_user for ASGI views: same rules, memoization and dedup.
+    Single queries use the async ORM; independent rule groups run
+    concurrently on executor threads, at most `concurrency` at a time, so
+    the event loop is never blocked by a rule query.
+    """
+    if not await ConsentingUser.objects.filter(user_id=user.pk).aexists():
+        return []
+
+    rules = [rule for rule in RULES if rule.enabled]
+    marks = {}
+    if not force:
+        rules, marks = await sync_to_async(_stale_rules)(user, rules)
+    if not rules:
+        return []
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_group(group):
+        async with semaphore:
+            return await sync_to_async(_run_rules_in_thread, thread_sensitive=False)(user, group)
+
+    batches = await asyncio.gather(*(run_group(group) for group in _rule_groups(rules)))
+    results = [pair for batch in batches for pair in batch]
+
+    triggered = [rule for rule, res in results if res.triggered]
+    last_sent = {}
+    if triggered:
+        rows = _recent_alerts_query([user.pk], hours=_dedup_window_hours(triggered))
+        last_sent = {(user_id, alert_type): last async for user_id, alert_type, last in rows}
+    alerts = _new_alerts(user, results, last_sent)
+    if marks:
+        await sync_to_async(_record_states)(user, {rule.name: res.triggered for rule, res in results}, marks)
+    return await ProviderAlert.objects.abulk_create(alerts) if alerts else []
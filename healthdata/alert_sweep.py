@@ -0,0 +1,165 @@
+# healthdata/alert_sweep.py
+"""
+Nightly provider-alert sweep: ai_agent.evaluate_user for every consenting user.
+
+User ids are split into chunks and fanned out to a process pool; every
+worker opens its own database connection and commits each chunk's alerts
+in one transaction. With NumPy installed a chunk's declarative rules are
+evaluated as arrays (ai_agent.evaluate_users); a chunk that fails that way
+is retried user by user. Progress is checkpointed to a JSON file after each
+chunk, so an interrupted run resumes after the last finished chunk instead
+of starting over (re-evaluating a chunk is harmless: alerts are deduped).
+"""
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# No module-level model access: under "spawn" this module is imported by
+# the workers before django.setup() has run.
+
+
+def _init_worker():
+    # Under "spawn" the child starts from scratch; under "fork" setup() is a
+    # no-op and only the inherited connections have to go.
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _evaluate_chunk(user_ids, force=False):
+    """Worker: evaluate one chunk. Returns (last_user_id, users, alerts, failed_ids)."""
+    from healthdata import vectorized
+    from healthdata.ai_agent import evaluate_user, evaluate_users, recent_alert_times, save_alerts
+    from usermanagement.models import ConsentingUser
+
+    alerts = []
+    failed = []
+    users = list(get_user_model().objects.filter(pk__in=user_ids).order_by("pk"))
+    # One consent lookup, one dedup prefetch and one bulk insert for the
+    # whole chunk (consent may have been withdrawn since the sweep started)
+    consenting = ConsentingUser.among(user_ids)
+    last_sent = recent_alert_times(user_ids)
+    one_by_one = users
+    with transaction.atomic():
+        if vectorized.available():
+            try:
+                with transaction.atomic():
+                    alerts = evaluate_users(users, save=False, last_sent=last_sent, consenting=consenting)
+                one_by_one = []
+            except Exception:
+                logger.exception("Cohort evaluation failed for users %s-%s; retrying one by one",
+                                 user_ids[0], user_ids[-1])
+        for user in one_by_one:
+            try:
+                with transaction.atomic():
+                    alerts.extend(evaluate_user(
+                        user, force=force, save=False, last_sent=last_sent, consented=user.pk in consenting,
+                    ))
+            except Exception:
+                logger.exception("Provider-alert evaluation failed for user %s", user.pk)
+                failed.append(user.pk)
+        created = save_alerts(alerts)
+    return user_ids[-1], len(user_ids), len(created), failed
+
+
+class Checkpoint:
+    """Sweep progress, persisted as JSON (written atomically)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {
+            "started_at": timezone.now().isoformat(),
+            "last_user_id": 0,
+            "users": 0,
+            "alerts": 0,
+            "failed": [],
+        }
+
+    @classmethod
+    def load(cls, path):
+        checkpoint = cls(path)
+        if os.path.exists(path):
+            with open(path) as fh:
+                checkpoint.state.update(json.load(fh))
+        return checkpoint
+
+    @property
+    def resumed(self):
+        return self.state["last_user_id"] > 0
+
+    def advance(self, last_user_id, users, alerts, failed):
+        self.state["last_user_id"] = last_user_id
+        self.state["users"] += users
+        self.state["alerts"] += alerts
+        self.state["failed"].extend(failed)
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.state, fh)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ProviderAlertSweep:
+    """
+    Run evaluate_user for all consenting users with a process pool.
+    With workers=1 the chunks run in-process (no pool). SQLite allows a
+    single writer at a time, so on SQLite the sweep always runs in-process.
+    """
+
+    def __init__(self, checkpoint_path, workers=4, chunk_size=500, force=False):
+        self.checkpoint_path = checkpoint_path
+        self.workers = 1 if connection.vendor == "sqlite" else workers
+        self.chunk_size = chunk_size
+        self.force = force
+
+    def pending_user_ids(self, after=0):
+        from usermanagement.models import ConsentingUser
+
+        return list(ConsentingUser.ids().filter(user_id__gt=after).order_by("user_id"))
+
+    def chunks(self, user_ids):
+        return [user_ids[i:i + self.chunk_size] for i in range(0, len(user_ids), self.chunk_size)]
+
+    def run(self, progress=None):
+        """
+        Sweep (or resume) and return the final checkpoint state.
+        `progress(state)` is called after each finished chunk.
+        """
+        checkpoint = Checkpoint.load(self.checkpoint_path)
+        chunks = self.chunks(self.pending_user_ids(after=checkpoint.state["last_user_id"]))
+
+        if self.workers > 1 and len(chunks) > 1:
+            # Workers must not share the parent's connections
+            connections.close_all()
+            with multiprocessing.Pool(self.workers, initializer=_init_worker) as pool:
+                # imap keeps chunk order, so the checkpoint only moves past
+                # chunks that are finished together with all before them
+                for result in pool.imap(partial(_evaluate_chunk, force=self.force), chunks):
+                    checkpoint.advance(*result)
+                    if progress:
+                        progress(checkpoint.state)
+        else:
+            for chunk in chunks:
+                checkpoint.advance(*_evaluate_chunk(chunk, force=self.force))
+                if progress:
+                    progress(checkpoint.state)
+
+        state = dict(checkpoint.state)
+        checkpoint.clear()
+        return state
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class HealthdataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'healthdata'
\ No newline at end of file
+    name = 'healthdata'
+
+    def ready(self):
+        # Import signals so they register with Django
+        from . import signals  # noqa: F401
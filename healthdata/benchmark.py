@@ -0,0 +1,235 @@
+# healthdata/benchmark.py
+"""
+Synthetic-population benchmark for the reminder and alert engines.
+
+seed_population() writes a reproducible population (fixed RNG seed) of
+`bench_` users with profiles, nutrition, activity, sleep and vitals;
+run_benchmark() then calls each engine once per user and reports queries
+per user, p50/p99 latency and throughput, and deletes the users it seeded
+(only those) unless asked to keep them. The `benchmark_engines`
+management command wraps it and writes the report as JSON so runs can be
+compared.
+"""
+import math
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from usermanagement.models import ConsentingUser, Profile
+from usermanagement.utils import detect_health_patterns
+from . import ai_agent
+from .activity_level import rebuild_activity_levels
+from .models import ActivityData, HealthMetrics, NutritionEntry, SleepData
+from .reminders_engine import ReminderEngine
+from .rollups import rebuild_summaries
+from .sleep_analytics import rebuild_rollups
+from .vitals import rebuild_baselines
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench_'
+
+# Engine name -> callable(user); each is run once per seeded user
+ENGINES = {
+    'reminder_engine': lambda user: ReminderEngine(user).analyze_and_create_reminders(),
+    'ai_agent': ai_agent.evaluate_user,
+    'detect_health_patterns': detect_health_patterns,
+}
+
+
+@dataclass
+class PopulationConfig:
+    users: int = 200
+    days: int = 14
+    entries_per_day: int = 3
+    consent_ratio: float = 0.5
+    seed: int = 42
+
+
+def seed_population(config, batch_size=1000):
+    """
+    Create the synthetic population and return the new user ids.
+    Rows are bulk-inserted, so the derived data (daily nutrition, sleep
+    rollups, vital baselines, inferred activity levels, the consenting-user
+    set) is rebuilt afterwards instead of being maintained on write.
+    """
+    rng = random.Random(config.seed)
+    today = timezone.localdate()
+    run_tag = f"{USERNAME_PREFIX}{config.seed}_{uuid.uuid4().hex[:12]}_"
+    meals = [choice for choice, _ in NutritionEntry.MEAL_CHOICES]
+    activity_levels = [choice for choice, _ in Profile.ACTIVITY_CHOICES]
+
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [User(username=f"{run_tag}{i}", password=make_password(None)) for i in range(config.users)],
+            batch_size=batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=run_tag).order_by('pk').values_list('pk', flat=True)
+        )
+
+        profiles, entries, activity, sleep, vitals = [], [], [], [], []
+        for user_id in user_ids:
+            consented = rng.random() < config.consent_ratio
+            weight = rng.uniform(50, 110)
+            profiles.append(Profile(
+                user_id=user_id,
+                age=rng.randint(18, 80),
+                height_cm=rng.randint(150, 200),
+                weight_kg=round(weight, 2),
+                sex=rng.choice(['male', 'female']),
+                activity_level=rng.choice(activity_levels),
+                data_sharing_consent=consented,
+                consent_timestamp=timezone.now() if consented else None,
+            ))
+
+            # Per-user baselines, so some users trip each rule
+            daily_calories = rng.choice([800, 1600, 2200, 2800])
+            daily_steps = rng.choice([2000, 6000, 10000])
+            sleep_minutes = rng.choice([270, 400, 480])
+            bedtime_spread = rng.choice([10, 45, 150])  # minutes
+            # The most recent week walks less for half of the population
+            walks_less = rng.random() < 0.5
+            for offset in range(config.days):
+                day = today - timedelta(days=offset)
+                if rng.random() < 0.85:
+                    meal_count = max(0, round(rng.gauss(config.entries_per_day, 1)))
+                    for _ in range(meal_count):
+                        entries.append(NutritionEntry(
+                            user_id=user_id,
+                            logged_at=day,
+                            meal_type=rng.choice(meals),
+                            calories=max(0, round(rng.gauss(daily_calories / max(meal_count, 1), 80))),
+                            protein_g=round(rng.uniform(5, 45), 2) if rng.random() < 0.9 else None,
+                            carbs_g=round(rng.uniform(10, 90), 2),
+                            fat_g=round(rng.uniform(5, 40), 2),
+                        ))
+                slowdown = 0.4 if offset < 7 and walks_less else 1.0
+                activity.append(ActivityData(
+                    user_id=user_id,
+                    date=day,
+                    steps=max(0, round(rng.gauss(daily_steps * slowdown, 800))),
+                    active_minutes=rng.randint(0, 90),
+                ))
+                total_sleep = max(0, round(rng.gauss(sleep_minutes, 40)))
+                bedtime = timezone.make_aware(datetime.combine(day, datetime.min.time())) - timedelta(
+                    minutes=round(rng.gauss(60, bedtime_spread))
+                )
+                sleep.append(SleepData(
+                    user_id=user_id,
+                    date=day,
+                    total_sleep_minutes=total_sleep,
+                    deep_sleep_minutes=round(total_sleep * rng.uniform(0.05, 0.25)),
+                    rem_sleep_minutes=round(total_sleep * rng.uniform(0.15, 0.25)),
+                    awake_minutes=rng.randint(5, 80),
+                    bedtime_start=bedtime,
+                    bedtime_end=bedtime + timedelta(minutes=total_sleep),
+                ))
+                vitals.append(HealthMetrics(
+                    user_id=user_id,
+                    logged_at=timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=8)),
+                    weight_kg=round(weight + rng.uniform(-1, 1), 2),
+                    heart_rate_resting=rng.randint(50, 90),
+                    blood_pressure_systolic=rng.randint(100, 150),
+                    blood_pressure_diastolic=rng.randint(60, 95),
+                ))
+
+        # Profiles are normally created by the User post_save signal
+        Profile.objects.filter(user_id__in=user_ids).delete()
+        Profile.objects.bulk_create(profiles, batch_size=batch_size)
+        NutritionEntry.objects.bulk_create(entries, batch_size=batch_size)
+        ActivityData.objects.bulk_create(activity, batch_size=batch_size)
+        SleepData.objects.bulk_create(sleep, batch_size=batch_size)
+        HealthMetrics.objects.bulk_create(vitals, batch_size=batch_size)
+
+    rebuild_summaries(user_ids)
+    rebuild_rollups(user_ids)
+    rebuild_baselines(user_ids)
+    rebuild_activity_levels(user_ids)
+    ConsentingUser.rebuild(user_ids)
+    return user_ids
+
+
+def delete_population(user_ids, batch_size=500):
+    """Delete the given seeded users (and, by cascade, their data)."""
+    user_ids = list(user_ids)
+    deleted = 0
+    for start in range(0, len(user_ids), batch_size):
+        count, _ = User.objects.filter(pk__in=user_ids[start:start + batch_size]).delete()
+        deleted += count
+    return deleted
+
+
+class QueryCounter:
+    """execute_wrapper that counts the queries issued while installed."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def time_engine(engine, user_ids):
+    """Run `engine` once per user. Returns its latency/query summary."""
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for user in User.objects.filter(pk__in=user_ids).order_by('pk').iterator():
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            call_started = time.perf_counter()
+            engine(user)
+            latencies.append(time.perf_counter() - call_started)
+        queries.append(counter.count)
+    total = time.perf_counter() - started
+
+    if not latencies:
+        return {'users': 0}
+    return {
+        'users': len(latencies),
+        'total_seconds': round(total, 4),
+        'throughput_users_per_second': round(len(latencies) / total, 2) if total else None,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'queries_per_user': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def run_benchmark(config, engines=None, keep=False):
+    """
+    Seed a population, time each engine over it and return the report
+    (a JSON-serializable dict). The seeded users are deleted afterwards
+    unless `keep` is set.
+    """
+    engines = engines or list(ENGINES)
+
+    started = time.perf_counter()
+    user_ids = seed_population(config)
+    seed_seconds = time.perf_counter() - started
+
+    try:
+        return {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'config': asdict(config),
+            'seed_seconds': round(seed_seconds, 3),
+            'engines': {name: time_engine(ENGINES[name], user_ids) for name in engines},
+        }
+    finally:
+        if not keep:
+            delete_population(user_ids)
@@ -0,0 +1,247 @@
+# healthdata/cohort_export.py
+"""
+Anonymized cohort export for insurers.
+
+Consenting profiles are grouped into cohorts by age band, sex and activity
+level (inferred level first, as for the targets). Each cohort gets the mean
+and standard deviation of its members' daily averages over the last
+`days` days: nutrition (DailyNutritionSummary), activity (ActivityData)
+and sleep (SleepData). Cohorts with fewer than `k` members are suppressed,
+and so is any statistic that fewer than `k` members contribute to.
+
+Profiles are read with iterator(chunk_size=...) ordered by cohort key, so
+every cohort is contiguous: the aggregates of each chunk of users come from
+one grouped query per table, each cohort is written out (one NDJSON line)
+as soon as the next one starts, and memory stays flat however many users
+have consented. The file is written to a temporary name and moved into
+place when complete.
+"""
+import json
+import math
+import os
+import tempfile
+from datetime import timedelta
+
+from django.db.models import Avg, Case, CharField, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from usermanagement.models import ConsentingUser, Profile
+from .activity_level import window_totals
+from .models import DailyNutritionSummary, SleepData
+
+FORMAT_VERSION = 1
+DEFAULT_K = 10
+DEFAULT_DAYS = 30
+DEFAULT_CHUNK_SIZE = 2000
+
+# (exclusive upper bound, label); ages at or above the last bound are "70+"
+AGE_BANDS = ((18, '<18'), (30, '18-29'), (40, '30-39'), (50, '40-49'), (60, '50-59'), (70, '60-69'))
+OLDEST_BAND = '70+'
+UNKNOWN = 'unknown'
+
+# Published statistics per group, in the order of the per-user metric tuples
+NUTRITION_STATS = ('calories', 'protein_g', 'carbs_g', 'fat_g')
+ACTIVITY_STATS = ('steps', 'active_minutes')
+SLEEP_STATS = ('total_sleep_minutes', 'deep_sleep_minutes', 'rem_sleep_minutes')
+STAT_GROUPS = {'nutrition': NUTRITION_STATS, 'activity': ACTIVITY_STATS, 'sleep': SLEEP_STATS}
+
+
+def age_band(age):
+    """Python twin of the SQL banding in _cohort_profiles()."""
+    if age is None:
+        return UNKNOWN
+    return next((label for bound, label in AGE_BANDS if age < bound), OLDEST_BAND)
+
+
+def cohort_key(profile):
+    """(age band, sex, activity level) of a profile, as used by the export."""
+    return (
+        age_band(profile.age),
+        profile.sex or UNKNOWN,
+        profile.inferred_activity_level or profile.activity_level or 'sedentary',
+    )
+
+
+def _cohort_profiles():
+    """Consenting profiles annotated with their cohort key, ordered by it."""
+    band = Case(
+        *[When(age__lt=bound, then=Value(label)) for bound, label in AGE_BANDS],
+        When(age__isnull=False, then=Value(OLDEST_BAND)),
+        default=Value(UNKNOWN),
+        output_field=CharField(),
+    )
+    return (
+        Profile.objects
+        .filter(user_id__in=ConsentingUser.ids())
+        .annotate(
+            age_band=band,
+            sex_key=Coalesce('sex', Value(UNKNOWN)),
+            level=Coalesce('inferred_activity_level', 'activity_level', Value('sedentary')),
+        )
+        .order_by('age_band', 'sex_key', 'level', 'user_id')
+        .values_list('user_id', 'age_band', 'sex_key', 'level')
+    )
+
+
+class RunningStat:
+    """Streaming count/mean/SD (Welford)."""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def as_dict(self, k):
+        if self.n < k:
+            return None  # too few contributors to publish
+        sd = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return {'n': self.n, 'mean': round(self.mean, 2), 'sd': round(sd, 2)}
+
+
+class CohortAccumulator:
+    def __init__(self, key):
+        self.key = key
+        self.users = 0
+        self.stats = {group: {name: RunningStat() for name in names} for group, names in STAT_GROUPS.items()}
+
+    def add(self, metrics):
+        """metrics: {group: tuple of per-user daily averages (None = no data)}."""
+        self.users += 1
+        for group, values in metrics.items():
+            if values is None:
+                continue
+            for stat, value in zip(self.stats[group].values(), values):
+                if value is not None:
+                    stat.add(float(value))
+
+    def as_record(self, k):
+        age, sex, level = self.key
+        return {
+            'type': 'cohort',
+            'age_band': age,
+            'sex': sex,
+            'activity_level': level,
+            'users': self.users,
+            **{
+                group: {name: stat.as_dict(k) for name, stat in stats.items()}
+                for group, stats in self.stats.items()
+            },
+        }
+
+
+def _chunk_metrics(user_ids, today, days):
+    """{user_id: {group: per-user daily averages}} for one chunk (one query per table)."""
+    since = today - timedelta(days=days)
+    metrics = {user_id: dict.fromkeys(STAT_GROUPS) for user_id in user_ids}
+
+    nutrition = (
+        DailyNutritionSummary.objects
+        .filter(user_id__in=user_ids, date__gt=since, date__lte=today, entry_count__gt=0)
+        .order_by()
+        .values('user_id')
+        .annotate(*[Avg(name) for name in NUTRITION_STATS])
+        .values_list('user_id', *[f'{name}__avg' for name in NUTRITION_STATS])
+    )
+    for user_id, *values in nutrition:
+        metrics[user_id]['nutrition'] = values
+
+    for user_id, (logged, steps, minutes) in window_totals(user_ids, today, days=days).items():
+        metrics[user_id]['activity'] = (steps / logged, minutes / logged)
+
+    sleep = (
+        SleepData.objects
+        .filter(user_id__in=user_ids, date__gt=since, date__lte=today)
+        .order_by()
+        .values('user_id')
+        .annotate(*[Avg(name) for name in SLEEP_STATS])
+        .values_list('user_id', *[f'{name}__avg' for name in SLEEP_STATS])
+    )
+    for user_id, *values in sleep:
+        metrics[user_id]['sleep'] = values
+    return metrics
+
+
+class CohortExport:
+    """Stream the k-anonymized cohort statistics to an NDJSON file."""
+
+    def __init__(self, path, k=DEFAULT_K, days=DEFAULT_DAYS, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.k = k
+        self.days = days
+        self.chunk_size = chunk_size
+
+    def run(self):
+        """Write the export and return its summary record."""
+        today = timezone.localdate()
+        summary = {
+            'type': 'summary',
+            'cohorts': 0,
+            'users': 0,
+            'suppressed_cohorts': 0,
+            'suppressed_users': 0,
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as sink:
+                self._write(sink, {
+                    'type': 'header',
+                    'format_version': FORMAT_VERSION,
+                    'generated_at': timezone.now().isoformat(),
+                    'window_days': self.days,
+                    'window_end': today.isoformat(),
+                    'k': self.k,
+                    'cohort_keys': ['age_band', 'sex', 'activity_level'],
+                    'statistics': {group: list(names) for group, names in STAT_GROUPS.items()},
+                })
+                current = None
+                for chunk in self._chunks():
+                    metrics = _chunk_metrics([user_id for user_id, _ in chunk], today, self.days)
+                    for user_id, key in chunk:
+                        if current is None or current.key != key:
+                            self._flush(sink, current, summary)
+                            current = CohortAccumulator(key)
+                        current.add(metrics[user_id])
+                self._flush(sink, current, summary)
+                self._write(sink, summary)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return summary
+
+    def _chunks(self):
+        chunk = []
+        for user_id, *key in _cohort_profiles().iterator(chunk_size=self.chunk_size):
+            chunk.append((user_id, tuple(key)))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _flush(self, sink, cohort, summary):
+        if cohort is None:
+            return
+        if cohort.users < self.k:
+            summary['suppressed_cohorts'] += 1
+            summary['suppressed_users'] += cohort.users
+            return
+        summary['cohorts'] += 1
+        summary['users'] += cohort.users
+        self._write(sink, cohort.as_record(self.k))
+
+    @staticmethod
+    def _write(sink, record):
+        sink.write(json.dumps(record, separators=(',', ':')))
+        sink.write('\n')
@@ -0,0 +1,147 @@
+# healthdata/explanations.py
+"""
+Registry of health reminder explanation templates.
+
+HealthReminder rows store only a template id and a small parameter dict;
+the explanation text and actionable steps are rendered from this registry
+when a reminder is displayed (see HealthReminder.rendered_explanation).
+The registry is built once at import and rendered output is cached.
+"""
+import json
+from functools import lru_cache
+
+
+class ExplanationTemplate:
+    """Explanation text plus actionable steps, as str.format templates."""
+
+    def __init__(self, explanation, steps=()):
+        self.explanation = explanation.strip()
+        self.steps = tuple(steps)
+
+    def render(self, params):
+        return (
+            self.explanation.format_map(params),
+            tuple(step.format_map(params) for step in self.steps),
+        )
+
+
+TEMPLATES = {
+    'low_calories': ExplanationTemplate(
+        """
+Your recent average of {avg_calories:.0f} calories per day is significantly below
+your recommended target of {target_calories:.0f} calories per day (calculated based
+on your profile: {age}yo, {weight_kg}kg, {height_cm}cm,
+{activity} activity level).
+
+Consistently low calorie intake can lead to:
+
+• Decreased energy levels and chronic fatigue
+• Loss of muscle mass (your body breaks down muscle for fuel)
+• Weakened immune system and slower recovery
+• Slower metabolism (your body adapts to low energy)
+• Nutrient deficiencies affecting overall health
+• Difficulty concentrating and mood changes
+
+Your body needs adequate fuel to function optimally, support your daily activities,
+maintain muscle mass, and protect your long-term health.
+        """,
+        steps=[
+            'Target: {target_calories:.0f} calories per day',
+            'Add ~{deficit:.0f} calories through healthy foods',
+            'Add a healthy snack between meals (nuts, yogurt, fruit)',
+            'Include more calorie-dense healthy foods (avocado, olive oil, nut butters)',
+            'Review your portion sizes - you might be underestimating',
+            'Consider consulting a nutritionist if this pattern continues',
+        ],
+    ),
+    'logging_gaps': ExplanationTemplate(
+        """
+You've logged meals on only {days_logged} out of the last {total_days} days.
+Consistent tracking is crucial for understanding your nutrition patterns because:
+
+• It reveals hidden habits and trends you might not notice day-to-day
+• It helps identify what's working and what needs adjustment
+• It provides accurate data for personalized recommendations
+• It keeps you accountable to your health goals
+• It helps detect concerning patterns early
+
+Think of logging as taking your health's "vital signs" - sporadic measurements
+make it difficult to get an accurate picture of your overall wellness. Even if
+you're not perfect every day, consistent tracking gives us the data needed to
+provide truly personalized guidance.
+        """,
+        steps=[
+            'Set a daily reminder on your phone to log meals',
+            'Log meals immediately after eating (don\'t wait until end of day)',
+            'Start small: commit to logging just breakfast every day this week',
+            'Use the app\'s quick-entry feature for common meals',
+            'Goal: Log at least 6 out of 7 days per week',
+        ],
+    ),
+    'low_protein': ExplanationTemplate(
+        """
+Your average protein intake of {avg_protein:.1f}g per day is below your recommended
+target of {target_protein:.0f}g per day (calculated as {protein_per_kg:.1f}g
+per kg body weight for your {activity} activity level).
+
+Adequate protein is essential for:
+
+• Building and repairing muscle tissue after activity
+• Supporting immune function and fighting illness
+• Maintaining healthy skin, hair, and nails
+• Producing enzymes and hormones your body needs
+• Keeping you feeling full and satisfied (reducing snacking)
+• Preserving muscle mass during weight loss
+• Recovery and adaptation from exercise
+
+Protein needs increase with activity level. Your target is personalized based on
+your weight ({weight_kg}kg) and activity patterns.
+        """,
+        steps=[
+            'Target: {target_protein:.0f}g protein per day',
+            'Increase by ~{deficit:.0f}g daily',
+            'Add Greek yogurt to breakfast (15-20g protein)',
+            'Include lean chicken or fish at lunch (25-30g)',
+            'Snack on nuts or cheese (5-10g)',
+            'Consider a protein shake if needed (20-25g)',
+        ],
+    ),
+    'profile_incomplete': ExplanationTemplate(
+        """
+To provide you with personalized, accurate health recommendations, we need some
+basic information about you: your age, weight, height, and sex.
+
+This data allows us to:
+
+• Calculate your Basal Metabolic Rate (BMR) - calories needed at rest
+• Determine your Total Daily Energy Expenditure (TDEE)
+• Set personalized targets for calories, protein, and macronutrients
+• Detect concerning patterns specific to YOUR body
+• Give advice that's actually relevant to your situation
+
+Without this information, any recommendations would be generic and potentially
+inaccurate for your specific needs. Your data is private and only used to
+personalize YOUR experience.
+        """,
+        steps=[
+            'Go to your profile settings',
+            'Fill in missing information: {fields}',
+            'Update your activity level if available',
+            'Save your changes to unlock personalized insights',
+        ],
+    ),
+}
+
+
+@lru_cache(maxsize=1024)
+def _render(template_id, params_json):
+    return TEMPLATES[template_id].render(json.loads(params_json))
+
+
+def render(template_id, params=None):
+    """
+    Render (explanation, steps) for a template id and its parameters.
+    Raises KeyError for unknown template ids.
+    """
+    explanation, steps = _render(template_id, json.dumps(params or {}, sort_keys=True))
+    return explanation, list(steps)
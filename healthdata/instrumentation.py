@@ -0,0 +1,145 @@
+# healthdata/instrumentation.py
+"""
+Per-rule timing and hit-rate counters for the ai_agent rules and the
+ReminderEngine checks.
+
+Every measured call adds its wall time and query count to an in-process
+table keyed by rule name, together with how often the rule fired and how
+often a firing was suppressed as a duplicate. Counters live in the
+current process only (each web/worker process has its own); read them
+with stats(), the staff-only /api/rule-stats/ endpoint or
+`manage.py rule_stats`.
+
+Declarative agent rules share one compiled query per table: the query is
+timed as "agent.(compiled rules)" and the rules themselves only count
+calls and outcomes.
+
+The cost per call is two perf_counter() reads, one execute_wrapper and a
+lock-protected dict update, and no extra queries. Set
+HEALTH_RULE_INSTRUMENTATION = False to switch it off.
+
+Reminder duplicates are dropped by the database (ignore_conflicts), which
+doesn't say which rows it dropped; counting them per rule takes one extra
+read per reminder pass, so it is only done while profiling: with
+HEALTH_RULE_COUNT_DUPLICATES = True, or inside count_duplicates() (which
+`manage.py rule_stats` uses).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+from django.db import connection
+
+
+@dataclass
+class RuleStats:
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    queries: int = 0
+    triggered: int = 0
+    suppressed: int = 0   # fired, but a recent duplicate existed
+    skipped: int = 0      # not evaluated: inputs unchanged since the last run
+
+    def as_dict(self):
+        data = asdict(self)
+        data["avg_ms"] = round(self.seconds / self.calls * 1000, 3) if self.calls else None
+        data["max_ms"] = round(self.max_seconds * 1000, 3)
+        data["queries_per_call"] = round(self.queries / self.calls, 2) if self.calls else None
+        data["trigger_rate"] = round(self.triggered / self.calls, 4) if self.calls else None
+        data["suppression_rate"] = round(self.suppressed / self.triggered, 4) if self.triggered else None
+        del data["seconds"], data["max_seconds"]
+        return data
+
+
+_lock = threading.Lock()
+_stats = {}
+_counting = threading.local()
+
+
+def enabled():
+    return getattr(settings, "HEALTH_RULE_INSTRUMENTATION", True)
+
+
+def counting_duplicates():
+    """True when reminder duplicates should be looked up and counted (profiling only)."""
+    return enabled() and (
+        getattr(_counting, "active", False) or getattr(settings, "HEALTH_RULE_COUNT_DUPLICATES", False)
+    )
+
+
+@contextmanager
+def count_duplicates():
+    """Count reminder duplicates in this thread for the duration of the block."""
+    previous = getattr(_counting, "active", False)
+    _counting.active = True
+    try:
+        yield
+    finally:
+        _counting.active = previous
+
+
+def _update(rule, **counts):
+    with _lock:
+        entry = _stats.setdefault(rule, RuleStats())
+        for field, value in counts.items():
+            if field == "max_seconds":
+                entry.max_seconds = max(entry.max_seconds, value)
+            else:
+                setattr(entry, field, getattr(entry, field) + value)
+
+
+class Measurement:
+    """Handed out by measure(); set `triggered` once the outcome is known."""
+
+    def __init__(self):
+        self.queries = 0
+        self.triggered = False
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure(rule):
+    """Time one evaluation of `rule`, counting its queries."""
+    measurement = Measurement()
+    if not enabled():
+        yield measurement
+        return
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(measurement):
+        yield measurement
+    elapsed = time.perf_counter() - started
+    _update(
+        rule,
+        calls=1,
+        seconds=elapsed,
+        max_seconds=elapsed,
+        queries=measurement.queries,
+        triggered=int(bool(measurement.triggered)),
+    )
+
+
+def record(rule, calls=0, triggered=0, suppressed=0, skipped=0):
+    """
+    Count outcomes that were not timed on their own: rules evaluated inside
+    a shared batch (timed as a whole), suppressions and skips.
+    """
+    if enabled():
+        _update(rule, calls=calls, triggered=triggered, suppressed=suppressed, skipped=skipped)
+
+
+def stats():
+    """{rule: counters} for this process, sorted by rule name."""
+    with _lock:
+        return {rule: entry.as_dict() for rule, entry in sorted(_stats.items())}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,43 @@
+# healthdata/management/commands/export_insurer_cohorts.py
+from django.core.management.base import BaseCommand
+
+from healthdata.cohort_export import DEFAULT_CHUNK_SIZE, DEFAULT_DAYS, DEFAULT_K, CohortExport
+
+
+class Command(BaseCommand):
+    help = "Export k-anonymized cohort statistics of consenting users as NDJSON (for insurers)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="insurer_cohorts.ndjson",
+            help="File to write (replaced atomically; default: insurer_cohorts.ndjson).",
+        )
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=DEFAULT_K,
+            help=f"Minimum cohort size; smaller cohorts are suppressed (default: {DEFAULT_K}).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=DEFAULT_DAYS,
+            help=f"Window of the daily averages, in days (default: {DEFAULT_DAYS}).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Profiles read per chunk (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        summary = CohortExport(
+            options["output"], k=options["k"], days=options["days"], chunk_size=options["chunk_size"],
+        ).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {summary['cohorts']} cohort(s) covering {summary['users']} user(s) to "
+            f"{options['output']}; suppressed {summary['suppressed_cohorts']} cohort(s) "
+            f"({summary['suppressed_users']} user(s)) below k={options['k']}."
+        ))
@@ -0,0 +1,27 @@
+# healthdata/management/commands/generate_reminders.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from healthdata.reminders_engine import ReminderSweep
+
+
+class Command(BaseCommand):
+    help = "Run the reminder rules for every user in batches (nightly sweep)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users evaluated per grouped query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked, written = ReminderSweep(batch_size=options["batch_size"]).run()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} user(s), wrote {written} reminder(s) in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,24 @@
+# healthdata/management/commands/rebuild_activity_levels.py
+from django.core.management.base import BaseCommand
+
+from healthdata.activity_level import WINDOW_DAYS, rebuild_activity_levels
+
+
+class Command(BaseCommand):
+    help = (
+        f"Re-infer Profile.inferred_activity_level from the last {WINDOW_DAYS} days of "
+        "ActivityData (run nightly so the window moves)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild this user id (repeatable). Default: all users with a profile.",
+        )
+
+    def handle(self, *args, **options):
+        changed = rebuild_activity_levels(user_ids=options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Updated the activity level of {changed} profile(s)."))
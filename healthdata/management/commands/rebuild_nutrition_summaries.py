@@ -0,0 +1,21 @@
+# healthdata/management/commands/rebuild_nutrition_summaries.py
+from django.core.management.base import BaseCommand
+
+from healthdata.rollups import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyNutritionSummary rows from raw NutritionEntry data."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild this user id (repeatable). Default: all users.",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_summaries(user_ids=options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily nutrition summary row(s)."))
@@ -0,0 +1,21 @@
+# healthdata/management/commands/rebuild_sleep_rollups.py
+from django.core.management.base import BaseCommand
+
+from healthdata.sleep_analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute SleepRollup rows from SleepData (run nightly so the 7/30-day windows move)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild this user id (repeatable). Default: all users with sleep data.",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(user_ids=options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} sleep rollup(s)."))
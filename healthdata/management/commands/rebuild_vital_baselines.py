@@ -0,0 +1,21 @@
+# healthdata/management/commands/rebuild_vital_baselines.py
+from django.core.management.base import BaseCommand
+
+from healthdata.vitals import rebuild_baselines
+
+
+class Command(BaseCommand):
+    help = "Recompute VitalBaseline rows by replaying HealthMetrics history (no alerts are raised)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild this user id (repeatable). Default: all users.",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_baselines(user_ids=options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} vital baseline(s)."))
@@ -0,0 +1,62 @@
+# healthdata/management/commands/rule_stats.py
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from healthdata import instrumentation
+from healthdata.ai_agent import evaluate_user
+from healthdata.reminders_engine import ReminderEngine
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile the provider-alert rules and reminder checks: run both engines for "
+        "a sample of users (changes rolled back) and print per-rule timing, query "
+        "counts, trigger and dedup-suppression rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=200,
+            help="Number of users to sample, most recent first (default: 200).",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the raw counters as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if not instrumentation.enabled():
+            self.stderr.write("HEALTH_RULE_INSTRUMENTATION is off; nothing to measure.")
+            return
+
+        instrumentation.reset()
+        users = User.objects.filter(profile__isnull=False).select_related("profile").order_by("-pk")
+        with transaction.atomic(), instrumentation.count_duplicates():
+            for user in users[:options["limit"]]:
+                ReminderEngine(user).analyze_and_create_reminders()
+                evaluate_user(user, force=True)
+            transaction.set_rollback(True)
+        stats = instrumentation.stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'rule':<34} {'calls':>6} {'avg ms':>8} {'max ms':>8} {'q/call':>7} "
+            f"{'fired':>7} {'suppr.':>7} {'skipped':>7}"
+        )
+        for rule, row in stats.items():
+            self.stdout.write(
+                f"{rule:<34} {row['calls']:>6} {row['avg_ms'] or 0:>8.2f} {row['max_ms']:>8.2f} "
+                f"{row['queries_per_call'] or 0:>7} {row['trigger_rate'] or 0:>7.1%} "
+                f"{row['suppression_rate'] or 0:>7.1%} {row['skipped']:>7}"
+            )
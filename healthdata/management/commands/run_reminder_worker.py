@@ -0,0 +1,49 @@
+# healthdata/management/commands/run_reminder_worker.py
+from django.core.management.base import BaseCommand
+
+from healthdata.scheduler import SETTLE_SECONDS, run_worker
+
+
+class Command(BaseCommand):
+    help = "Background worker: evaluate the queued reminder and alert rules for users whose data changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep when the queue is empty (default: 5).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maximum users processed per pass (default: 500).",
+        )
+        parser.add_argument(
+            "--settle",
+            type=float,
+            default=SETTLE_SECONDS,
+            help=(
+                "Seconds a user's data must be quiet before evaluation, so bursts "
+                f"of writes are coalesced (default: {SETTLE_SECONDS})."
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue once and exit instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rule worker started.")
+        try:
+            run_worker(
+                interval=options["interval"],
+                batch_size=options["batch_size"],
+                once=options["once"],
+                settle_seconds=options["settle"],
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Rule worker stopped.")
@@ -0,0 +1,69 @@
+# healthdata/management/commands/sweep_provider_alerts.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from healthdata.alert_sweep import Checkpoint, ProviderAlertSweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the provider-alert agent for every consenting user with a process pool. "
+        "Progress is checkpointed; an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Worker processes, each with its own DB connection (default: 4; 1 = no pool).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Users per chunk; each chunk's alerts are committed together (default: 500).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="provider_alert_sweep.checkpoint.json",
+            help="Checkpoint file (default: provider_alert_sweep.checkpoint.json).",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and sweep from the first user.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Evaluate every rule, even those whose inputs have not changed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["restart"]:
+            Checkpoint(options["checkpoint"]).clear()
+        elif Checkpoint.load(options["checkpoint"]).resumed:
+            self.stdout.write("Resuming from checkpoint.")
+
+        sweep = ProviderAlertSweep(
+            options["checkpoint"],
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            force=options["force"],
+        )
+        if sweep.workers < options["workers"]:
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; running in-process."))
+
+        started = time.monotonic()
+        state = sweep.run(
+            progress=lambda s: self.stdout.write(f"  through user {s['last_user_id']}: {s['users']} user(s)")
+        )
+        elapsed = time.monotonic() - started
+
+        if state["failed"]:
+            self.stderr.write(f"Evaluation failed for user id(s): {state['failed']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {state['users']} user(s), created {state['alerts']} alert(s) in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0004_reminderrefresh'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthreminder',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='healthreminder',
+            constraint=models.UniqueConstraint(fields=('user', 'dedup_key'), name='unique_healthreminder_dedup_key'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0005_healthreminder_dedup_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('calories', models.IntegerField(default=0)),
+                ('protein_g', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('carbs_g', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('fat_g', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('protein_entry_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_nutrition', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0006_dailynutritionsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthreminder',
+            name='template_id',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='healthreminder',
+            name='template_params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='healthreminder',
+            name='actionable_steps',
+            field=models.JSONField(blank=True, default=list, help_text='List of specific actions user can take'),
+        ),
+        migrations.AlterField(
+            model_name='healthreminder',
+            name='explanation',
+            field=models.TextField(blank=True, help_text='Detailed explanation of WHY this matters'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_created_at(apps, schema_editor):
+    for name in ('SleepData', 'HealthMetrics'):
+        model = apps.get_model('healthdata', name)
+        model.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0007_healthreminder_templates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleEvaluationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(max_length=100)),
+                ('watermark', models.CharField(max_length=255)),
+                ('evaluated_on', models.DateField()),
+                ('triggered', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rule_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'rule')},
+            },
+        ),
+        migrations.AddField(
+            model_name='sleepdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='healthmetrics',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0008_ruleevaluationstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=40)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('recent', models.JSONField(blank=True, default=list)),
+                ('last_value', models.FloatField(blank=True, null=True)),
+                ('last_logged_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vital_baselines', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'metric')},
+            },
+        ),
+    ]
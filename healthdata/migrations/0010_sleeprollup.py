@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0009_vitalbaseline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SleepRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_on', models.DateField()),
+                ('nights_7', models.PositiveIntegerField(default=0)),
+                ('nights_30', models.PositiveIntegerField(default=0)),
+                ('short_nights_5', models.PositiveIntegerField(default=0)),
+                ('short_nights_7', models.PositiveIntegerField(default=0)),
+                ('avg_total_7', models.FloatField(blank=True, null=True)),
+                ('avg_total_30', models.FloatField(blank=True, null=True)),
+                ('avg_deep_7', models.FloatField(blank=True, null=True)),
+                ('avg_deep_30', models.FloatField(blank=True, null=True)),
+                ('avg_rem_7', models.FloatField(blank=True, null=True)),
+                ('avg_rem_30', models.FloatField(blank=True, null=True)),
+                ('avg_awake_7', models.FloatField(blank=True, null=True)),
+                ('avg_awake_30', models.FloatField(blank=True, null=True)),
+                ('regularity_index', models.FloatField(blank=True, null=True)),
+                ('flags', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sleep_rollup', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['computed_on'], name='healthdata__compute_482dbe_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthdata', '0010_sleeprollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderrefresh',
+            name='pending_rules',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
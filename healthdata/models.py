@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import explanations
 
 class NutritionEntry(models.Model):
     MEAL_CHOICES = [
@@ -59,10 +62,17 @@ class HealthReminder(models.Model):
     reminder_type = models.CharField(max_length=20, choices=REMINDER_TYPES)
     title = models.CharField(max_length=200)
     message = models.TextField(help_text="Short message (1-2 sentences)")
-    explanation = models.TextField(help_text="Detailed explanation of WHY this matters")
     priority = models.CharField(max_length=10, choices=PRIORITY_LEVELS, default='medium')
+
+    # Explanation + steps are rendered from healthdata.explanations on demand
+    template_id = models.CharField(max_length=50, blank=True)
+    template_params = models.JSONField(default=dict, blank=True)
+
+    # Legacy stored text (reminders created before templates); new rows leave these empty
+    explanation = models.TextField(blank=True, help_text="Detailed explanation of WHY this matters")
     actionable_steps = models.JSONField(
         default=list,
+        blank=True,
         help_text="List of specific actions user can take"
     )
 
@@ -71,11 +81,21 @@ class HealthReminder(models.Model):
     acted_upon = models.BooleanField(default=False)
     acted_upon_at = models.DateTimeField(null=True, blank=True)
 
+    # "<rule>:<time bucket>" set by ReminderEngine; unique per user so the
+    # same rule can only fire once per bucket, even under concurrent runs.
+    dedup_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'dismissed_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'dedup_key'],
+                name='unique_healthreminder_dedup_key',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
@@ -85,6 +105,26 @@ class HealthReminder(models.Model):
         """Check if reminder is still active (not dismissed)"""
         return self.dismissed_at is None
 
+    @cached_property
+    def _rendered(self):
+        """(explanation, steps), rendered once per instance."""
+        if self.template_id:
+            try:
+                return explanations.render(self.template_id, self.template_params)
+            except KeyError:
+                pass  # template retired; fall back to whatever was stored
+        return self.explanation, self.actionable_steps
+
+    @property
+    def rendered_explanation(self):
+        """Detailed explanation of WHY this matters (rendered lazily)."""
+        return self._rendered[0]
+
+    @property
+    def rendered_steps(self):
+        """List of specific actions user can take (rendered lazily)."""
+        return self._rendered[1]
+
 class ActivityData(models.Model):
     """
     Stores activity data from wearables (steps, distance, active minutes).
@@ -162,6 +202,7 @@ class SleepData(models.Model):
     bedtime_end = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date']
@@ -201,9 +242,171 @@ class HealthMetrics(models.Model):
     notes = models.TextField(blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-logged_at']
 
     def __str__(self):
-        return f"{self.user} - {self.logged_at.date()} - Health Metrics"
\ No newline at end of file
+        return f"{self.user} - {self.logged_at.date()} - Health Metrics"
+
+class ReminderRefresh(models.Model):
+    """
+    Dirty-user queue for the background rule worker.
+    Touched whenever one of a user's input tables changes, with the names of
+    the rules reading that table; the worker evaluates only those rules for
+    users whose data changed since their last run (see healthdata.scheduler).
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reminder_refresh'
+    )
+    changed_at = models.DateTimeField(default=timezone.now)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # Rules queued since the last run (healthdata.scheduler queue names)
+    pending_rules = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['changed_at']),
+        ]
+
+    def __str__(self):
+        return f"ReminderRefresh({self.user_id}, changed {self.changed_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def is_pending(self):
+        """True if data changed after the last reminder run."""
+        return self.last_run_at is None or self.changed_at > self.last_run_at
+
+
+class DailyNutritionSummary(models.Model):
+    """
+    Per-user, per-day rollup of NutritionEntry rows.
+    Kept up to date with F() increments on every entry create/update/delete
+    (see healthdata.rollups); rebuild with `manage.py rebuild_nutrition_summaries`.
+    Readers should use this instead of aggregating raw entries.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_nutrition'
+    )
+    date = models.DateField()
+
+    calories = models.IntegerField(default=0)
+    protein_g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    carbs_g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    fat_g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    entry_count = models.IntegerField(default=0)
+    # Entries with protein recorded, so per-entry protein averages stay exact
+    protein_entry_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['user', 'date']
+
+    def __str__(self):
+        return f"{self.user} - {self.date} - {self.calories} kcal ({self.entry_count} entries)"
+
+
+class RuleEvaluationState(models.Model):
+    """
+    Last evaluation of one ai_agent rule for one user.
+    `watermark` fingerprints the rule's input tables (row count and newest
+    timestamp of each) at that time; while it, the day and the outcome are
+    unchanged the rule is skipped (see healthdata.ai_agent).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='rule_states'
+    )
+    rule = models.CharField(max_length=100)
+    watermark = models.CharField(max_length=255)
+    evaluated_on = models.DateField()
+    triggered = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'rule']
+
+    def __str__(self):
+        return f"{self.rule} for {self.user} ({self.evaluated_on})"
+
+    def is_current(self, watermark, today):
+        """True if re-evaluating against these inputs today cannot change anything."""
+        return self.watermark == watermark and self.evaluated_on == today and not self.triggered
+
+
+class VitalBaseline(models.Model):
+    """
+    Streaming per-user baseline of one HealthMetrics vital (see healthdata.vitals).
+    EWMA mean/variance plus a ring buffer of the latest readings, updated in
+    constant time on every new reading instead of rescanning history.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='vital_baselines'
+    )
+    metric = models.CharField(max_length=40)
+    samples = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    recent = models.JSONField(default=list, blank=True)  # latest readings, oldest first
+    last_value = models.FloatField(null=True, blank=True)
+    last_logged_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'metric']
+
+    def __str__(self):
+        return f"{self.user} - {self.metric}: {self.mean:.1f} ± {self.variance ** 0.5:.1f} (n={self.samples})"
+
+
+class SleepRollup(models.Model):
+    """
+    Precomputed sleep analytics for one user (see healthdata.sleep_analytics).
+    Refreshed whenever the user's SleepData changes, and nightly.
+    Alert rules and dashboards read this instead of raw nights.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sleep_rollup'
+    )
+    computed_on = models.DateField()
+
+    nights_7 = models.PositiveIntegerField(default=0)
+    nights_30 = models.PositiveIntegerField(default=0)
+    # Nights under 5h in the last 5 / 7 days
+    short_nights_5 = models.PositiveIntegerField(default=0)
+    short_nights_7 = models.PositiveIntegerField(default=0)
+
+    # Average minutes per night over the last 7 / 30 days
+    avg_total_7 = models.FloatField(null=True, blank=True)
+    avg_total_30 = models.FloatField(null=True, blank=True)
+    avg_deep_7 = models.FloatField(null=True, blank=True)
+    avg_deep_30 = models.FloatField(null=True, blank=True)
+    avg_rem_7 = models.FloatField(null=True, blank=True)
+    avg_rem_30 = models.FloatField(null=True, blank=True)
+    avg_awake_7 = models.FloatField(null=True, blank=True)
+    avg_awake_30 = models.FloatField(null=True, blank=True)
+
+    # 0-100: 100 = same bed and wake time every night (last 30 days)
+    regularity_index = models.FloatField(null=True, blank=True)
+    flags = models.JSONField(default=list, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['computed_on']),
+        ]
+
+    def __str__(self):
+        return f"SleepRollup({self.user_id}, {self.computed_on})"
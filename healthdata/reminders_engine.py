@@ -1,7 +1,14 @@
+from collections import namedtuple
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Avg, Count
-from .models import NutritionEntry, HealthReminder
+from django.contrib.auth import get_user_model
+from usermanagement.models import Profile
+from . import instrumentation, vectorized
+from .models import HealthReminder
+from .rules import RuleSpec, compile_rules
+
+User = get_user_model()
+
+HealthTargets = namedtuple('HealthTargets', ['bmr', 'tdee', 'protein_target'])
 
 
 class HealthCalculator:
@@ -18,6 +25,15 @@ class HealthCalculator:
         'very_active': 1.9  # Very hard exercise & physical job
     }
 
+    # Protein multipliers (g/kg) based on activity
+    PROTEIN_MULTIPLIERS = {
+        'sedentary': 0.8,
+        'light': 1.0,
+        'moderate': 1.2,
+        'active': 1.6,
+        'very_active': 2.0
+    }
+
     @staticmethod
     def calculate_bmr(profile):
         """
@@ -64,33 +80,102 @@ class HealthCalculator:
 
         weight = float(profile.weight_kg)
 
-        # Protein multipliers based on activity
-        protein_multipliers = {
-            'sedentary': 0.8,
-            'light': 1.0,
-            'moderate': 1.2,
-            'active': 1.6,
-            'very_active': 2.0
-        }
-
         activity_level = HealthCalculator.get_activity_level(profile)
-        multiplier = protein_multipliers.get(activity_level, 0.8)
+        multiplier = HealthCalculator.PROTEIN_MULTIPLIERS.get(activity_level, 0.8)
         return weight * multiplier
 
     @staticmethod
     def get_activity_level(profile):
         """
         Determine activity level.
-        TODO: Can be enhanced to infer from step count data.
-        For now, defaults to sedentary if not specified.
+        Prefers the level inferred from recent step and active-minute history
+        (stored on the profile by healthdata.activity_level), then the
+        self-reported one; defaults to sedentary if neither is known.
         """
-        # Check if profile has activity_level field (you might add this later)
+        if getattr(profile, 'inferred_activity_level', None):
+            return profile.inferred_activity_level
+
         if hasattr(profile, 'activity_level') and profile.activity_level:
             return profile.activity_level
 
         # Default to sedentary
         return 'sedentary'
 
+    @staticmethod
+    def compute_targets(profile):
+        """Compute BMR, TDEE and protein target from profile fields (no caching)."""
+        return HealthTargets(
+            bmr=HealthCalculator.calculate_bmr(profile),
+            tdee=HealthCalculator.calculate_tdee(profile),
+            protein_target=HealthCalculator.calculate_protein_target(profile),
+        )
+
+    @staticmethod
+    def store_targets(profile):
+        """Compute targets onto the profile instance for the current version (not saved)."""
+        targets = HealthCalculator.compute_targets(profile)
+        profile.bmr, profile.tdee, profile.protein_target = targets
+        profile.targets_version = profile.version
+        return targets
+
+    @staticmethod
+    def refresh_stored_targets(profile):
+        """
+        Store targets for the current version of `profile`'s row and copy
+        version and targets onto the instance. Reads the row under
+        select_for_update, so call it in the transaction that bumped the
+        version: the targets then match exactly the inputs of that version.
+        """
+        row = Profile.objects.select_for_update().get(pk=profile.pk)
+        targets = HealthCalculator.store_targets(row)
+        Profile.objects.filter(pk=row.pk).update(targets_version=row.version, **targets._asdict())
+        profile.version = profile.targets_version = row.version
+        profile.bmr, profile.tdee, profile.protein_target = targets
+        return targets
+
+    @staticmethod
+    def get_targets(profile):
+        """
+        Memoized targets for a profile.
+        Uses the values stored on the Profile row while they match its version;
+        otherwise recomputes and writes them back (only if nobody saved since).
+        """
+        if profile.targets_are_current:
+            return HealthTargets(profile.bmr, profile.tdee, profile.protein_target)
+
+        targets = HealthCalculator.store_targets(profile)
+        Profile.objects.filter(pk=profile.pk, version=profile.version).update(
+            targets_version=profile.version, **targets._asdict()
+        )
+        return targets
+
+    @staticmethod
+    def targets_for_users(user_ids):
+        """
+        Targets for many users in one query. Returns {user_id: HealthTargets}.
+        Profiles with stale targets (e.g. rows predating the cache) are
+        recomputed and written back with one bulk_update.
+        """
+        targets = {}
+        stale = []
+        profiles = Profile.objects.filter(user_id__in=list(user_ids)).only(
+            'user_id', 'version', *Profile.TARGET_FIELDS
+        )
+        for profile in profiles:
+            if profile.targets_are_current:
+                targets[profile.user_id] = HealthTargets(profile.bmr, profile.tdee, profile.protein_target)
+            else:
+                stale.append(profile)
+
+        if stale:
+            # Deferred loading of the input fields; only for the stale rows
+            stale = list(Profile.objects.filter(pk__in=[p.pk for p in stale]))
+            for profile in stale:
+                targets[profile.user_id] = HealthCalculator.store_targets(profile)
+            Profile.objects.bulk_update(stale, Profile.TARGET_FIELDS, batch_size=1000)
+
+        return targets
+
 
 class GoalsIntegration:
     """
@@ -122,96 +207,196 @@ class GoalsIntegration:
 class ExplanationGenerator:
     """
     Generates explanations for health reminders.
-    Sprint 2: Pre-written templates with personalized data
+    Sprint 2: Pre-written templates with personalized data (healthdata.explanations)
     Sprint 3+: AI-generated via LangGraph (replace methods here)
+
+    Each method returns (template_id, params). Reminders store only these;
+    the explanation text and steps are rendered lazily when displayed.
     """
 
     @staticmethod
-    def get_low_calorie_explanation(avg_calories, target_calories, profile):
-        """Generate explanation for low calorie intake."""
-        activity = HealthCalculator.get_activity_level(profile)
+    def low_calorie_template(avg_calories, target_calories, profile):
+        """Template for low calorie intake."""
+        return 'low_calories', {
+            'avg_calories': avg_calories,
+            'target_calories': target_calories,
+            'deficit': target_calories - avg_calories,
+            'age': profile.age,
+            'weight_kg': str(profile.weight_kg),
+            'height_cm': profile.height_cm,
+            'activity': HealthCalculator.get_activity_level(profile),
+        }
 
-        return f"""
-Your recent average of {avg_calories:.0f} calories per day is significantly below 
-your recommended target of {target_calories:.0f} calories per day (calculated based 
-on your profile: {profile.age}yo, {profile.weight_kg}kg, {profile.height_cm}cm, 
-{activity} activity level).
+    @staticmethod
+    def inconsistent_logging_template(days_logged, total_days):
+        """Template for inconsistent meal logging."""
+        return 'logging_gaps', {
+            'days_logged': days_logged,
+            'total_days': total_days,
+        }
 
-Consistently low calorie intake can lead to:
+    @staticmethod
+    def low_protein_template(avg_protein, target_protein, profile):
+        """Template for low protein intake."""
+        return 'low_protein', {
+            'avg_protein': avg_protein,
+            'target_protein': target_protein,
+            'deficit': target_protein - avg_protein,
+            'protein_per_kg': target_protein / float(profile.weight_kg),
+            'weight_kg': str(profile.weight_kg),
+            'activity': HealthCalculator.get_activity_level(profile),
+        }
 
-• Decreased energy levels and chronic fatigue
-• Loss of muscle mass (your body breaks down muscle for fuel)
-• Weakened immune system and slower recovery
-• Slower metabolism (your body adapts to low energy)
-• Nutrient deficiencies affecting overall health
-• Difficulty concentrating and mood changes
+    @staticmethod
+    def incomplete_profile_template(missing_fields):
+        """Template explaining why complete profile data is needed."""
+        return 'profile_incomplete', {
+            'fields': ', '.join(missing_fields),
+        }
 
-Your body needs adequate fuel to function optimally, support your daily activities, 
-maintain muscle mass, and protect your long-term health.
-        """.strip()
 
-    @staticmethod
-    def get_inconsistent_logging_explanation(days_logged, total_days):
-        """Generate explanation for inconsistent meal logging."""
-        return f"""
-You've logged meals on only {days_logged} out of the last {total_days} days. 
-Consistent tracking is crucial for understanding your nutrition patterns because:
-
-• It reveals hidden habits and trends you might not notice day-to-day
-• It helps identify what's working and what needs adjustment
-• It provides accurate data for personalized recommendations
-• It keeps you accountable to your health goals
-• It helps detect concerning patterns early
-
-Think of logging as taking your health's "vital signs" - sporadic measurements 
-make it difficult to get an accurate picture of your overall wellness. Even if 
-you're not perfect every day, consistent tracking gives us the data needed to 
-provide truly personalized guidance.
-        """.strip()
+# Threshold checks of the ReminderEngine, as declarative rules. Every rule is
+# evaluated from the same compiled query (see healthdata.rules); targets
+# are resolved per user by the engine (goals first, then profile targets).
+REMINDER_RULES = {
+    'low_calories': RuleSpec(
+        'low_calories', metric='meal_calories', window_days=7, aggregate='avg',
+        comparator='lt', threshold=0.75, target='tdee',  # fraction of calorie target
+        severity='high', dedup_hours=5 * 24,
+    ),
+    'logging_gaps': RuleSpec(
+        'logging_gaps', metric='logged_days', window_days=7, aggregate='count',
+        comparator='lt', threshold=5,  # logged fewer than 5 of 7 days
+        severity='low', dedup_hours=5 * 24,
+    ),
+    'low_protein': RuleSpec(
+        'low_protein', metric='meal_protein', window_days=7, aggregate='avg',
+        comparator='lt', threshold=0.7, target='protein_target',  # fraction of protein target
+        severity='medium', dedup_hours=5 * 24,
+    ),
+}
+
+REMINDER_QUERY = compile_rules(REMINDER_RULES.values())
+
+
+class UserNutritionSnapshot:
+    """
+    Everything the ReminderEngine checks need to know about a user, loaded once:
+    the values of REMINDER_RULES, from one conditional-aggregation query over
+    the DailyNutritionSummary rollup (O(days), not O(entries)).
+    New checks should be added to REMINDER_RULES rather than querying again.
+    (Deduplication needs no reads; see ReminderEngine.dedup_fingerprint.)
+    """
 
-    @staticmethod
-    def get_low_protein_explanation(avg_protein, target_protein, profile):
-        """Generate explanation for low protein intake."""
-        activity = HealthCalculator.get_activity_level(profile)
+    def __init__(self, avg_calories=None, avg_protein=None, days_logged=0):
+        self.avg_calories = avg_calories
+        self.avg_protein = avg_protein
+        self.days_logged = days_logged
+
+    @classmethod
+    def _from_values(cls, values):
+        # Per-entry averages, identical to Avg() over the raw entries
+        return cls(
+            avg_calories=values['low_calories'],
+            avg_protein=values['low_protein'],
+            days_logged=int(values['logging_gaps']),
+        )
 
-        return f"""
-Your average protein intake of {avg_protein:.1f}g per day is below your recommended 
-target of {target_protein:.0f}g per day (calculated as {target_protein / float(profile.weight_kg):.1f}g 
-per kg body weight for your {activity} activity level).
+    @classmethod
+    def for_user(cls, user):
+        """Build the snapshot for a single user (1 query)."""
+        return cls._from_values(REMINDER_QUERY.values_for([user.pk])[user.pk])
+
+    @classmethod
+    def for_users(cls, user_ids):
+        """Build snapshots for many users at once (1 grouped query). Returns {user_id: snapshot}."""
+        return {
+            user_id: cls._from_values(values)
+            for user_id, values in REMINDER_QUERY.values_for(user_ids).items()
+        }
 
-Adequate protein is essential for:
+    @classmethod
+    def for_cohort(cls, user_ids, include=()):
+        """
+        NumPy version of for_users for population sweeps (needs numpy).
+        REMINDER_RULES are evaluated as arrays against the profile targets,
+        and snapshots are built only for users who may get a reminder: a
+        rule fired, the profile lacks target inputs, or the user is listed
+        in `include` (e.g. has goal-based targets). Returns {user_id: snapshot}.
+        """
+        cohort, outcomes = vectorized.evaluate_cohort(REMINDER_RULES.values(), user_ids)
+        targets = vectorized.compute_targets(cohort)
 
-• Building and repairing muscle tissue after activity
-• Supporting immune function and fighting illness
-• Maintaining healthy skin, hair, and nails
-• Producing enzymes and hormones your body needs
-• Keeping you feeling full and satisfied (reducing snacking)
-• Preserving muscle mass during weight loss
-• Recovery and adaptation from exercise
+        flagged = vectorized.np.isnan(targets.tdee) | vectorized.np.isnan(targets.protein_target)
+        for outcome in outcomes.values():
+            flagged |= outcome.triggered
+        if include:
+            flagged[cohort.rows(list(set(include)))] = True
 
-Protein needs increase with activity level. Your target is personalized based on 
-your weight ({profile.weight_kg}kg) and activity patterns.
-        """.strip()
+        def scalar(outcome, row):
+            value = outcome.value[row]
+            return None if vectorized.np.isnan(value) else float(value)
 
-    @staticmethod
-    def get_incomplete_profile_explanation():
-        """Explain why complete profile data is needed."""
-        return """
-To provide you with personalized, accurate health recommendations, we need some 
-basic information about you: your age, weight, height, and sex.
+        snapshots = {}
+        for row in vectorized.np.flatnonzero(flagged):
+            values = {name: scalar(outcome, row) for name, outcome in outcomes.items()}
+            snapshots[int(cohort.user_ids[row])] = cls._from_values(values)
+        return snapshots
 
-This data allows us to:
 
-• Calculate your Basal Metabolic Rate (BMR) - calories needed at rest
-• Determine your Total Daily Energy Expenditure (TDEE)
-• Set personalized targets for calories, protein, and macronutrients
-• Detect concerning patterns specific to YOUR body
-• Give advice that's actually relevant to your situation
+def drop_known_duplicates(reminders):
+    """
+    When profiling duplicates (instrumentation.counting_duplicates), drop
+    reminders whose fingerprint already exists (one query) and count them
+    as suppressed for their rule. The database would ignore them anyway;
+    this only makes the suppression visible, so it is off by default.
+    """
+    if not reminders or not instrumentation.counting_duplicates():
+        return reminders
+
+    existing = set(
+        HealthReminder.objects
+        .filter(
+            user_id__in={r.user_id for r in reminders},
+            dedup_key__in={r.dedup_key for r in reminders},
+        )
+        .values_list('user_id', 'dedup_key')
+    )
+    kept = []
+    for reminder in reminders:
+        if (reminder.user_id, reminder.dedup_key) in existing:
+            rule = reminder.dedup_key.split(':', 1)[0]
+            instrumentation.record(f'reminder.{rule}', suppressed=1)
+        else:
+            kept.append(reminder)
+    return kept
+
+
+def insert_reminders(reminders, batch_size=None):
+    """
+    Bulk-insert reminders; those whose dedup fingerprint already exists are
+    skipped by the database. Returns the reminders actually written.
 
-Without this information, any recommendations would be generic and potentially 
-inaccurate for your specific needs. Your data is private and only used to 
-personalize YOUR experience.
-        """.strip()
+    bulk_create(ignore_conflicts=True) hands back every object it was given,
+    without pks, so the written rows are read back (one query): a row is
+    ours if its fingerprint and created_at (set on the objects by
+    bulk_create) match.
+    """
+    reminders = drop_known_duplicates(reminders)
+    if not reminders:
+        return []
+    HealthReminder.objects.bulk_create(reminders, batch_size=batch_size, ignore_conflicts=True)
+
+    submitted = {(r.user_id, r.dedup_key): r.created_at for r in reminders}
+    candidates = HealthReminder.objects.filter(
+        user_id__in={r.user_id for r in reminders},
+        dedup_key__in={r.dedup_key for r in reminders},
+        created_at__gte=min(submitted.values()),
+    ).order_by('pk')
+    return [
+        reminder for reminder in candidates
+        if submitted.get((reminder.user_id, reminder.dedup_key)) == reminder.created_at
+    ]
 
 
 class ReminderEngine:
@@ -220,6 +405,26 @@ class ReminderEngine:
     Calculates targets based on profile data, with hooks for future goals integration.
     """
 
+    LOOKBACK_DAYS = 7
+
+    PROFILE_TITLE = 'Complete Your Profile'
+    CALORIE_TITLE = 'Low Calorie Intake Detected'
+    LOGGING_TITLE = 'Keep Up Your Logging Streak'
+    PROTEIN_TITLE = 'Increase Your Protein Intake'
+
+    # Rule id -> length (days) of the dedup time bucket
+    DEDUP_DAYS = {
+        'profile_incomplete': 3,
+        **{name: spec.dedup_hours // 24 for name, spec in REMINDER_RULES.items()},
+    }
+
+    # Rule id -> check method, in evaluation order (after the profile check)
+    CHECKS = {
+        'low_calories': 'check_calorie_intake',
+        'logging_gaps': 'check_logging_consistency',
+        'low_protein': 'check_protein_intake',
+    }
+
     def __init__(self, user):
         self.user = user
         self.profile = user.profile
@@ -228,37 +433,55 @@ class ReminderEngine:
         self.explanation_gen = ExplanationGenerator()
         self.activity_level = self.calculator.get_activity_level(self.profile)
 
-    def analyze_and_create_reminders(self):
+    def analyze_and_create_reminders(self, snapshot=None):
         """
         Main entry point: analyzes all health data and creates reminders.
-        Returns list of newly created reminders.
+        Returns the list of reminders written; those whose dedup fingerprint
+        already exists are skipped by the database and not returned.
         """
-        new_reminders = []
+        if snapshot is None:
+            snapshot = UserNutritionSnapshot.for_user(self.user)
+        return insert_reminders(self.evaluate(snapshot))
 
+    @classmethod
+    def dedup_fingerprint(cls, rule, day=None):
+        """
+        Fingerprint (rule, time bucket) for a reminder. Together with the user
+        it is unique in HealthReminder, so a rule fires at most once per bucket
+        even when several workers or tabs evaluate the same user concurrently.
+        """
+        day = day or timezone.localdate()
+        return f"{rule}:{day.toordinal() // cls.DEDUP_DAYS[rule]}"
+
+    def evaluate(self, snapshot):
+        """
+        Run every check against a UserNutritionSnapshot.
+        Returns the (unsaved, fingerprinted) reminders that should be created.
+        """
         # First check if profile is complete
-        reminder = self.check_profile_completion()
-        if reminder:
-            new_reminders.append(reminder)
+        if self.get_missing_profile_fields():
             # If profile incomplete, skip other checks (we need data first)
-            return new_reminders
+            reminder = self._run_check('profile_incomplete', self.check_profile_completion, snapshot)
+            return [reminder] if reminder else []
 
         # Check each health pattern
-        reminder = self.check_calorie_intake()
-        if reminder:
-            new_reminders.append(reminder)
-
-        reminder = self.check_logging_consistency()
-        if reminder:
-            new_reminders.append(reminder)
-
-        reminder = self.check_protein_intake()
-        if reminder:
-            new_reminders.append(reminder)
+        new_reminders = []
+        for rule, check_name in self.CHECKS.items():
+            reminder = self._run_check(rule, getattr(self, check_name), snapshot)
+            if reminder:
+                new_reminders.append(reminder)
 
         return new_reminders
 
-    def check_profile_completion(self):
-        """Check if user has completed essential profile information."""
+    @staticmethod
+    def _run_check(rule, check, snapshot):
+        with instrumentation.measure(f'reminder.{rule}') as measurement:
+            reminder = check(snapshot)
+            measurement.triggered = reminder is not None
+        return reminder
+
+    def get_missing_profile_fields(self):
+        """Return the essential profile fields the user has not filled in."""
         missing_fields = []
 
         if not self.profile.age:
@@ -270,38 +493,28 @@ class ReminderEngine:
         if not self.profile.sex:
             missing_fields.append('sex')
 
+        return missing_fields
 
-        if not missing_fields:
-            return None
-
-        # Check if we already reminded them recently
-        existing = HealthReminder.objects.filter(
-            user=self.user,
-            reminder_type='general',
-            title='Complete Your Profile',
-            created_at__gte=timezone.now() - timedelta(days=3)
-        ).exists()
+    def check_profile_completion(self, snapshot):
+        """Check if user has completed essential profile information."""
+        missing_fields = self.get_missing_profile_fields()
 
-        if existing:
+        if not missing_fields:
             return None
 
         fields_str = ', '.join(missing_fields)
+        template_id, params = self.explanation_gen.incomplete_profile_template(missing_fields)
 
-        reminder = HealthReminder.objects.create(
+        return HealthReminder(
             user=self.user,
             reminder_type='general',
-            title='Complete Your Profile',
+            title=self.PROFILE_TITLE,
+            dedup_key=self.dedup_fingerprint('profile_incomplete'),
             message=f'Please add your {fields_str} to receive personalized health recommendations.',
-            explanation=self.explanation_gen.get_incomplete_profile_explanation(),
+            template_id=template_id,
+            template_params=params,
             priority='medium',
-            actionable_steps=[
-                'Go to your profile settings',
-                f'Fill in missing information: {fields_str}',
-                'Update your activity level if available',
-                'Save your changes to unlock personalized insights'
-            ]
         )
-        return reminder
 
     def get_calorie_target(self):
         """
@@ -314,9 +527,8 @@ class ReminderEngine:
             if goal_target:
                 return goal_target
 
-        # Fall back to TDEE-based calculation
-        tdee = self.calculator.calculate_tdee(self.profile, self.activity_level)
-        return tdee
+        # Fall back to TDEE-based calculation (memoized on the profile)
+        return self.calculator.get_targets(self.profile).tdee
 
     def get_protein_target(self):
         """
@@ -329,164 +541,143 @@ class ReminderEngine:
             if goal_target:
                 return goal_target
 
-        # Fall back to activity-based calculation
-        return self.calculator.calculate_protein_target(self.profile, self.activity_level)
+        # Fall back to activity-based calculation (memoized on the profile)
+        return self.calculator.get_targets(self.profile).protein_target
 
-    def check_calorie_intake(self):
+    def check_calorie_intake(self, snapshot):
         """Check for concerning calorie intake patterns."""
-        week_ago = timezone.localdate() - timedelta(days=7)
-
-        entries = NutritionEntry.objects.filter(
-            user=self.user,
-            logged_at__gte=week_ago
-        )
-
-        if not entries.exists():
+        if snapshot.avg_calories is None:
             return None
 
-        avg_calories = entries.aggregate(avg=Avg('calories'))['avg']
+        avg_calories = float(snapshot.avg_calories)
         target_calories = self.get_calorie_target()
 
-        if not target_calories:
-            return None  # Can't check without target
-
-        # Check if significantly below target (less than 75%)
-        if avg_calories < (target_calories * 0.75):
-            # Avoid duplicate reminders
-            existing = HealthReminder.objects.filter(
-                user=self.user,
-                reminder_type='nutrition',
-                title='Low Calorie Intake Detected',
-                created_at__gte=timezone.now() - timedelta(days=5)
-            ).exists()
-
-            if existing:
-                return None
-
-            deficit = target_calories - avg_calories
-
-            reminder = HealthReminder.objects.create(
-                user=self.user,
-                reminder_type='nutrition',
-                title='Low Calorie Intake Detected',
-                message=f'Your 7-day average is {avg_calories:.0f} cal/day, about {deficit:.0f} calories below your target of {target_calories:.0f} cal/day.',
-                explanation=self.explanation_gen.get_low_calorie_explanation(
-                    avg_calories,
-                    target_calories,
-                    self.profile
-                ),
-                priority='high',
-                actionable_steps=[
-                    f'Target: {target_calories:.0f} calories per day',
-                    f'Add ~{deficit:.0f} calories through healthy foods',
-                    'Add a healthy snack between meals (nuts, yogurt, fruit)',
-                    'Include more calorie-dense healthy foods (avocado, olive oil, nut butters)',
-                    'Review your portion sizes - you might be underestimating',
-                    'Consider consulting a nutritionist if this pattern continues'
-                ]
-            )
-            return reminder
-
-        return None
+        # Significantly below target? (no target -> can't check)
+        if not REMINDER_RULES['low_calories'].is_triggered(avg_calories, target_calories):
+            return None
 
-    def check_logging_consistency(self):
-        """Check if user is logging meals consistently."""
-        week_ago = timezone.localdate() - timedelta(days=7)
+        deficit = target_calories - avg_calories
+        template_id, params = self.explanation_gen.low_calorie_template(
+            avg_calories,
+            target_calories,
+            self.profile
+        )
 
-        days_with_entries = NutritionEntry.objects.filter(
+        return HealthReminder(
             user=self.user,
-            logged_at__gte=week_ago
-        ).values('logged_at').distinct().count()
-
-        # Threshold: logged less than 5 out of 7 days
-        if days_with_entries < 5:
-            # Avoid duplicate reminders
-            existing = HealthReminder.objects.filter(
-                user=self.user,
-                reminder_type='general',
-                title='Keep Up Your Logging Streak',
-                created_at__gte=timezone.now() - timedelta(days=5)
-            ).exists()
-
-            if existing:
-                return None
-
-            reminder = HealthReminder.objects.create(
-                user=self.user,
-                reminder_type='general',
-                title='Keep Up Your Logging Streak',
-                message=f'You\'ve logged meals on {days_with_entries} out of the last 7 days. Consistency helps us give you better insights!',
-                explanation=self.explanation_gen.get_inconsistent_logging_explanation(
-                    days_with_entries,
-                    7
-                ),
-                priority='low',
-                actionable_steps=[
-                    'Set a daily reminder on your phone to log meals',
-                    'Log meals immediately after eating (don\'t wait until end of day)',
-                    'Start small: commit to logging just breakfast every day this week',
-                    'Use the app\'s quick-entry feature for common meals',
-                    f'Goal: Log at least 6 out of 7 days per week'
-                ]
-            )
-            return reminder
+            reminder_type='nutrition',
+            title=self.CALORIE_TITLE,
+            dedup_key=self.dedup_fingerprint('low_calories'),
+            message=f'Your 7-day average is {avg_calories:.0f} cal/day, about {deficit:.0f} calories below your target of {target_calories:.0f} cal/day.',
+            template_id=template_id,
+            template_params=params,
+            priority='high',
+        )
 
-        return None
+    def check_logging_consistency(self, snapshot):
+        """Check if user is logging meals consistently."""
+        days_with_entries = snapshot.days_logged
 
-    def check_protein_intake(self):
-        """Check for low protein intake patterns."""
-        week_ago = timezone.localdate() - timedelta(days=7)
+        if not REMINDER_RULES['logging_gaps'].is_triggered(days_with_entries):
+            return None
+
+        template_id, params = self.explanation_gen.inconsistent_logging_template(
+            days_with_entries,
+            self.LOOKBACK_DAYS
+        )
 
-        entries = NutritionEntry.objects.filter(
+        return HealthReminder(
             user=self.user,
-            logged_at__gte=week_ago,
-            protein_g__isnull=False
+            reminder_type='general',
+            title=self.LOGGING_TITLE,
+            dedup_key=self.dedup_fingerprint('logging_gaps'),
+            message=f'You\'ve logged meals on {days_with_entries} out of the last 7 days. Consistency helps us give you better insights!',
+            template_id=template_id,
+            template_params=params,
+            priority='low',
         )
 
-        if not entries.exists():
+    def check_protein_intake(self, snapshot):
+        """Check for low protein intake patterns."""
+        if snapshot.avg_protein is None:
             return None
 
-        avg_protein = entries.aggregate(avg=Avg('protein_g'))['avg']
+        avg_protein = float(snapshot.avg_protein)
         target_protein = self.get_protein_target()
 
-        if not target_protein:
-            return None  # Can't check without target
-
-        # Check if below 70% of target
-        if avg_protein < (target_protein * 0.7):
-            # Avoid duplicate reminders
-            existing = HealthReminder.objects.filter(
-                user=self.user,
-                reminder_type='nutrition',
-                title='Increase Your Protein Intake',
-                created_at__gte=timezone.now() - timedelta(days=5)
-            ).exists()
-
-            if existing:
-                return None
-
-            deficit = target_protein - avg_protein
-
-            reminder = HealthReminder.objects.create(
-                user=self.user,
-                reminder_type='nutrition',
-                title='Increase Your Protein Intake',
-                message=f'Your average protein intake is {avg_protein:.1f}g/day. Target: {target_protein:.0f}g/day based on your profile.',
-                explanation=self.explanation_gen.get_low_protein_explanation(
-                    avg_protein,
-                    target_protein,
-                    self.profile
-                ),
-                priority='medium',
-                actionable_steps=[
-                    f'Target: {target_protein:.0f}g protein per day',
-                    f'Increase by ~{deficit:.0f}g daily',
-                    'Add Greek yogurt to breakfast (15-20g protein)',
-                    'Include lean chicken or fish at lunch (25-30g)',
-                    'Snack on nuts or cheese (5-10g)',
-                    'Consider a protein shake if needed (20-25g)'
-                ]
-            )
-            return reminder
-
-        return None
\ No newline at end of file
+        # Below target? (no target -> can't check)
+        if not REMINDER_RULES['low_protein'].is_triggered(avg_protein, target_protein):
+            return None
+
+        template_id, params = self.explanation_gen.low_protein_template(
+            avg_protein,
+            target_protein,
+            self.profile
+        )
+
+        return HealthReminder(
+            user=self.user,
+            reminder_type='nutrition',
+            title=self.PROTEIN_TITLE,
+            dedup_key=self.dedup_fingerprint('low_protein'),
+            message=f'Your average protein intake is {avg_protein:.1f}g/day. Target: {target_protein:.0f}g/day based on your profile.',
+            template_id=template_id,
+            template_params=params,
+            priority='medium',
+        )
+
+
+class ReminderSweep:
+    """
+    Batch mode of ReminderEngine for nightly population sweeps.
+
+    Instead of several queries per user, each batch of users costs one grouped
+    query (UserNutritionSnapshot.for_users), one bulk_create and one read-back
+    of the rows written; duplicates are dropped by the dedup fingerprint
+    constraint. The per-user rule logic is
+    shared with ReminderEngine.evaluate.
+
+    With NumPy installed the thresholds are first evaluated as arrays over the
+    whole batch (UserNutritionSnapshot.for_cohort), and ReminderEngine only
+    runs for the users that can get a reminder.
+    """
+
+    def __init__(self, batch_size=1000, use_numpy=None):
+        self.batch_size = batch_size
+        self.use_numpy = vectorized.available() if use_numpy is None else use_numpy
+
+    def run(self, users=None):
+        """
+        Sweep all users (or the given User queryset) with a Profile.
+        Returns (users_checked, reminders_written).
+        """
+        if users is None:
+            users = User.objects.all()
+        users = users.filter(profile__isnull=False).select_related('profile').order_by('pk')
+
+        checked = written = 0
+        last_pk = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+            written += len(self.process_batch(batch))
+        return checked, written
+
+    def process_batch(self, users):
+        """Evaluate one batch of users (with profiles loaded) and bulk-insert reminders."""
+        user_ids = [u.pk for u in users]
+        if self.use_numpy:
+            with_goals = [u.pk for u in users if GoalsIntegration.has_nutrition_goals(u)]
+            snapshots = UserNutritionSnapshot.for_cohort(user_ids, include=with_goals)
+        else:
+            snapshots = UserNutritionSnapshot.for_users(user_ids)
+
+        new_reminders = []
+        for user in users:
+            if user.pk in snapshots:
+                new_reminders.extend(ReminderEngine(user).evaluate(snapshots[user.pk]))
+
+        return insert_reminders(new_reminders, batch_size=self.batch_size)
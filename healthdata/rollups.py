@@ -0,0 +1,124 @@
+# healthdata/rollups.py
+"""
+Incremental maintenance of DailyNutritionSummary.
+
+Each NutritionEntry write is applied to its day's summary row as an atomic
+F() delta, so readers get O(days) instead of O(entries) aggregates.
+Queryset.update()/bulk_create()/raw SQL bypass the signals: run
+`manage.py rebuild_nutrition_summaries` after such bulk changes.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from CareU.db import add_deltas
+from .models import DailyNutritionSummary, NutritionEntry
+
+ROLLUP_FIELDS = ('user_id', 'logged_at', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+
+
+def entry_values(entry):
+    """Snapshot of the fields of an entry that feed the rollup."""
+    values = {name: getattr(entry, name) for name in ROLLUP_FIELDS}
+    # logged_at defaults to timezone.now, i.e. a datetime until reloaded
+    values['logged_at'] = NutritionEntry._meta.get_field('logged_at').to_python(values['logged_at'])
+    return values
+
+
+def _deltas(values, sign):
+    protein = values['protein_g']
+    return {
+        'calories': sign * (values['calories'] or 0),
+        'protein_g': sign * Decimal(protein or 0),
+        'carbs_g': sign * Decimal(values['carbs_g'] or 0),
+        'fat_g': sign * Decimal(values['fat_g'] or 0),
+        'entry_count': sign,
+        'protein_entry_count': sign if protein is not None else 0,
+    }
+
+
+def apply_entry(values, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one entry's values from its day summary.
+    Removals never create rows.
+    """
+    add_deltas(
+        DailyNutritionSummary,
+        {'user_id': values['user_id'], 'date': values['logged_at']},
+        _deltas(values, sign),
+        create=sign > 0,
+    )
+
+
+def apply_entry_change(previous, current):
+    """Move an edited entry's contribution from its old values to its new ones."""
+    if previous == current:
+        return
+    with transaction.atomic():
+        apply_entry(previous, -1)
+        apply_entry(current, 1)
+
+
+def rebuild_summaries(user_ids=None):
+    """
+    Recompute summaries from raw NutritionEntry rows (backfill / repair).
+    Returns the number of summary rows written.
+    """
+    entries = NutritionEntry.objects.all()
+    summaries = DailyNutritionSummary.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    zero = Value(Decimal(0))
+    rows = (
+        entries.order_by()
+        .values('user_id', 'logged_at')
+        .annotate(
+            total_calories=Sum('calories'),
+            total_protein=Coalesce(Sum('protein_g'), zero),
+            total_carbs=Coalesce(Sum('carbs_g'), zero),
+            total_fat=Coalesce(Sum('fat_g'), zero),
+            n_entries=Count('id'),
+            n_protein=Count('id', filter=Q(protein_g__isnull=False)),
+        )
+    )
+    with transaction.atomic():
+        summaries.delete()
+        created = DailyNutritionSummary.objects.bulk_create(
+            (
+                DailyNutritionSummary(
+                    user_id=row['user_id'],
+                    date=row['logged_at'],
+                    calories=row['total_calories'],
+                    protein_g=row['total_protein'],
+                    carbs_g=row['total_carbs'],
+                    fat_g=row['total_fat'],
+                    entry_count=row['n_entries'],
+                    protein_entry_count=row['n_protein'],
+                )
+                for row in rows.iterator(chunk_size=2000)
+            ),
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def recent_daily_averages(user, days):
+    """
+    Average daily calories and protein over the user's last `days` logged days.
+    Returns (days_found, avg_calories, avg_protein); averages are None if no data.
+    """
+    recent = list(
+        DailyNutritionSummary.objects
+        .filter(user=user, entry_count__gt=0)
+        .order_by('-date')
+        .values_list('calories', 'protein_g')[:days]
+    )
+    if not recent:
+        return 0, None, None
+    avg_calories = sum(cal for cal, _ in recent) / len(recent)
+    avg_protein = sum(float(protein) for _, protein in recent) / len(recent)
+    return len(recent), avg_calories, avg_protein
@@ -0,0 +1,247 @@
+# healthdata/rules.py
+"""
+Declarative health rules compiled to grouped SQL aggregates.
+
+A RuleSpec says *what* to check: a metric (a column of a source table),
+a look-back window, an aggregate, a comparator and a threshold, plus the
+dedup window and severity used when it fires. compile_rules() turns any
+number of specs into one grouped query per source table, with one
+conditional aggregate per distinct (metric, window, aggregate), so adding
+rules adds columns to existing queries instead of new round trips. The
+same compiled set evaluates one user or a whole cohort.
+"""
+from __future__ import annotations
+
+import operator
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import ActivityData, DailyNutritionSummary, SleepRollup
+
+
+@dataclass(frozen=True)
+class Metric:
+    """A per-user time series: `column` of `model`, dated by `date_field`."""
+    model: type
+    column: str
+    date_field: str = "date"
+    condition: Optional[Q] = None   # only rows matching this are aggregated
+    per: Optional[str] = None       # 'avg' divides Sum(column) by Sum(per)
+
+
+METRICS: Dict[str, Metric] = {
+    # Daily totals over days with at least one logged meal
+    "daily_calories": Metric(DailyNutritionSummary, "calories", condition=Q(entry_count__gt=0)),
+    # Per-meal averages (same as Avg() over raw NutritionEntry rows)
+    "meal_calories": Metric(DailyNutritionSummary, "calories", per="entry_count"),
+    "meal_protein": Metric(DailyNutritionSummary, "protein_g", per="protein_entry_count"),
+    "logged_days": Metric(DailyNutritionSummary, "id", condition=Q(entry_count__gt=0)),
+    "steps": Metric(ActivityData, "steps"),
+    # Precomputed sleep analytics (healthdata.sleep_analytics), dated by computation day
+    "short_sleep_nights": Metric(SleepRollup, "short_nights_5", date_field="computed_on"),
+    "sleep_regularity": Metric(SleepRollup, "regularity_index", date_field="computed_on"),
+}
+
+AGGREGATES = {"avg": Avg, "sum": Sum, "count": Count, "min": Min, "max": Max}
+
+COMPARATORS = {
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """
+    One declarative rule.
+
+    The rule fires when `aggregate(metric)` over the last `window_days`
+    compares true against the threshold. The threshold is absolute, or a
+    fraction of a per-user `target` (e.g. 'tdee'), or a fraction of the same
+    aggregate `baseline_offset_days` earlier (period-over-period drops).
+    """
+    name: str
+    metric: str
+    window_days: int
+    aggregate: str
+    comparator: str
+    threshold: float
+    severity: str
+    dedup_hours: int = 24
+    target: Optional[str] = None
+    baseline_offset_days: Optional[int] = None
+    enabled: bool = True
+
+    # Presentation, for rules that raise ProviderAlerts
+    alert_type: str = ""
+    message: str = ""
+    provider_hint: Optional[str] = None
+
+    @property
+    def source(self):
+        return METRICS[self.metric].model
+
+    def threshold_for(self, base=None):
+        """Concrete threshold, given the target/baseline value when the rule needs one."""
+        if self.target is None and self.baseline_offset_days is None:
+            return self.threshold
+        if not base:
+            return None  # nothing to compare against
+        return self.threshold * float(base)
+
+    def is_triggered(self, value, base=None):
+        threshold = self.threshold_for(base)
+        if value is None or threshold is None:
+            return False
+        return COMPARATORS[self.comparator](float(value), threshold)
+
+
+@dataclass
+class RuleOutcome:
+    spec: RuleSpec
+    value: Optional[float]
+    threshold: Optional[float]
+    triggered: bool
+
+
+class CompiledRules:
+    """A set of RuleSpecs compiled to one grouped aggregate query per source table."""
+
+    def __init__(self, specs: Iterable[RuleSpec]):
+        self.specs: List[RuleSpec] = [spec for spec in specs if spec.enabled]
+        # model -> {key: (metric, aggregate, window_days, offset)}; shared
+        # aggregates (same metric/window/aggregate) appear only once
+        self._plan = {}
+        for spec in self.specs:
+            self._add(spec, offset=0)
+            if spec.baseline_offset_days:
+                self._add(spec, offset=spec.baseline_offset_days)
+
+    @staticmethod
+    def _key(spec, offset):
+        return f"{spec.metric}__{spec.aggregate}__{spec.window_days}__{offset}"
+
+    def _add(self, spec, offset):
+        plan = self._plan.setdefault(spec.source, {})
+        plan[self._key(spec, offset)] = (METRICS[spec.metric], spec.aggregate, spec.window_days, offset)
+
+    @property
+    def sources(self):
+        """Source tables read by the compiled queries."""
+        return list(self._plan)
+
+    @staticmethod
+    def _columns(plan, today):
+        """Conditional aggregate expressions for one source table, windows ending `today`."""
+        columns = {}
+        for key, (metric, aggregate, window_days, offset) in plan.items():
+            end = today - timedelta(days=offset)
+            in_window = Q(**{
+                f"{metric.date_field}__gt": end - timedelta(days=window_days),
+                f"{metric.date_field}__lte": end,
+            })
+            if metric.condition is not None:
+                in_window &= metric.condition
+
+            if aggregate == "avg" and metric.per:
+                columns[f"{key}__num"] = Sum(metric.column, filter=in_window)
+                columns[f"{key}__den"] = Sum(metric.per, filter=in_window)
+            else:
+                columns[key] = AGGREGATES[aggregate](metric.column, filter=in_window)
+        return columns
+
+    def values_for(self, user_ids) -> Dict[int, Dict[str, Optional[float]]]:
+        """
+        Run the compiled queries (one per source table).
+        Returns {user_id: {spec.name: value, '<spec.name>:baseline': value}}.
+        """
+        user_ids = list(user_ids)
+        today = timezone.localdate()
+        rows = {user_id: {} for user_id in user_ids}
+        for model, plan in self._plan.items():
+            date_field = next(iter(plan.values()))[0].date_field
+            span = max(window_days + offset for _, _, window_days, offset in plan.values())
+            queryset = (
+                model.objects
+                .filter(**{
+                    "user_id__in": user_ids,
+                    f"{date_field}__gt": today - timedelta(days=span),
+                })
+                .order_by()
+                .values("user_id")
+                .annotate(**self._columns(plan, today))
+            )
+            for row in queryset:
+                rows[row.pop("user_id")].update(row)
+
+        return {user_id: self._finalize(row) for user_id, row in rows.items()}
+
+    def _finalize(self, row):
+        values = {}
+        for spec in self.specs:
+            values[spec.name] = self._value(spec, row, offset=0)
+            if spec.baseline_offset_days:
+                values[f"{spec.name}:baseline"] = self._value(
+                    spec, row, offset=spec.baseline_offset_days
+                )
+        return values
+
+    def _value(self, spec, row, offset):
+        key = self._key(spec, offset)
+        metric = METRICS[spec.metric]
+        if spec.aggregate == "avg" and metric.per:
+            numerator, denominator = row.get(f"{key}__num"), row.get(f"{key}__den")
+            return float(numerator) / denominator if denominator else None
+        value = row.get(key)
+        if value is None and spec.aggregate in ("count", "sum"):
+            return 0  # no rows in the window
+        return float(value) if value is not None else None
+
+    def evaluate(self, user_ids, targets=None) -> Dict[int, List[RuleOutcome]]:
+        """
+        Evaluate every spec for every user.
+        `targets` maps user_id -> HealthTargets; loaded in one query when
+        any spec needs a per-user target and none are given.
+        """
+        user_ids = list(user_ids)
+        values = self.values_for(user_ids)
+        if targets is None and any(spec.target for spec in self.specs):
+            from .reminders_engine import HealthCalculator
+            targets = HealthCalculator.targets_for_users(user_ids)
+
+        outcomes = {}
+        for user_id in user_ids:
+            user_values = values[user_id]
+            outcomes[user_id] = []
+            for spec in self.specs:
+                if spec.target:
+                    user_targets = (targets or {}).get(user_id)
+                    base = getattr(user_targets, spec.target, None)
+                elif spec.baseline_offset_days:
+                    base = user_values[f"{spec.name}:baseline"]
+                else:
+                    base = None
+                value = user_values[spec.name]
+                outcomes[user_id].append(RuleOutcome(
+                    spec=spec,
+                    value=value,
+                    threshold=spec.threshold_for(base),
+                    triggered=spec.is_triggered(value, base),
+                ))
+        return outcomes
+
+    def evaluate_user(self, user, targets=None) -> List[RuleOutcome]:
+        """Evaluate every spec for one user."""
+        if targets is not None:
+            targets = {user.pk: targets}
+        return self.evaluate([user.pk], targets=targets)[user.pk]
+
+
+def compile_rules(specs: Iterable[RuleSpec]) -> CompiledRules:
+    return CompiledRules(specs)
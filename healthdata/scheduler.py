@@ -0,0 +1,144 @@
+# healthdata/scheduler.py
+"""
+Local background scheduling for rule evaluation.
+
+Writes to a user's input tables (NutritionEntry, ActivityData, SleepData,
+HealthMetrics, Profile) queue that user together with the rules that read
+the table (see healthdata.signals). The worker (`manage.py
+run_reminder_worker`) picks up users whose queue row has been quiet for
+`settle_seconds`, so a burst of writes (e.g. a 50-row wearable sync) is
+coalesced into one evaluation, and runs only the queued rules: reminders
+in batches, ai_agent rules by name. Page views only read HealthReminder and
+ProviderAlert rows.
+
+Time-based changes (e.g. a user who stopped logging, or a rolling window
+moving on with the date) are covered by the nightly jobs:
+`generate_reminders`, `sweep_provider_alerts`, `rebuild_sleep_rollups` and
+`rebuild_activity_levels`.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from usermanagement.models import ConsentingUser, Profile
+from . import ai_agent
+from .models import NutritionEntry, ReminderRefresh
+from .reminders_engine import ReminderSweep
+
+# Queue names of the checks that are not ai_agent rules, with their inputs.
+# The ReminderEngine checks share one snapshot, so they are queued together.
+REMINDERS = 'reminders'
+PATTERNS = 'detect_health_patterns'
+CHECK_INPUTS = {
+    REMINDERS: (NutritionEntry, Profile),
+    PATTERNS: (NutritionEntry,),
+}
+
+# Quiet period before a queued user is evaluated (seconds)
+SETTLE_SECONDS = 2
+
+
+def rules_reading(model):
+    """Queue names of every check and enabled ai_agent rule that reads `model`."""
+    names = [name for name, inputs in CHECK_INPUTS.items() if model in inputs]
+    names.extend(rule.name for rule in ai_agent.RULES if rule.enabled and model in rule.reads)
+    return names
+
+
+def mark_user_dirty(user_id, rules=(REMINDERS,), create=True):
+    """
+    Queue `rules` (queue names, see rules_reading) for a user.
+    Pass create=False from delete handlers: the user may be going away too.
+    """
+    if not rules:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        row = ReminderRefresh.objects.select_for_update().filter(user_id=user_id).first()
+        if row is None:
+            if create:
+                ReminderRefresh.objects.get_or_create(
+                    user_id=user_id, defaults={'changed_at': now, 'pending_rules': sorted(set(rules))}
+                )
+            return
+        pending = set(row.pending_rules) | set(rules)
+        if pending == set(row.pending_rules):
+            ReminderRefresh.objects.filter(pk=row.pk).update(changed_at=now)
+        else:
+            ReminderRefresh.objects.filter(pk=row.pk).update(changed_at=now, pending_rules=sorted(pending))
+
+
+def pending_refreshes():
+    """Queue rows whose data changed since their last run, oldest first."""
+    return (
+        ReminderRefresh.objects
+        .filter(Q(last_run_at__isnull=True) | Q(changed_at__gt=F('last_run_at')))
+        .order_by('changed_at')
+    )
+
+
+def _queued(row):
+    # Rows queued before rules were tracked only meant the reminders
+    return set(row.pending_rules) or {REMINDERS}
+
+
+def run_pending(limit=500, settle_seconds=SETTLE_SECONDS):
+    """
+    Evaluate the queued rules for up to `limit` dirty users whose last
+    change is at least `settle_seconds` old.
+    Returns (users_processed, reminders_written, alerts_written).
+    Reminders that collide with an existing dedup fingerprint are skipped,
+    and alerts are deduped as in ai_agent.evaluate_user.
+    """
+    started = timezone.now()
+    rows = list(
+        pending_refreshes()
+        .filter(changed_at__lte=started - timedelta(seconds=settle_seconds), user__profile__isnull=False)
+        .select_related('user__profile')[:limit]
+    )
+    if not rows:
+        return 0, 0, 0
+
+    reminder_users = [row.user for row in rows if REMINDERS in _queued(row)]
+    written = ReminderSweep(batch_size=limit).process_batch(reminder_users) if reminder_users else []
+
+    from usermanagement.utils import detect_health_patterns
+
+    agent_rules = {rule.name for rule in ai_agent.RULES}
+    consenting = ConsentingUser.among(row.user_id for row in rows)
+    last_sent = ai_agent.recent_alert_times([row.user_id for row in rows])
+    alerts = []
+    with transaction.atomic():
+        for row in rows:
+            queued = _queued(row)
+            if queued & agent_rules:
+                alerts.extend(ai_agent.evaluate_user(
+                    row.user, only=queued & agent_rules, save=False, last_sent=last_sent,
+                    consented=row.user_id in consenting,
+                ))
+            if PATTERNS in queued:
+                ai_agent.run_if_changed(row.user, PATTERNS, CHECK_INPUTS[PATTERNS], detect_health_patterns)
+        created = ai_agent.save_alerts(alerts)
+
+    # Mark as run as of `started`, so changes made while we were working
+    # leave the row (and its queued rules) pending for the next pass.
+    done = ReminderRefresh.objects.filter(pk__in=[row.pk for row in rows])
+    done.filter(changed_at__lte=started).update(last_run_at=started, pending_rules=[])
+    done.filter(changed_at__gt=started).update(last_run_at=started)
+    return len(rows), len(written), len(created)
+
+
+def run_worker(interval=5, batch_size=500, once=False, log=None, settle_seconds=SETTLE_SECONDS):
+    """Poll the queue forever (or until it is drained, if `once`)."""
+    while True:
+        processed, written, alerts = run_pending(limit=batch_size, settle_seconds=settle_seconds)
+        if processed and log:
+            log(f"Processed {processed} user(s), wrote {written} reminder(s) and {alerts} alert(s).")
+        if processed == batch_size:
+            continue  # more work waiting, don't sleep
+        if once:
+            return
+        time.sleep(interval)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import NutritionEntry
 from .models import HealthReminder
+from usermanagement.models import ProviderAlert
 
 class NutritionEntrySerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,6 +27,7 @@ class HealthReminderSerializer(serializers.ModelSerializer):
     """
     Serializer for HealthReminder API.
     Provides read-only access to reminders and actions to dismiss/act on them.
+    List payloads carry no explanation text; see HealthReminderDetailSerializer.
     """
     is_active = serializers.ReadOnlyField()
 
@@ -36,9 +38,7 @@ class HealthReminderSerializer(serializers.ModelSerializer):
             'reminder_type',
             'title',
             'message',
-            'explanation',
             'priority',
-            'actionable_steps',
             'created_at',
             'dismissed_at',
             'acted_upon',
@@ -51,3 +51,28 @@ class HealthReminderSerializer(serializers.ModelSerializer):
             'dismissed_at',
             'acted_upon_at',
         ]
+
+
+class HealthReminderDetailSerializer(HealthReminderSerializer):
+    """
+    Single-reminder serializer: adds the explanation and actionable steps,
+    rendered from the reminder's template.
+    """
+    explanation = serializers.ReadOnlyField(source='rendered_explanation')
+    actionable_steps = serializers.ReadOnlyField(source='rendered_steps')
+
+    class Meta(HealthReminderSerializer.Meta):
+        fields = HealthReminderSerializer.Meta.fields + [
+            'explanation',
+            'actionable_steps',
+        ]
+
+
+class ProviderAlertSerializer(serializers.ModelSerializer):
+    """Serializer for the provider alert inbox API (read-only)."""
+    cursor = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ProviderAlert
+        fields = ['id', 'alert_type', 'severity', 'message', 'created_at', 'reviewed', 'cursor']
+        read_only_fields = fields
@@ -0,0 +1,86 @@
+# healthdata/signals.py
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from usermanagement.models import Profile
+from .activity_level import refresh_activity_level
+from .models import ActivityData, HealthMetrics, NutritionEntry, SleepData
+from .reminders_engine import HealthCalculator
+from .rollups import ROLLUP_FIELDS, apply_entry, apply_entry_change, entry_values
+from .scheduler import mark_user_dirty, rules_reading
+from .sleep_analytics import refresh_rollup
+from .vitals import process_reading
+
+
+@receiver(pre_save, sender=NutritionEntry)
+def remember_previous_entry(sender, instance, **kwargs):
+    # Keep the stored values so post_save can move the rollup delta
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = (
+            NutritionEntry.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=NutritionEntry)
+def nutrition_entry_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is None:
+        apply_entry(entry_values(instance), 1)
+    else:
+        apply_entry_change(previous, entry_values(instance))
+
+    # New/edited meals change the inputs of the reminder and agent rules
+    mark_user_dirty(instance.user_id, rules_reading(NutritionEntry))
+
+
+@receiver(post_delete, sender=NutritionEntry)
+def nutrition_entry_deleted(sender, instance, **kwargs):
+    apply_entry(entry_values(instance), -1)
+    mark_user_dirty(instance.user_id, rules_reading(NutritionEntry), create=False)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, update_fields, **kwargs):
+    # Profile.save() bumped the version: store targets for it (same transaction)
+    if update_fields is None or 'version' in update_fields:
+        HealthCalculator.refresh_stored_targets(instance)
+    # Targets (and the profile-completion check) depend on profile fields
+    mark_user_dirty(instance.user_id, rules_reading(Profile))
+
+
+@receiver(post_save, sender=HealthMetrics)
+def vitals_logged(sender, instance, created, **kwargs):
+    # Streaming baselines: fold each new reading in O(1); edits are not replayed
+    if created:
+        process_reading(instance)
+    mark_user_dirty(instance.user_id, rules_reading(HealthMetrics))
+
+
+@receiver(post_save, sender=SleepData)
+def sleep_saved(sender, instance, **kwargs):
+    refresh_rollup(instance.user_id)
+    mark_user_dirty(instance.user_id, rules_reading(SleepData))
+
+
+@receiver(post_delete, sender=SleepData)
+def sleep_deleted(sender, instance, **kwargs):
+    refresh_rollup(instance.user_id, create=False)
+    mark_user_dirty(instance.user_id, rules_reading(SleepData), create=False)
+
+
+@receiver(post_save, sender=ActivityData)
+def activity_saved(sender, instance, **kwargs):
+    refresh_activity_level(instance.user_id)
+    mark_user_dirty(instance.user_id, rules_reading(ActivityData))
+
+
+@receiver(post_delete, sender=ActivityData)
+def activity_deleted(sender, instance, **kwargs):
+    refresh_activity_level(instance.user_id)
+    mark_user_dirty(instance.user_id, rules_reading(ActivityData), create=False)
+
+
+@receiver(post_delete, sender=HealthMetrics)
+def vitals_deleted(sender, instance, **kwargs):
+    mark_user_dirty(instance.user_id, rules_reading(HealthMetrics), create=False)
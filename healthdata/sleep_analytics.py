@@ -0,0 +1,180 @@
+# healthdata/sleep_analytics.py
+"""
+Sleep analytics over SleepData, persisted as one SleepRollup per user.
+
+compute() turns a user's last 30 nights into 7- and 30-day averages of
+total, deep, REM and awake minutes, counts of short nights, a regularity
+index from the bed and wake times, and trend flags. Column math is
+vectorized with NumPy when it is installed (plain Python otherwise). The
+rollup is refreshed when a user's nights change, and by the nightly
+`rebuild_sleep_rollups`.
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SleepData, SleepRollup
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency; pure-Python fallback below
+    np = None
+
+WINDOWS = (7, 30)
+SHORT_NIGHT_MINUTES = 5 * 60
+SHORT_NIGHT_WINDOWS = (5, 7)  # short-night counts kept on the rollup
+STAGES = {
+    'total': 'total_sleep_minutes',
+    'deep': 'deep_sleep_minutes',
+    'rem': 'rem_sleep_minutes',
+    'awake': 'awake_minutes',
+}
+NIGHT_FIELDS = ('date', *STAGES.values(), 'bedtime_start', 'bedtime_end')
+
+# Trend flags
+SHORT_SLEEP_MINUTES = 6 * 60   # 7-day average below this
+DECLINE_RATIO = 0.9            # 7-day average < 90% of the 30-day average
+LOW_DEEP_SHARE = 0.10          # deep sleep < 10% of total
+FRAGMENTED_AWAKE_MINUTES = 60  # > 1h awake per night
+IRREGULAR_INDEX = 60           # regularity index below this
+REGULARITY_ZERO_SD = 120       # bed/wake time SD (minutes) that scores 0
+
+
+def _masked_mean(values, mask):
+    """Mean of the non-null values where mask is true (None if there are none)."""
+    if np is not None:
+        column = np.asarray(values, dtype=float)[np.asarray(mask, dtype=bool)]
+        column = column[~np.isnan(column)]
+        return float(column.mean()) if column.size else None
+    column = [v for v, keep in zip(values, mask) if keep and v is not None]
+    return sum(column) / len(column) if column else None
+
+
+def _circular_sd_minutes(minutes):
+    """Circular standard deviation of clock times (minutes after midnight)."""
+    if len(minutes) < 2:
+        return None
+    if np is not None:
+        angles = np.asarray(minutes, dtype=float) * (2 * math.pi / 1440)
+        resultant = float(np.hypot(np.cos(angles).mean(), np.sin(angles).mean()))
+    else:
+        angles = [m * 2 * math.pi / 1440 for m in minutes]
+        resultant = math.hypot(
+            sum(map(math.cos, angles)) / len(angles), sum(map(math.sin, angles)) / len(angles)
+        )
+    if resultant >= 1:
+        return 0.0
+    return math.sqrt(-2 * math.log(max(resultant, 1e-12))) * 1440 / (2 * math.pi)
+
+
+def _clock_minutes(moments):
+    local = [timezone.localtime(moment) for moment in moments if moment is not None]
+    return [m.hour * 60 + m.minute for m in local]
+
+
+def regularity_index(bedtimes, waketimes):
+    """
+    0-100 score of how consistent bed and wake times are: 100 when they
+    never vary, 0 when their circular SD reaches REGULARITY_ZERO_SD minutes.
+    """
+    deviations = [
+        sd for sd in (_circular_sd_minutes(_clock_minutes(bedtimes)), _circular_sd_minutes(_clock_minutes(waketimes)))
+        if sd is not None
+    ]
+    if not deviations:
+        return None
+    spread = sum(deviations) / len(deviations)
+    return round(100 * max(0.0, 1 - spread / REGULARITY_ZERO_SD), 1)
+
+
+def compute(nights, today=None):
+    """
+    Rollup field values from a user's nights: dicts with NIGHT_FIELDS,
+    covering at least the last 30 days.
+    """
+    today = today or timezone.localdate()
+    nights = [night for night in nights if 0 <= (today - night['date']).days < max(WINDOWS)]
+    ages = [(today - night['date']).days for night in nights]
+    columns = {stage: [night[field] for night in nights] for stage, field in STAGES.items()}
+
+    values = {'computed_on': today}
+    for window in WINDOWS:
+        mask = [age < window for age in ages]
+        values[f'nights_{window}'] = sum(mask)
+        for stage, column in columns.items():
+            values[f'avg_{stage}_{window}'] = _masked_mean(column, mask)
+
+    for window in SHORT_NIGHT_WINDOWS:
+        values[f'short_nights_{window}'] = sum(
+            1 for total, age in zip(columns['total'], ages) if age < window and total < SHORT_NIGHT_MINUTES
+        )
+    values['regularity_index'] = regularity_index(
+        [night['bedtime_start'] for night in nights], [night['bedtime_end'] for night in nights]
+    )
+    values['flags'] = trend_flags(values)
+    return values
+
+
+def trend_flags(values):
+    flags = []
+    total_7, total_30 = values['avg_total_7'], values['avg_total_30']
+    if total_7 is not None and total_7 < SHORT_SLEEP_MINUTES:
+        flags.append('short_sleep')
+    if total_7 and total_30 and values['nights_7'] >= 4 and values['nights_30'] >= 14 \
+            and total_7 < DECLINE_RATIO * total_30:
+        flags.append('declining_duration')
+    if values['avg_deep_7'] is not None and total_7 and values['avg_deep_7'] < LOW_DEEP_SHARE * total_7:
+        flags.append('low_deep_sleep')
+    if values['avg_awake_7'] is not None and values['avg_awake_7'] > FRAGMENTED_AWAKE_MINUTES:
+        flags.append('fragmented')
+    if values['regularity_index'] is not None and values['regularity_index'] < IRREGULAR_INDEX:
+        flags.append('irregular_schedule')
+    return flags
+
+
+def _recent_nights(user_ids, today):
+    since = today - timedelta(days=max(WINDOWS))
+    return SleepData.objects.filter(user_id__in=user_ids, date__gt=since).values('user_id', *NIGHT_FIELDS)
+
+
+def refresh_rollup(user_id, create=True):
+    """
+    Recompute one user's SleepRollup (one read of <= 30 nights, one upsert).
+    With create=False only an existing rollup is updated (deletes, where the
+    user may be going away too).
+    """
+    today = timezone.localdate()
+    values = compute(_recent_nights([user_id], today), today)
+    if not create:
+        SleepRollup.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **values)
+        return None
+    rollup, _ = SleepRollup.objects.update_or_create(user_id=user_id, defaults=values)
+    return rollup
+
+
+def rebuild_rollups(user_ids=None, batch_size=1000):
+    """
+    Recompute rollups for all users with sleep data (or the given ids), in
+    batches. Users without nights in the last 30 days lose their rollup.
+    Returns the number of rollups written.
+    """
+    today = timezone.localdate()
+    if user_ids is None:
+        user_ids = SleepData.objects.order_by().values_list('user_id', flat=True).distinct()
+    user_ids = sorted(set(user_ids))
+
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        nights = {}
+        for night in _recent_nights(batch, today):
+            nights.setdefault(night['user_id'], []).append(night)
+
+        rollups = [SleepRollup(user_id=user_id, **compute(rows, today)) for user_id, rows in nights.items()]
+        with transaction.atomic():
+            SleepRollup.objects.filter(user_id__in=batch).delete()
+            SleepRollup.objects.bulk_create(rollups)
+        written += len(rollups)
+    return written
@@ -1,3 +1,680 @@
-from django.test import TestCase
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from usermanagement.models import Profile, ProviderAlert
+from . import ai_agent, alert_sweep, benchmark, cohort_export, explanations, instrumentation, vectorized
+from .activity_level import rebuild_activity_levels
+from .ai_agent import RULE_SPECS, evaluate_user, evaluate_users, recent_alert_times
+from .models import (
+    ActivityData, DailyNutritionSummary, HealthMetrics, HealthReminder, NutritionEntry, ReminderRefresh, SleepData,
+    VitalBaseline,
+)
+from .reminders_engine import REMINDER_RULES, HealthCalculator, ReminderEngine, ReminderSweep, UserNutritionSnapshot
+from .rollups import rebuild_summaries
+from .rules import compile_rules
+from .scheduler import PATTERNS, REMINDERS, pending_refreshes, run_pending
+from .sleep_analytics import compute
+from .vitals import rebuild_baselines
+
+User = get_user_model()
+
+
+def make_user(username, **profile_fields):
+    user = User.objects.create_user(username, password="x")
+    if profile_fields:
+        Profile.objects.filter(user=user).update(**profile_fields)
+    return user
+
+
+def make_patient(username, **profile_fields):
+    """A user whose complete profile went through Profile.save."""
+    user = User.objects.create_user(username, password="x")
+    profile = Profile.objects.get(user=user)
+    for field, value in {"age": 35, "height_cm": 170, "weight_kg": 65, "sex": "female", **profile_fields}.items():
+        setattr(profile, field, value)
+    profile.save()
+    return User.objects.select_related("profile").get(pk=user.pk)
+
+
+class ReminderSweepTests(TestCase):
+    def population(self, prefix, size):
+        return User.objects.filter(pk__in=[make_patient(f"{prefix}{n}").pk for n in range(size)])
+
+    def sweep_queries(self, users, batch_size):
+        with CaptureQueriesContext(connection) as queries:
+            checked, written = ReminderSweep(batch_size=batch_size, use_numpy=False).run(users)
+        self.assertEqual((checked, written), (len(users), len(users)))  # nobody logs: logging_gaps
+        return len(queries)
+
+    def test_queries_grow_with_batches_not_users(self):
+        two = self.sweep_queries(self.population("a", 2), batch_size=10)
+        six = self.sweep_queries(self.population("b", 6), batch_size=10)
+        self.assertEqual(six, two)
+        self.assertGreater(self.sweep_queries(self.population("c", 6), batch_size=2), six)
+
+    def test_generate_reminders_command(self):
+        self.population("d", 3)
+        output = StringIO()
+        call_command("generate_reminders", "--batch-size", "2", stdout=output)
+        self.assertIn("Checked 3 user(s), wrote 3 reminder(s)", output.getvalue())
+        self.assertEqual(HealthReminder.objects.filter(title=ReminderEngine.LOGGING_TITLE).count(), 3)
+
+
+class BackgroundGenerationTests(TestCase):
+    def setUp(self):
+        self.user = make_patient("max")
+        ReminderRefresh.objects.all().delete()
+        self.client.force_login(self.user)
+
+    def test_generate_only_queues_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("reminders-generate"))
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(HealthReminder.objects.exists())
+        self.assertFalse(any("healthdata_healthreminder" in q["sql"] for q in queries))
+        self.assertIn(REMINDERS, ReminderRefresh.objects.get(user=self.user).pending_rules)
+
+    def test_dashboard_only_reads(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("reminders_dashboard"))
+        self.assertFalse([q for q in queries if not q["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))])
+        self.assertFalse(ReminderRefresh.objects.exists())
+
+    def test_worker_writes_the_queued_reminders_once(self):
+        self.client.post(reverse("reminders-generate"))
+        self.assertEqual(run_pending(settle_seconds=0), (1, 1, 0))
+        self.assertFalse(pending_refreshes().exists())
+        self.assertEqual(run_pending(settle_seconds=0), (0, 0, 0))
+        self.assertEqual(HealthReminder.objects.filter(user=self.user).count(), 1)
+
+
+class NutritionSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = make_patient("eve")
+        today = timezone.localdate()
+        for day, calories, protein in ((today, 500, 40), (today, 300, None), (today - timedelta(days=1), 700, 20)):
+            NutritionEntry.objects.create(
+                user=self.user, logged_at=day, meal_type="lunch", calories=calories,
+                protein_g=None if protein is None else Decimal(protein),
+            )
+
+    def test_one_query_per_snapshot(self):
+        with self.assertNumQueries(1):
+            snapshot = UserNutritionSnapshot.for_user(self.user)
+        self.assertEqual(float(snapshot.avg_calories), 500)
+        self.assertEqual(float(snapshot.avg_protein), 30)
+        self.assertEqual(snapshot.days_logged, 2)
+
+    def test_one_query_for_many_users(self):
+        others = [make_patient(f"eve{n}") for n in range(3)]
+        with self.assertNumQueries(1):
+            snapshots = UserNutritionSnapshot.for_users([self.user.pk, *(user.pk for user in others)])
+        self.assertEqual(len(snapshots), 4)
+        self.assertEqual(snapshots[others[0].pk].days_logged, 0)
+
+    def test_checks_read_only_the_snapshot(self):
+        snapshot = UserNutritionSnapshot.for_user(self.user)
+        engine = ReminderEngine(self.user)
+        with self.assertNumQueries(0):
+            reminders = engine.evaluate(snapshot)
+        self.assertEqual(len(reminders), 3)  # low intake, low protein, 2 of 7 days logged
+
+
+class ReminderDedupTests(TestCase):
+    def setUp(self):
+        self.user = make_user("lee")  # empty profile: the completion reminder fires
+        instrumentation.reset()
+
+    def run_engine(self):
+        with CaptureQueriesContext(connection) as queries:
+            written = ReminderEngine(self.user).analyze_and_create_reminders()
+        reads = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and "healthdata_healthreminder" in q["sql"]]
+        return written, reads
+
+    def test_second_run_writes_nothing(self):
+        [written], _ = self.run_engine()
+        self.assertIsNotNone(written.pk)
+        self.assertEqual(self.run_engine()[0], [])
+        self.assertEqual(HealthReminder.objects.filter(user=self.user).count(), 1)
+
+    def test_duplicates_are_dropped_without_a_pre_read(self):
+        self.run_engine()
+        _, reads = self.run_engine()
+        self.assertEqual(len(reads), 1)  # only the read-back after the insert
+
+    def test_sweep_counts_only_inserted_rows(self):
+        sweep = ReminderSweep(batch_size=10, use_numpy=False)
+        self.assertEqual(sweep.run(), (1, 1))
+        self.assertEqual(sweep.run(), (1, 0))
+
+    @override_settings(HEALTH_RULE_COUNT_DUPLICATES=True)
+    def test_duplicates_are_counted_when_profiling(self):
+        self.run_engine()
+        written, reads = self.run_engine()
+        self.assertEqual((written, len(reads)), ([], 1))
+        self.assertEqual(HealthReminder.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(instrumentation.stats()["reminder.profile_incomplete"]["suppressed"], 1)
+
+    def test_rule_stats_command_reports_suppressions(self):
+        self.run_engine()  # the reminder from an earlier (real) run
+        output = StringIO()
+        call_command("rule_stats", "--json", stdout=output)
+        self.assertEqual(json.loads(output.getvalue())["reminder.profile_incomplete"]["suppressed"], 1)
+
+
+class NutritionRollupTests(TestCase):
+    def setUp(self):
+        self.user = make_user("sam")
+        self.today = timezone.localdate()
+
+    def log(self, **fields):
+        fields.setdefault("logged_at", self.today)
+        return NutritionEntry.objects.create(user=self.user, meal_type="lunch", **fields)
+
+    def summary(self, day=None):
+        return DailyNutritionSummary.objects.get(user=self.user, date=day or self.today)
+
+    def test_create_update_and_delete_move_the_day_totals(self):
+        first = self.log(calories=500, protein_g=Decimal("30"))
+        second = self.log(calories=300)
+        row = self.summary()
+        self.assertEqual((row.calories, row.protein_g, row.entry_count, row.protein_entry_count), (800, 30, 2, 1))
+
+        second.calories = 400
+        second.protein_g = Decimal("10")
+        second.save()
+        row = self.summary()
+        self.assertEqual((row.calories, row.protein_g, row.protein_entry_count), (900, 40, 2))
+
+        first.delete()
+        row = self.summary()
+        self.assertEqual((row.calories, row.protein_g, row.entry_count), (400, 10, 1))
+
+    def test_moving_an_entry_to_another_day(self):
+        entry = self.log(calories=600)
+        yesterday = self.today - timedelta(days=1)
+        entry.logged_at = yesterday
+        entry.save()
+        self.assertEqual((self.summary().calories, self.summary().entry_count), (0, 0))
+        self.assertEqual(self.summary(yesterday).calories, 600)
+
+    def test_rebuild_matches_incremental_rows(self):
+        self.log(calories=500, protein_g=Decimal("20"))
+        self.log(calories=250, logged_at=self.today - timedelta(days=2))
+        incremental = sorted(
+            DailyNutritionSummary.objects.filter(entry_count__gt=0).values_list("date", "calories", "protein_g")
+        )
+        rebuild_summaries([self.user.pk])
+        self.assertEqual(sorted(DailyNutritionSummary.objects.values_list("date", "calories", "protein_g")), incremental)
+
+
+class ProfileTargetsTests(TestCase):
+    def setUp(self):
+        self.user = make_user("alex", age=30, height_cm=180, weight_kg=80, sex="male")
+
+    def stored(self):
+        return Profile.objects.get(user=self.user)
+
+    def test_partial_save_stores_targets_for_new_version(self):
+        profile = self.stored()
+        version = profile.version
+        profile.weight_kg = 90
+        profile.save(update_fields=["weight_kg"])
+
+        row = self.stored()
+        self.assertEqual(row.version, version + 1)
+        self.assertTrue(row.targets_are_current)
+        self.assertEqual(row.tdee, HealthCalculator.compute_targets(row).tdee)
+        self.assertEqual((profile.version, profile.tdee), (row.version, row.tdee))
+
+    def test_interleaved_partial_saves_keep_targets_current(self):
+        first, second = self.stored(), self.stored()
+        first.weight_kg = 100
+        first.save(update_fields=["weight_kg"])
+        # `second` still holds the old weight in memory
+        second.age = 60
+        second.save(update_fields=["age"])
+
+        row = self.stored()
+        self.assertEqual((row.age, float(row.weight_kg)), (60, 100.0))
+        self.assertEqual(row.version, first.version + 1)
+        self.assertTrue(row.targets_are_current)
+        self.assertEqual(row.bmr, HealthCalculator.calculate_bmr(row))
+
+    def test_non_input_save_keeps_version(self):
+        profile = self.stored()
+        version = profile.version
+        profile.set_consent(True)
+        self.assertEqual(self.stored().version, version)
+
+    def test_rebuild_activity_levels_bumps_version_with_targets(self):
+        today = timezone.localdate()
+        ActivityData.objects.bulk_create([
+            ActivityData(user=self.user, date=today - timedelta(days=offset), steps=15000, active_minutes=90)
+            for offset in range(10)
+        ])
+        version = self.stored().version
+
+        self.assertEqual(rebuild_activity_levels([self.user.pk]), 1)
+        row = self.stored()
+        self.assertEqual(row.inferred_activity_level, "very_active")
+        self.assertEqual(row.version, version + 1)
+        self.assertTrue(row.targets_are_current)
+        self.assertEqual(row.tdee, HealthCalculator.compute_targets(row).tdee)
+
+
+class ReminderExplanationTests(TestCase):
+    def setUp(self):
+        self.user = make_user("ray")  # empty profile: the completion reminder fires
+        [self.reminder] = ReminderEngine(self.user).analyze_and_create_reminders()
+        self.client.force_login(self.user)
+
+    def test_explanation_and_steps_render_once(self):
+        reminder = HealthReminder.objects.get(pk=self.reminder.pk)
+        with mock.patch.object(explanations, "render", wraps=explanations.render) as render:
+            self.assertTrue(reminder.rendered_explanation)
+            self.assertTrue(reminder.rendered_steps)
+        self.assertEqual(render.call_count, 1)
+
+    def test_dashboard_renders_explanations_only_on_request(self):
+        detail_url = reverse("reminders-detail", args=[self.reminder.pk])
+        with mock.patch.object(explanations, "render", wraps=explanations.render) as render:
+            page = self.client.get(reverse("reminders_dashboard"))
+            self.assertEqual(render.call_count, 0)
+            self.assertContains(page, f'data-details="{detail_url}"')
+
+            detail = self.client.get(detail_url).json()
+            self.assertEqual(render.call_count, 1)
+        self.assertTrue(detail["explanation"])
+        self.assertTrue(detail["actionable_steps"])
+
+
+@unittest.skipUnless(vectorized.available(), "NumPy is not installed")
+class VectorizedParityTests(TestCase):
+    """The NumPy cohort path must agree with the grouped SQL path."""
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.user_ids = []
+        for n, calories in enumerate((1900, 2500, 800)):
+            user = make_user(f"cohort{n}", age=40, height_cm=170, weight_kg=70, sex="female")
+            self.user_ids.append(user.pk)
+            # -2 is a future-dated row: outside every window ending today
+            for offset in (-2, 0, 1, 3, 5, 9, 12):
+                day = today - timedelta(days=offset)
+                NutritionEntry.objects.create(
+                    user=user, logged_at=day, meal_type="dinner",
+                    calories=calories + 100 * offset, protein_g=Decimal(20 + offset),
+                )
+                ActivityData.objects.bulk_create([ActivityData(user=user, date=day, steps=4000 + 500 * offset)])
+                SleepData.objects.bulk_create([SleepData(user=user, date=day, total_sleep_minutes=240 + 20 * offset)])
+
+    def test_values_match_sql(self):
+        specs = [*REMINDER_RULES.values(), *RULE_SPECS]
+        sql = compile_rules(specs).values_for(self.user_ids)
+        cohort = vectorized.load_cohort(self.user_ids, specs)
+
+        for spec in specs:
+            offsets = {spec.name: 0}
+            if spec.baseline_offset_days:
+                offsets[f"{spec.name}:baseline"] = spec.baseline_offset_days
+            for key, offset in offsets.items():
+                arrays = vectorized.aggregate(cohort, spec, offset=offset)
+                for user_id, value in zip(cohort.user_ids.tolist(), arrays.tolist()):
+                    expected = sql[user_id][key]
+                    with self.subTest(rule=key, user=user_id):
+                        if expected is None:
+                            self.assertTrue(math.isnan(value))
+                        else:
+                            self.assertAlmostEqual(value, expected, places=6)
+
+    def test_cohort_alerts_match_per_user_evaluation(self):
+        today = timezone.localdate()
+        struggling = make_user("struggling", age=40, height_cm=170, weight_kg=70, sex="female")
+        for offset in range(14):
+            day = today - timedelta(days=offset)
+            NutritionEntry.objects.create(user=struggling, logged_at=day, meal_type="lunch", calories=600)
+            ActivityData.objects.create(user=struggling, date=day, steps=1000 if offset < 7 else 9000)
+        users = list(User.objects.filter(pk__in=[*self.user_ids, struggling.pk]).order_by("pk"))
+        for user in users:
+            Profile.objects.get(user=user).set_consent(True)
+        per_user = sorted(
+            (alert.user_id, alert.alert_type)
+            for user in users for alert in evaluate_user(user, force=True, save=False)
+        )
+        cohort = sorted((alert.user_id, alert.alert_type) for alert in evaluate_users(users, save=False))
+        self.assertIn((struggling.pk, "Nutrition:LowIntake"), per_user)
+        self.assertIn((struggling.pk, "Activity:SharpDrop"), per_user)
+        self.assertEqual(cohort, per_user)
+
+
+class BenchmarkPopulationTests(TestCase):
+    config = benchmark.PopulationConfig(users=6, days=8, seed=7)
+
+    def steps(self, user_ids):
+        return [
+            list(ActivityData.objects.filter(user_id=user_id).order_by("date").values_list("steps", flat=True))
+            for user_id in user_ids
+        ]
+
+    def test_same_seed_same_population(self):
+        make_user("someone")  # primary keys differ between the two runs
+        first = benchmark.seed_population(self.config)
+        make_user("someone_else")
+        second = benchmark.seed_population(self.config)
+        self.assertEqual(self.steps(first), self.steps(second))
+
+    def test_cleanup_deletes_only_the_seeded_users(self):
+        bystander = make_user("bench_owner")
+        report = benchmark.run_benchmark(self.config, engines=["reminder_engine"])
+        self.assertEqual(report["engines"]["reminder_engine"]["users"], 6)
+        self.assertEqual(list(User.objects.values_list("pk", flat=True)), [bystander.pk])
+
+
+def log_struggling_fortnight(user):
+    """Low intake every day, and a sharp activity drop this week: two agent rules fire."""
+    today = timezone.localdate()
+    for offset in range(14):
+        day = today - timedelta(days=offset)
+        NutritionEntry.objects.create(user=user, logged_at=day, meal_type="lunch", calories=600)
+        ActivityData.objects.create(user=user, date=day, steps=1000 if offset < 7 else 9000)
+
+
+class AlertDedupTests(TestCase):
+    def setUp(self):
+        self.user = make_user("val", age=40, height_cm=170, weight_kg=70, sex="female")
+        Profile.objects.get(user=self.user).set_consent(True)
+        log_struggling_fortnight(self.user)
+
+    def evaluate(self):
+        with CaptureQueriesContext(connection) as queries:
+            alerts = evaluate_user(self.user, force=True)
+        reads = [q for q in queries if q["sql"].startswith("SELECT") and '"usermanagement_provideralert"' in q["sql"]]
+        return sorted(alert.alert_type for alert in alerts), len(reads)
+
+    def test_one_grouped_query_checks_every_triggered_rule(self):
+        self.assertEqual(self.evaluate(), (["Activity:SharpDrop", "Nutrition:LowIntake"], 1))
+        self.assertEqual(self.evaluate(), ([], 1))
+        self.assertEqual(ProviderAlert.objects.filter(user=self.user).count(), 2)
+
+    def test_alerts_fire_again_after_the_dedup_window(self):
+        self.evaluate()
+        ProviderAlert.objects.filter(user=self.user).update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.evaluate()[0], ["Activity:SharpDrop", "Nutrition:LowIntake"])
+
+
+class RuleMemoizationTests(TestCase):
+    def setUp(self):
+        self.user = make_user("kim")
+        Profile.objects.get(user=self.user).set_consent(True)
+        today = timezone.localdate()
+        self.nights = [
+            SleepData.objects.create(user=self.user, date=today - timedelta(days=offset), total_sleep_minutes=420)
+            for offset in range(5)
+        ]
+
+    def sleep_alerts(self):
+        return [alert.alert_type for alert in evaluate_user(self.user, only={"Insufficient Sleep"})]
+
+    def test_unchanged_inputs_skip_the_rule(self):
+        self.assertEqual(self.sleep_alerts(), [])
+        with self.assertNumQueries(3):  # consent, watermarks, evaluation state
+            self.assertEqual(self.sleep_alerts(), [])
+
+    def test_editing_a_row_invalidates_the_memo(self):
+        self.assertEqual(self.sleep_alerts(), [])
+        for night in self.nights[:3]:
+            night.total_sleep_minutes = 240
+            night.save()
+        self.assertEqual(self.sleep_alerts(), ["Sleep:Insufficient"])
+
+
+class AlertSweepTests(TestCase):
+    def setUp(self):
+        self.user_ids = []
+        for n in range(5):
+            user = make_user(f"sweep{n}")
+            Profile.objects.get(user=user).set_consent(True)
+            self.user_ids.append(user.pk)
+        make_user("not_consenting")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sweep.json")
+
+    def sweep(self):
+        return alert_sweep.ProviderAlertSweep(self.path, workers=1, chunk_size=2)
+
+    def test_interrupted_sweep_resumes_after_the_last_chunk(self):
+        class Interrupted(Exception):
+            pass
+
+        def stop(state):
+            raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            self.sweep().run(progress=stop)
+        with open(self.path) as fh:
+            saved = json.load(fh)
+        self.assertEqual((saved["last_user_id"], saved["users"]), (self.user_ids[1], 2))
+
+        with mock.patch.object(alert_sweep, "_evaluate_chunk", wraps=alert_sweep._evaluate_chunk) as chunk:
+            state = self.sweep().run()
+        self.assertEqual([call.args[0] for call in chunk.call_args_list], [self.user_ids[2:4], self.user_ids[4:]])
+        self.assertEqual((state["last_user_id"], state["users"], state["failed"]), (self.user_ids[-1], 5, []))
+        self.assertFalse(os.path.exists(self.path))
+
+
+class AlertBatchWriteTests(TestCase):
+    def setUp(self):
+        self.user_ids = []
+        for n in range(3):
+            user = make_user(f"batch{n}", age=40, height_cm=170, weight_kg=70, sex="female")
+            Profile.objects.get(user=user).set_consent(True)
+            log_struggling_fortnight(user)
+            self.user_ids.append(user.pk)
+
+    def test_chunk_prefetches_dedup_and_inserts_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            _, users, created, failed = alert_sweep._evaluate_chunk(self.user_ids)
+        alert_queries = [q["sql"].split()[0] for q in queries if '"usermanagement_provideralert"' in q["sql"]]
+        self.assertEqual((users, created, failed), (3, 6, []))
+        self.assertEqual(sorted(alert_queries), ["INSERT", "SELECT"])
+
+    def test_prefetched_dedup_needs_no_alert_reads(self):
+        user = User.objects.get(pk=self.user_ids[0])
+        last_sent = recent_alert_times(self.user_ids)
+        with CaptureQueriesContext(connection) as queries:
+            alerts = evaluate_user(user, force=True, save=False, last_sent=last_sent, consented=True)
+        self.assertEqual(len(alerts), 2)
+        self.assertFalse([q for q in queries if '"usermanagement_provideralert"' in q["sql"]])
+        self.assertFalse(ProviderAlert.objects.exists())
+
+
+class VitalBaselineTests(TestCase):
+    def setUp(self):
+        self.user = make_user("ash")
+        start = timezone.now() - timedelta(days=10)
+        for day, rate in enumerate((60, 62, 61, 64, 63)):
+            HealthMetrics.objects.create(user=self.user, logged_at=start + timedelta(days=day), heart_rate_resting=rate)
+
+    def baselines(self):
+        return list(VitalBaseline.objects.values_list("user_id", "metric", "samples", "mean", "variance"))
+
+    def test_rebuild_replays_the_streamed_baseline(self):
+        streamed = self.baselines()
+        self.assertEqual(rebuild_baselines([self.user.pk]), 1)
+        rebuilt = self.baselines()
+        self.assertEqual([row[:3] for row in rebuilt], [row[:3] for row in streamed])
+        for (*_, mean, variance), (*_, streamed_mean, streamed_variance) in zip(rebuilt, streamed):
+            self.assertAlmostEqual(mean, streamed_mean)
+            self.assertAlmostEqual(variance, streamed_variance)
+
+    def test_empty_user_list_rebuilds_nothing(self):
+        before = self.baselines()
+        self.assertEqual(rebuild_baselines([]), 0)
+        self.assertEqual(self.baselines(), before)
+
+
+class SleepRollupTests(TestCase):
+    def test_short_night_counts(self):
+        today = timezone.localdate()
+        nights = [
+            {"date": today - timedelta(days=age), "total_sleep_minutes": minutes, "deep_sleep_minutes": None,
+             "rem_sleep_minutes": None, "awake_minutes": None, "bedtime_start": None, "bedtime_end": None}
+            for age, minutes in ((-1, 200), (0, 250), (2, 280), (4, 420), (5, 200), (6, 100), (8, 100))
+        ]
+        values = compute(nights, today)
+        self.assertEqual((values["short_nights_5"], values["short_nights_7"]), (2, 4))
+
+    def test_insufficient_sleep_reads_the_rollup(self):
+        user = make_user("jo")
+        today = timezone.localdate()
+        for age in range(3):
+            SleepData.objects.create(user=user, date=today - timedelta(days=age), total_sleep_minutes=200)
+        spec = next(spec for spec in RULE_SPECS if spec.name == "Insufficient Sleep")
+
+        with CaptureQueriesContext(connection) as queries:
+            values = compile_rules([spec]).values_for([user.pk])
+        self.assertEqual(values[user.pk][spec.name], 3)
+        self.assertTrue(all("healthdata_sleepdata" not in q["sql"] for q in queries))
+
+
+class RuleQueueTests(TestCase):
+    def setUp(self):
+        self.user = make_patient("uma")
+        Profile.objects.get(user=self.user).set_consent(True)
+        ReminderRefresh.objects.all().delete()
+
+    def queued(self):
+        return set(ReminderRefresh.objects.get(user=self.user).pending_rules)
+
+    def test_writes_queue_only_the_rules_reading_the_table(self):
+        SleepData.objects.create(user=self.user, date=timezone.localdate(), total_sleep_minutes=200)
+        self.assertEqual(self.queued(), {"Insufficient Sleep", "Irregular Sleep Schedule"})
+        NutritionEntry.objects.create(user=self.user, meal_type="lunch", calories=400)
+        self.assertEqual(self.queued(), {
+            "Insufficient Sleep", "Irregular Sleep Schedule", "Sustained Low Calories", REMINDERS, PATTERNS,
+        })
+
+    def test_worker_runs_only_the_queued_rules(self):
+        SleepData.objects.create(user=self.user, date=timezone.localdate(), total_sleep_minutes=200)
+        with mock.patch.object(ai_agent, "evaluate_user", wraps=ai_agent.evaluate_user) as evaluate, \
+                mock.patch.object(ReminderSweep, "process_batch") as reminders:
+            self.assertEqual(run_pending(settle_seconds=0), (1, 0, 0))
+        reminders.assert_not_called()
+        self.assertEqual(evaluate.call_args.kwargs["only"], {"Insufficient Sleep", "Irregular Sleep Schedule"})
+        self.assertEqual(self.queued(), set())
+
+
+class AsyncEvaluationTests(TransactionTestCase):
+    # Rule groups run on executor threads with their own connections, so the
+    # data has to be committed
+    def setUp(self):
+        self.user = make_user("ivy", age=40, height_cm=170, weight_kg=70, sex="female")
+        Profile.objects.get(user=self.user).set_consent(True)
+        log_struggling_fortnight(self.user)
+
+    def track_concurrency(self):
+        lock, active, peak = threading.Lock(), [0], [0]
+        run = ai_agent._run_rules_in_thread
+
+        def tracked(user, rules):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                time.sleep(0.05)
+                return run(user, rules)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        return mock.patch.object(ai_agent, "_run_rules_in_thread", tracked), peak
+
+    async def test_matches_evaluate_user_and_dedups(self):
+        expected = sorted(alert.alert_type for alert in await sync_to_async(evaluate_user)(
+            self.user, force=True, save=False,
+        ))
+        alerts = await ai_agent.aevaluate_user(self.user, force=True)
+        self.assertEqual(sorted(alert.alert_type for alert in alerts), expected)
+        self.assertEqual(await ai_agent.aevaluate_user(self.user, force=True), [])
+
+    async def test_rule_groups_respect_the_concurrency_limit(self):
+        patch, peak = self.track_concurrency()
+        with patch:
+            await ai_agent.aevaluate_user(self.user, force=True, concurrency=1)
+        self.assertEqual(peak[0], 1)
+
+        patch, peak = self.track_concurrency()
+        with patch:
+            await ai_agent.aevaluate_user(self.user, force=True, concurrency=3)
+        self.assertGreater(peak[0], 1)
+
+
+class CohortExportTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        for n in range(3):
+            user = make_user(f"cohort_f{n}", age=34, sex="female", activity_level="sedentary")
+            Profile.objects.get(user=user).set_consent(True)
+            ActivityData.objects.create(user=user, date=today, steps=3000 + 1000 * n, active_minutes=20)
+            if n:  # only two members log meals
+                NutritionEntry.objects.create(user=user, logged_at=today, meal_type="lunch", calories=1800)
+        loner = make_user("cohort_m", age=34, sex="male", activity_level="sedentary")
+        Profile.objects.get(user=loner).set_consent(True)
+        make_user("cohort_private", age=34, sex="female", activity_level="sedentary")
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "cohorts.ndjson")
+
+    def export(self, **options):
+        summary = cohort_export.CohortExport(self.path, k=3, **options).run()
+        with open(self.path) as fh:
+            return summary, [json.loads(line) for line in fh]
+
+    def test_small_cohorts_and_statistics_are_suppressed(self):
+        summary, (header, cohort, footer) = self.export()
+        self.assertEqual((header["type"], header["k"]), ("header", 3))
+        self.assertEqual((cohort["age_band"], cohort["sex"], cohort["users"]), ("30-39", "female", 3))
+        self.assertEqual(cohort["activity"]["steps"], {"n": 3, "mean": 4000.0, "sd": 1000.0})
+        self.assertIsNone(cohort["nutrition"]["calories"])  # two contributors < k
+        self.assertEqual(footer, summary)
+        self.assertEqual(
+            (summary["cohorts"], summary["users"], summary["suppressed_cohorts"], summary["suppressed_users"]),
+            (1, 3, 1, 1),
+        )
+
+    def test_chunking_does_not_change_the_output(self):
+        _, whole = self.export()
+        _, chunked = self.export(chunk_size=2)
+        self.assertEqual(whole[1:], chunked[1:])
+
+    def test_failed_export_leaves_the_previous_file(self):
+        with open(self.path, "w") as fh:
+            fh.write("previous export\n")
+        with mock.patch.object(cohort_export, "_chunk_metrics", side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                cohort_export.CohortExport(self.path, k=3).run()
+        with open(self.path) as fh:
+            self.assertEqual(fh.read(), "previous export\n")
+        self.assertEqual(os.listdir(self.directory), ["cohorts.ndjson"])
@@ -4,21 +4,25 @@ from rest_framework.routers import SimpleRouter
 from .views import (
     NutritionEntryViewSet,
     HealthReminderViewSet,
+    ProviderAlertViewSet,
     nutrition_dashboard,
     nutrition_edit,
     nutrition_delete,
     reminders_dashboard,
     dismiss_reminder,
     act_on_reminder,
+    rule_stats,
 )
 
 router = SimpleRouter()
 router.register('nutrition', NutritionEntryViewSet, basename='nutrition')
 router.register('reminders', HealthReminderViewSet, basename='reminders')
+router.register('provider-alerts', ProviderAlertViewSet, basename='provider-alerts')
 
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('rule-stats/', rule_stats, name='rule_stats'),
 
     # Nutrition HTML views
     path('dashboard/nutrition/', nutrition_dashboard, name='nutrition_dashboard'),
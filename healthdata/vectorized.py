@@ -0,0 +1,246 @@
+# healthdata/vectorized.py
+"""
+NumPy evaluation of declarative rules (healthdata.rules) for whole cohorts.
+
+load_cohort() fetches the daily series every metric needs with one
+values_list() per source table and scatters them into (users x days)
+arrays; evaluate() then applies RuleSpecs, and the HealthCalculator
+formulas for their targets, as array operations over all users at once.
+
+NumPy is optional (requirements-optional.txt): when it is not installed
+available() is False and callers keep using the grouped SQL path
+(CompiledRules), which gives the same results.
+"""
+from __future__ import annotations
+
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from typing import Dict, Iterable
+
+from django.db.models import BooleanField, ExpressionWrapper
+from django.utils import timezone
+
+from usermanagement.models import Profile
+from .rules import COMPARATORS, METRICS, RuleSpec
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency; see available()
+    np = None
+
+
+CohortOutcome = namedtuple('CohortOutcome', ['value', 'threshold', 'triggered'])
+
+
+def available():
+    """True when NumPy is installed and cohort evaluation can be used."""
+    return np is not None
+
+
+class Cohort:
+    """
+    Daily series for a set of users, as 2-D arrays.
+    Row i is user_ids[i]; column j is the day `today - j`.
+    """
+
+    def __init__(self, user_ids, days, today):
+        self.user_ids = np.unique(np.fromiter(user_ids, dtype=np.int64))
+        self.days = days
+        self.today = today
+        # metric name -> {'value' | 'count' | 'per' | 'min' | 'max': array}
+        self.series = {}
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def rows(self, user_ids):
+        """Row indices for user ids known to be in the cohort."""
+        return np.searchsorted(self.user_ids, user_ids)
+
+
+def _needs(spec):
+    """Per-day arrays a spec's aggregate is computed from."""
+    if spec.aggregate == 'avg':
+        return {'value', 'per' if METRICS[spec.metric].per else 'count'}
+    return {{'sum': 'value'}.get(spec.aggregate, spec.aggregate)}
+
+
+def load_cohort(user_ids: Iterable[int], specs: Iterable[RuleSpec], today=None) -> Cohort:
+    """Fetch every metric the enabled specs read (one query per source table)."""
+    specs = [spec for spec in specs if spec.enabled]
+    today = today or timezone.localdate()
+    days = max((spec.window_days + (spec.baseline_offset_days or 0) for spec in specs), default=0)
+    cohort = Cohort(user_ids, days, today)
+
+    needs = defaultdict(set)
+    by_model = defaultdict(list)
+    for spec in specs:
+        if spec.metric not in needs:
+            by_model[spec.source].append(spec.metric)
+        needs[spec.metric] |= _needs(spec)
+
+    for model, metrics in by_model.items():
+        _load_source(cohort, model, {name: needs[name] for name in metrics})
+    return cohort
+
+
+def _load_source(cohort, model, needs):
+    metrics = {name: METRICS[name] for name in needs}
+    date_field = next(iter(metrics.values())).date_field
+
+    columns = []
+    for metric in metrics.values():
+        for field in (metric.column, metric.per):
+            if field and field not in columns:
+                columns.append(field)
+    # Row filters of conditional metrics are evaluated by the database
+    flags = {
+        name: ExpressionWrapper(metric.condition, output_field=BooleanField())
+        for name, metric in metrics.items() if metric.condition is not None
+    }
+
+    rows = list(
+        model.objects
+        .filter(**{
+            'user_id__in': cohort.user_ids.tolist(),
+            f'{date_field}__gt': cohort.today - timedelta(days=cohort.days),
+            f'{date_field}__lte': cohort.today,
+        })
+        .annotate(**{f'{name}__match': flag for name, flag in flags.items()})
+        .order_by()
+        .values_list('user_id', date_field, *columns, *(f'{name}__match' for name in flags))
+    )
+    fields = list(zip(*rows)) or [()] * (2 + len(columns) + len(flags))
+
+    user_rows = cohort.rows(np.asarray(fields[0], dtype=np.int64))
+    day_cols = np.fromiter(((cohort.today - day).days for day in fields[1]), dtype=np.int64, count=len(rows))
+    data = {field: np.asarray(values, dtype=float) for field, values in zip(columns, fields[2:])}
+    matches = dict(zip(flags, fields[2 + len(columns):]))
+
+    shape = (len(cohort), cohort.days)
+    in_range = (day_cols >= 0) & (day_cols < cohort.days)
+    for name, metric in metrics.items():
+        keep = in_range & ~np.isnan(data[metric.column])
+        if name in matches:
+            keep &= np.asarray(matches[name], dtype=bool)
+        index = (user_rows[keep], day_cols[keep])
+        values = data[metric.column][keep]
+
+        series = {}
+        for kind in needs[name]:
+            if kind == 'min':
+                series[kind] = np.full(shape, np.inf)
+                np.minimum.at(series[kind], index, values)
+            elif kind == 'max':
+                series[kind] = np.full(shape, -np.inf)
+                np.maximum.at(series[kind], index, values)
+            else:
+                series[kind] = np.zeros(shape)
+                addend = {
+                    'value': values,
+                    'count': 1,
+                    'per': np.nan_to_num(data[metric.per][keep]) if metric.per else None,
+                }[kind]
+                np.add.at(series[kind], index, addend)
+        cohort.series[name] = series
+
+
+def aggregate(cohort: Cohort, spec: RuleSpec, offset=0):
+    """Per-user value of spec's aggregate over its window ending `offset` days ago (NaN = no data)."""
+    series = cohort.series[spec.metric]
+    window = slice(offset, offset + spec.window_days)
+
+    if spec.aggregate in ('sum', 'count'):
+        return series['value' if spec.aggregate == 'sum' else 'count'][:, window].sum(axis=1)
+    if spec.aggregate == 'avg':
+        numerator = series['value'][:, window].sum(axis=1)
+        denominator = series['per' if 'per' in series else 'count'][:, window].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator > 0, numerator / denominator, np.nan)
+
+    values = series[spec.aggregate][:, window]
+    values = values.min(axis=1) if spec.aggregate == 'min' else values.max(axis=1)
+    return np.where(np.isinf(values), np.nan, values)
+
+
+def compute_targets(cohort: Cohort):
+    """
+    HealthCalculator.compute_targets for every user of the cohort, as arrays
+    (HealthTargets of arrays aligned with cohort.user_ids; NaN where the
+    profile lacks the data).
+    """
+    from .reminders_engine import HealthCalculator, HealthTargets
+
+    n = len(cohort)
+    weight, height, age = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+    male = np.zeros(n, dtype=bool)
+    has_sex = np.zeros(n, dtype=bool)
+    activity = np.full(n, HealthCalculator.ACTIVITY_MULTIPLIERS['sedentary'])
+    protein_per_kg = np.full(n, HealthCalculator.PROTEIN_MULTIPLIERS['sedentary'])
+
+    profiles = list(
+        Profile.objects
+        .filter(user_id__in=cohort.user_ids.tolist())
+        .values_list('user_id', 'weight_kg', 'height_cm', 'age', 'sex', 'inferred_activity_level', 'activity_level')
+    )
+    if profiles:
+        user_id, weights, heights, ages, sexes, inferred, reported = zip(*profiles)
+        rows = cohort.rows(np.asarray(user_id, dtype=np.int64))
+        weight[rows] = np.asarray(weights, dtype=float)
+        height[rows] = np.asarray(heights, dtype=float)
+        age[rows] = np.asarray(ages, dtype=float)
+        male[rows] = [sex == 'male' for sex in sexes]
+        has_sex[rows] = [bool(sex) for sex in sexes]
+        # Same precedence as HealthCalculator.get_activity_level
+        levels = [level or own or 'sedentary' for level, own in zip(inferred, reported)]
+        activity[rows] = [HealthCalculator.ACTIVITY_MULTIPLIERS.get(level, 1.2) for level in levels]
+        protein_per_kg[rows] = [HealthCalculator.PROTEIN_MULTIPLIERS.get(level, 0.8) for level in levels]
+
+    def given(values):  # same truthiness test as the scalar formulas
+        return ~np.isnan(values) & (values != 0)
+
+    # Mifflin-St Jeor (female formula for anything but male)
+    bmr = 10 * weight + 6.25 * height - 5 * age + np.where(male, 5, -161)
+    bmr = np.where(given(weight) & given(height) & given(age) & has_sex, bmr, np.nan)
+    tdee = np.where(given(bmr), bmr * activity, np.nan)
+    protein_target = np.where(given(weight), weight * protein_per_kg, np.nan)
+    return HealthTargets(bmr=bmr, tdee=tdee, protein_target=protein_target)
+
+
+def evaluate(specs: Iterable[RuleSpec], cohort: Cohort, targets=None) -> Dict[str, CohortOutcome]:
+    """
+    Evaluate specs for every user of the cohort.
+    Returns {spec.name: CohortOutcome(value, threshold, triggered)}, arrays
+    aligned with cohort.user_ids. Mirrors RuleSpec.is_triggered: a missing
+    value, target or baseline never triggers.
+    """
+    specs = [spec for spec in specs if spec.enabled]
+    if targets is None and any(spec.target for spec in specs):
+        targets = compute_targets(cohort)
+
+    outcomes = {}
+    for spec in specs:
+        value = aggregate(cohort, spec)
+        if spec.target:
+            base = np.asarray(getattr(targets, spec.target), dtype=float)
+        elif spec.baseline_offset_days:
+            base = aggregate(cohort, spec, offset=spec.baseline_offset_days)
+        else:
+            base = None
+
+        if base is None:
+            threshold = np.full(len(cohort), float(spec.threshold))
+        else:
+            threshold = np.where(~np.isnan(base) & (base != 0), spec.threshold * base, np.nan)
+        with np.errstate(invalid='ignore'):
+            triggered = COMPARATORS[spec.comparator](value, threshold)
+        triggered &= ~np.isnan(value) & ~np.isnan(threshold)
+        outcomes[spec.name] = CohortOutcome(value, threshold, triggered)
+    return outcomes
+
+
+def evaluate_cohort(specs: Iterable[RuleSpec], user_ids: Iterable[int], targets=None):
+    """Load and evaluate in one go. Returns (cohort, {spec.name: CohortOutcome})."""
+    specs = list(specs)
+    cohort = load_cohort(user_ids, specs)
+    return cohort, evaluate(specs, cohort, targets=targets)
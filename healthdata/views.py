@@ -1,15 +1,18 @@
 # healthdata/views.py
 
 # ---------- DRF API ----------
+import os
 from rest_framework import viewsets, permissions, status
 from .models import NutritionEntry
 from .serializers import NutritionEntrySerializer
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from django.utils import timezone
-from .models import HealthReminder
-from .serializers import HealthReminderSerializer
-from .reminders_engine import ReminderEngine
+from .models import HealthReminder, DailyNutritionSummary
+from .serializers import HealthReminderSerializer, HealthReminderDetailSerializer, ProviderAlertSerializer
+from usermanagement.models import ProviderAlert, ProviderAlertCounter
+from .scheduler import mark_user_dirty
+from . import instrumentation
 from datetime import datetime, timedelta
 
 class NutritionEntryViewSet(viewsets.ModelViewSet):
@@ -30,6 +33,63 @@ class NutritionEntryViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def rule_stats(request):
+    """
+    Staff-only: per-rule timing and hit-rate counters (GET /api/rule-stats/).
+    Counters are per process; `pid` tells which worker answered.
+    """
+    return Response({
+        'pid': os.getpid(),
+        'enabled': instrumentation.enabled(),
+        'rules': instrumentation.stats(),
+    })
+
+
+class ProviderAlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Provider alert inbox of the current user, newest first.
+
+    Endpoints:
+    - GET /api/provider-alerts/?cursor=&size=&unread=1 - One keyset page
+      (`next_cursor` is null on the last page) plus the unread counts
+    - GET /api/provider-alerts/{id}/ - Get specific alert
+    - POST /api/provider-alerts/{id}/review/ - Mark as reviewed
+    """
+    serializer_class = ProviderAlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 25
+    max_page_size = 100
+
+    def get_queryset(self):
+        return ProviderAlert.objects.filter(user=self.request.user)
+
+    def list(self, request):
+        alerts = self.get_queryset()
+        if request.query_params.get('unread') in ('1', 'true'):
+            alerts = alerts.filter(reviewed=False)
+        try:
+            size = min(int(request.query_params.get('size', self.page_size)), self.max_page_size)
+            page, next_cursor = alerts.page(request.query_params.get('cursor'), size=max(size, 1))
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'results': self.get_serializer(page, many=True).data,
+            'next_cursor': next_cursor,
+            'unread': dict(ProviderAlertCounter.unread_counts(request.user.pk)),
+        })
+
+    @action(detail=True, methods=['post'])
+    def review(self, request, pk=None):
+        """Mark an alert as reviewed (moves the unread counters)."""
+        alert = self.get_object()
+        ProviderAlert.objects.filter(pk=alert.pk).mark_reviewed()
+        alert.refresh_from_db()
+        return Response(self.get_serializer(alert).data)
+
+
 # ========== DRF API ViewSet ==========
 
 class HealthReminderViewSet(viewsets.ReadOnlyModelViewSet):
@@ -39,7 +99,7 @@ class HealthReminderViewSet(viewsets.ReadOnlyModelViewSet):
     Endpoints:
     - GET /api/reminders/ - List active reminders
     - GET /api/reminders/{id}/ - Get specific reminder
-    - POST /api/reminders/generate/ - Generate new reminders
+    - POST /api/reminders/generate/ - Queue reminder regeneration
     - POST /api/reminders/{id}/dismiss/ - Dismiss a reminder
     - POST /api/reminders/{id}/act_upon/ - Mark as acted upon
     """
@@ -48,25 +108,33 @@ class HealthReminderViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Return only active reminders for current user."""
-        return HealthReminder.objects.filter(
+        queryset = HealthReminder.objects.filter(
             user=self.request.user,
             dismissed_at__isnull=True
         ).order_by('-priority', '-created_at')
+        if self.action != 'retrieve':
+            # Explanation text is only needed by the detail endpoint
+            queryset = queryset.defer('explanation', 'actionable_steps', 'template_params')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return HealthReminderDetailSerializer
+        return HealthReminderSerializer
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
         """
-        Generate new reminders based on current health data.
+        Queue reminder regeneration for the current user.
+        The background worker (run_reminder_worker) picks it up shortly.
         POST /api/reminders/generate/
         """
-        engine = ReminderEngine(request.user)
-        new_reminders = engine.analyze_and_create_reminders()
+        mark_user_dirty(request.user.pk)
 
-        serializer = self.get_serializer(new_reminders, many=True)
         return Response({
-            'count': len(new_reminders),
-            'reminders': serializer.data
-        }, status=status.HTTP_201_CREATED)
+            'status': 'queued',
+            'message': 'New reminders will appear once your data has been analyzed.'
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def dismiss(self, request, pk=None):
@@ -103,8 +171,8 @@ class HealthReminderViewSet(viewsets.ReadOnlyModelViewSet):
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db.models import BooleanField, ExpressionWrapper, Q
 from django.utils import timezone
-from django.db.models import Sum
 from .forms import NutritionEntryForm
 
 @login_required
@@ -132,22 +200,19 @@ def nutrition_dashboard(request):
         .order_by("-logged_at", "-created_at")
     )
 
-    # today totals
+    # today totals (from the daily rollup, no aggregation over entries)
     today = timezone.localdate()
-    today_qs = NutritionEntry.objects.filter(user=request.user, logged_at=today)
-    agg = today_qs.aggregate(
-        calories=Sum("calories"),
-        protein=Sum("protein_g"),
-        carbs=Sum("carbs_g"),
-        fat=Sum("fat_g"),
-    )
+    summary = DailyNutritionSummary.objects.filter(user=request.user, date=today).first()
     today_totals = {
-        "calories": agg["calories"] or 0,
-        "protein":  agg["protein"] or 0,
-        "carbs":    agg["carbs"] or 0,
-        "fat":      agg["fat"] or 0,
+        "calories": summary.calories if summary else 0,
+        "protein":  summary.protein_g if summary else 0,
+        "carbs":    summary.carbs_g if summary else 0,
+        "fat":      summary.fat_g if summary else 0,
     }
 
+    # unread alert badge (maintained counters, no COUNT over alerts)
+    unread_alerts = sum(count for _, count in ProviderAlertCounter.unread_counts(request.user.pk))
+
     return render(
         request,
         "healthdata/nutrition_dashboard.html",
@@ -156,6 +221,7 @@ def nutrition_dashboard(request):
             "entries": entries,
             "today": today,
             "today_totals": today_totals,
+            "unread_alerts": unread_alerts,
         },
     )
 
@@ -202,19 +268,20 @@ def nutrition_delete(request, pk: int):
 
 @login_required
 def reminders_dashboard(request):
-    """HTML dashboard to view health reminders."""
-    # Generate new reminders
-    engine = ReminderEngine(request.user)
-    new_reminders = engine.analyze_and_create_reminders()
-
-    if new_reminders:
-        messages.info(request, f'{len(new_reminders)} new health insight(s) generated!')
-
+    """
+    HTML dashboard to view health reminders.
+    Reminders are generated in the background (see healthdata.scheduler),
+    so this view only reads HealthReminder rows. Explanations are not
+    rendered here: the page fetches one from the reminder API when the
+    user expands it.
+    """
     # Get active reminders
     priority_order = {'high': 0, 'medium': 1, 'low': 2}
     reminders = HealthReminder.objects.filter(
         user=request.user,
         dismissed_at__isnull=True
+    ).defer('explanation', 'actionable_steps', 'template_params').annotate(
+        has_details=ExpressionWrapper(~Q(template_id='') | ~Q(explanation=''), output_field=BooleanField())
     )
     reminders = sorted(reminders, key=lambda r: priority_order.get(r.priority, 3))
 
@@ -229,19 +296,23 @@ def reminders_dashboard(request):
 
     # Generate week days for header
     today = timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    logged_days = set(
+        DailyNutritionSummary.objects.filter(
+            user=request.user,
+            date__gte=week_start,
+            date__lt=week_start + timedelta(days=7),
+            entry_count__gt=0
+        ).values_list('date', flat=True)
+    )
     week_days = []
     for i in range(7):
-        day = today - timedelta(days=today.weekday()) + timedelta(days=i)
-        has_data = NutritionEntry.objects.filter(
-            user=request.user,
-            logged_at=day
-        ).exists()
-
+        day = week_start + timedelta(days=i)
         week_days.append({
             'name': day.strftime('%a'),
             'date': day.day,
             'is_today': day == today,
-            'has_data': has_data
+            'has_data': day in logged_days
         })
 
     return render(request, 'healthdata/reminders_dashboard.html', {
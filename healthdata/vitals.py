@@ -0,0 +1,185 @@
+# healthdata/vitals.py
+"""
+Streaming anomaly detection on HealthMetrics vitals.
+
+Each vital keeps a VitalBaseline per user: an exponentially weighted mean
+and variance plus a ring buffer of the last readings. A new reading is
+scored against the baseline *before* being folded in, so every insert
+costs O(1) regardless of how much history the user has. A reading raises
+a ProviderAlert when it crosses a fixed clinical threshold, or deviates
+more than `z_limit` standard deviations from the user's own baseline
+(once enough readings exist for the baseline to mean something).
+"""
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from usermanagement.models import ConsentingUser, ProviderAlert
+from . import instrumentation
+from .models import VitalBaseline
+
+ALPHA = 0.1          # EWMA weight of the newest reading (~ last 20 readings)
+RING_SIZE = 20       # readings kept in VitalBaseline.recent
+MIN_SAMPLES = 10     # readings needed before z-score alerts
+DEDUP_HOURS = 24
+
+
+@dataclass(frozen=True)
+class Vital:
+    field: str
+    label: str
+    unit: str
+    low: Optional[float] = None    # absolute limits (None = no limit)
+    high: Optional[float] = None
+    z_limit: float = 3.0
+
+
+VITALS = {
+    vital.field: vital for vital in (
+        Vital("heart_rate_resting", "Resting heart rate", "bpm", low=40, high=110),
+        Vital("blood_pressure_systolic", "Systolic blood pressure", "mmHg", low=85, high=180),
+        Vital("blood_pressure_diastolic", "Diastolic blood pressure", "mmHg", low=50, high=120),
+        Vital("blood_oxygen", "Blood oxygen (SpO2)", "%", low=90),
+        Vital("hrv", "Heart rate variability", "ms"),
+        Vital("stress_level", "Stress level", "/100", high=90),
+    )
+}
+
+
+def fold(baseline, value, logged_at=None):
+    """Add one reading to the baseline (EWMA mean/variance, ring buffer)."""
+    if baseline.samples == 0:
+        baseline.mean, baseline.variance = value, 0.0
+    else:
+        diff = value - baseline.mean
+        increment = ALPHA * diff
+        baseline.mean += increment
+        baseline.variance = (1 - ALPHA) * (baseline.variance + diff * increment)
+    baseline.samples += 1
+    baseline.recent = (list(baseline.recent) + [value])[-RING_SIZE:]
+    baseline.last_value = value
+    baseline.last_logged_at = logged_at
+
+
+def z_score(baseline, value):
+    """Deviation of `value` from the baseline in standard deviations (None if undefined)."""
+    if baseline.samples < MIN_SAMPLES or baseline.variance <= 0:
+        return None
+    return (value - baseline.mean) / math.sqrt(baseline.variance)
+
+
+def check(vital, baseline, value):
+    """
+    Score one reading against the baseline (before it is folded in).
+    Returns (alert_type, severity, message) or None.
+    """
+    if vital.low is not None and value < vital.low:
+        return (f"Vitals:{vital.field}:low", "high",
+                f"{vital.label} of {value:g} {vital.unit} is below {vital.low:g} {vital.unit}.")
+    if vital.high is not None and value > vital.high:
+        return (f"Vitals:{vital.field}:high", "high",
+                f"{vital.label} of {value:g} {vital.unit} is above {vital.high:g} {vital.unit}.")
+
+    z = z_score(baseline, value)
+    if z is not None and abs(z) >= vital.z_limit:
+        direction = "above" if z > 0 else "below"
+        return (f"Vitals:{vital.field}:deviation", "moderate",
+                f"{vital.label} of {value:g} {vital.unit} is {abs(z):.1f} SD {direction} this user's "
+                f"baseline of {baseline.mean:.0f} {vital.unit} (recent: "
+                f"{', '.join(f'{v:g}' for v in baseline.recent[-5:])}).")
+    return None
+
+
+def process_reading(metrics, raise_alerts=True):
+    """
+    Fold a new HealthMetrics row into the user's baselines and return the
+    ProviderAlerts it raised. Costs a fixed number of queries: baselines
+    are locked and loaded in one query and written back in bulk.
+    """
+    readings = {
+        field: float(value) for field in VITALS
+        if (value := getattr(metrics, field)) is not None
+    }
+    if not readings:
+        return []
+
+    alerts = []
+    with instrumentation.measure("vitals.reading") as measurement, transaction.atomic():
+        baselines = {
+            b.metric: b for b in VitalBaseline.objects.select_for_update().filter(
+                user_id=metrics.user_id, metric__in=list(readings)
+            )
+        }
+        new = []
+        for field, value in readings.items():
+            baseline = baselines.get(field)
+            if baseline is None:
+                baseline = VitalBaseline(user_id=metrics.user_id, metric=field)
+                new.append(baseline)
+            finding = check(VITALS[field], baseline, value)
+            if finding:
+                alerts.append(finding)
+            fold(baseline, value, metrics.logged_at)
+
+        now = timezone.now()
+        for baseline in baselines.values():
+            baseline.updated_at = now  # bulk_update skips auto_now
+        VitalBaseline.objects.bulk_create(new)
+        VitalBaseline.objects.bulk_update(
+            list(baselines.values()),
+            ["samples", "mean", "variance", "recent", "last_value", "last_logged_at", "updated_at"],
+        )
+        measurement.triggered = bool(alerts)
+
+    if not raise_alerts or not alerts or not _consented(metrics):
+        return []
+    return _save_alerts(metrics.user_id, alerts)
+
+
+def _consented(metrics):
+    return ConsentingUser.includes(metrics.user_id)
+
+
+def _save_alerts(user_id, findings):
+    from .ai_agent import recent_alert_times, save_alerts
+
+    last_sent = recent_alert_times([user_id], hours=DEDUP_HOURS)
+    alerts = []
+    for alert_type, severity, message in findings:
+        if (user_id, alert_type) in last_sent:
+            instrumentation.record(f"vitals.{alert_type}", suppressed=1)
+            continue
+        alerts.append(ProviderAlert(user_id=user_id, alert_type=alert_type, severity=severity, message=message))
+    return save_alerts(alerts)
+
+
+def rebuild_baselines(user_ids=None):
+    """
+    Recompute baselines by replaying HealthMetrics history in order (no
+    alerts). Returns the number of baselines written.
+    """
+    from .models import HealthMetrics
+
+    rows = HealthMetrics.objects.order_by("user_id", "logged_at", "pk")
+    baselines = VitalBaseline.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+        baselines = baselines.filter(user_id__in=user_ids)
+
+    fresh = {}
+    for row in rows.values("user_id", "logged_at", *VITALS).iterator():
+        for field in VITALS:
+            if row[field] is None:
+                continue
+            key = (row["user_id"], field)
+            if key not in fresh:
+                fresh[key] = VitalBaseline(user_id=row["user_id"], metric=field)
+            fold(fresh[key], float(row[field]), row["logged_at"])
+
+    with transaction.atomic():
+        baselines.delete()
+        VitalBaseline.objects.bulk_create(fresh.values(), batch_size=1000)
+    return len(fresh)
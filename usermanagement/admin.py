@@ -1,9 +1,16 @@
 # usermanagement/admin.py
 from django.contrib import admin
-from .models import Profile   # import from models.py (not a package)
+from .models import Profile, ProviderPatient   # import from models.py (not a package)
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ("user", "age", "height_cm", "weight_kg", "sex")
+    list_display = ("user", "age", "height_cm", "weight_kg", "sex", "activity_level", "inferred_activity_level")
     search_fields = ("user__username", "user__email")
     list_filter = ("sex",)
+
+
+@admin.register(ProviderPatient)
+class ProviderPatientAdmin(admin.ModelAdmin):
+    list_display = ("provider", "patient", "assigned_at")
+    search_fields = ("provider__username", "patient__username")
+    raw_id_fields = ("provider", "patient")
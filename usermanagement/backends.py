@@ -0,0 +1,32 @@
+# usermanagement/backends.py
+"""
+Authentication backend that loads request.user together with its Profile.
+
+get_user() runs on every authenticated request. ProfileModelBackend loads
+the user and profile in one select_related query, so request.user.profile
+is never a lazy extra query. Nothing is cached between requests: views
+save request.user.profile, so it has to be the row as it is now, not a
+copy another process may since have changed.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .models import Profile
+
+
+class ProfileModelBackend(ModelBackend):
+    """ModelBackend whose get_user() returns the user with its profile attached."""
+
+    def get_user(self, user_id):
+        user = get_user_model().objects.select_related("profile").filter(pk=user_id).first()
+        if user is None:
+            return None
+        if not hasattr(user, "profile"):
+            # Users that predate the profile signal get one on first use
+            user.profile, _ = Profile.objects.get_or_create(user=user)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # ModelBackend.aget_user doesn't go through get_user()
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usermanagement', '0005_profile_activity_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='bmr',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='protein_target',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='targets_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='tdee',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
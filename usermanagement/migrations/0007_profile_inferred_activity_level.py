@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usermanagement', '0006_profile_cached_targets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='inferred_activity_level',
+            field=models.CharField(blank=True, choices=[('sedentary', 'Sedentary - Little or no exercise'), ('light', 'Lightly Active - Light exercise 1-3 days/week'), ('moderate', 'Moderately Active - Moderate exercise 3-5 days/week'), ('active', 'Active - Hard exercise 6-7 days/week'), ('very_active', 'Very Active - Very hard exercise & physical job')], editable=False, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_unread_alerts(apps, schema_editor):
+    ProviderAlert = apps.get_model('usermanagement', 'ProviderAlert')
+    ProviderAlertCounter = apps.get_model('usermanagement', 'ProviderAlertCounter')
+    rows = (
+        ProviderAlert.objects.filter(reviewed=False)
+        .order_by().values('user_id', 'severity')
+        .annotate(count=models.Count('pk'))
+        .values_list('user_id', 'severity', 'count')
+    )
+    ProviderAlertCounter.objects.bulk_create(
+        [ProviderAlertCounter(user_id=user_id, severity=severity, unread=count) for user_id, severity, count in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usermanagement', '0008_providerpatient'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderAlertCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('severity', models.CharField(max_length=20)),
+                ('unread', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='provideralert',
+            index=models.Index(fields=['user', 'reviewed', '-created_at'], name='alert_user_reviewed_created'),
+        ),
+        migrations.AddIndex(
+            model_name='provideralert',
+            index=models.Index(fields=['user', '-created_at'], name='alert_user_created'),
+        ),
+        migrations.AddField(
+            model_name='provideralertcounter',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='provider_alert_counters', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='provideralertcounter',
+            constraint=models.UniqueConstraint(fields=('user', 'severity'), name='unique_alert_counter'),
+        ),
+        migrations.RunPython(count_unread_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def collect_consenting_users(apps, schema_editor):
+    Profile = apps.get_model('usermanagement', 'Profile')
+    ConsentingUser = apps.get_model('usermanagement', 'ConsentingUser')
+    now = django.utils.timezone.now()
+    ConsentingUser.objects.bulk_create(
+        [
+            ConsentingUser(user_id=user_id, consented_at=consented_at or now)
+            for user_id, consented_at in (
+                Profile.objects.filter(data_sharing_consent=True).values_list('user_id', 'consent_timestamp')
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('usermanagement', '0009_provider_alert_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsentingUser',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='consent_record', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('consented_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(collect_consenting_users, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
+from datetime import datetime
+
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from CareU.db import add_deltas
 
 # Get Django's User model
 User = get_user_model()
@@ -65,9 +68,68 @@ class Profile(models.Model):
         help_text="When the user last updated their consent preference"
     )
 
+    # Level inferred from recent ActivityData (healthdata.activity_level);
+    # used for targets instead of the self-reported level while set.
+    inferred_activity_level = models.CharField(
+        max_length=20, choices=ACTIVITY_CHOICES, null=True, blank=True, editable=False
+    )
+
+    # Memoized HealthCalculator targets (see healthdata.reminders_engine).
+    # `version` is bumped by every save that may change a target input;
+    # the stored targets are valid while targets_version == version.
+    version = models.PositiveIntegerField(default=0, editable=False)
+    targets_version = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    bmr = models.FloatField(null=True, blank=True, editable=False)
+    tdee = models.FloatField(null=True, blank=True, editable=False)
+    protein_target = models.FloatField(null=True, blank=True, editable=False)
+
+    TARGET_INPUT_FIELDS = ("age", "height_cm", "weight_kg", "sex", "activity_level", "inferred_activity_level")
+    TARGET_FIELDS = ("targets_version", "bmr", "tdee", "protein_target")
+
     def __str__(self):
         return f"Profile({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        """
+        Bump `version` (invalidating cached targets) when target inputs may
+        change, and mirror the saved consent into ConsentingUser whenever
+        the consent field is written (whatever the instance loaded before).
+
+        The bump is done in SQL (version + 1), so concurrent saves each get
+        their own version; the post_save handler in healthdata.signals then
+        stores targets computed from the locked row for the new version.
+        """
+        update_fields = kwargs.get("update_fields")
+        bumped = False
+        if update_fields is None or set(update_fields) & set(self.TARGET_INPUT_FIELDS):
+            if self._state.adding:
+                self.version += 1
+            else:
+                self.version = models.F("version") + 1
+                bumped = True
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        writes_consent = update_fields is None or "data_sharing_consent" in update_fields
+        # A new profile without consent has no ConsentingUser row to remove
+        sync_consent = writes_consent and (self.data_sharing_consent or not self._state.adding)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if bumped and not isinstance(self.version, int):
+                # No targets handler ran (healthdata not installed): read the version back
+                self.refresh_from_db(fields=["version", *self.TARGET_FIELDS])
+            if sync_consent:
+                ConsentingUser.sync(self.user_id, self.data_sharing_consent, self.consent_timestamp)
+
+    def set_consent(self, consented):
+        """Record a consent decision, timestamped now."""
+        self.data_sharing_consent = consented
+        self.consent_timestamp = timezone.now()
+        self.save(update_fields=["data_sharing_consent", "consent_timestamp"])
+
+    @property
+    def targets_are_current(self):
+        return self.targets_version == self.version
+
     @property
     def bmi(self):
         """Compute BMI if height/weight are set."""
@@ -77,21 +139,148 @@ class Profile(models.Model):
         return None
 
 
-# ---------------------------------------------------------------------
-# Signal: ensure a Profile always exists for every User
-# ---------------------------------------------------------------------
-@receiver(post_save, sender=User)
-def ensure_profile_exists(sender, instance, created, **kwargs):
+class ConsentingUser(models.Model):
     """
-    Always ensure a Profile exists for the user.
-    We use get_or_create (safe) instead of touching instance.profile directly.
+    Materialized set of the users who consented to data sharing (one small
+    row each, keyed by user id). Profile.save() keeps it in step when the
+    consent changes; sweeps, exports and the provider panel intersect
+    against it instead of loading profiles. Bulk profile writes bypass it:
+    run ConsentingUser.rebuild() after them.
     """
-    Profile.objects.get_or_create(user=instance)
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="consent_record",
+    )
+    consented_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"ConsentingUser({self.user_id})"
+
+    @classmethod
+    def ids(cls):
+        """Consenting user ids, as a queryset (use as a subquery: pk__in=ConsentingUser.ids())."""
+        return cls.objects.values_list("user_id", flat=True)
+
+    @classmethod
+    def among(cls, user_ids):
+        """The consenting subset of `user_ids` (one query)."""
+        return set(cls.ids().filter(user_id__in=list(user_ids)))
+
+    @classmethod
+    def includes(cls, user_id):
+        return cls.objects.filter(user_id=user_id).exists()
+
+    @classmethod
+    def sync(cls, user_id, consented, consented_at=None):
+        if consented:
+            cls.objects.update_or_create(user_id=user_id, defaults={"consented_at": consented_at or timezone.now()})
+        else:
+            cls.objects.filter(user_id=user_id).delete()
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recompute the set from Profile.data_sharing_consent. Returns its new size."""
+        profiles = Profile.objects.filter(data_sharing_consent=True)
+        rows = cls.objects.all()
+        if user_ids is not None:
+            profiles = profiles.filter(user_id__in=list(user_ids))
+            rows = rows.filter(user_id__in=list(user_ids))
+        consenting = [
+            cls(user_id=user_id, consented_at=consented_at or timezone.now())
+            for user_id, consented_at in profiles.values_list("user_id", "consent_timestamp")
+        ]
+        with transaction.atomic():
+            rows.delete()
+            cls.objects.bulk_create(consenting, batch_size=1000)
+        return len(consenting)
+
+
+# ---------------------------------------------------------------------
+# Provider panels: which patients a provider may request data from
+# ---------------------------------------------------------------------
+class ProviderPatient(models.Model):
+    provider = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="panel_links"
+    )
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="provider_links"
+    )
+    assigned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "patient"], name="unique_provider_patient"),
+        ]
+
+    def __str__(self):
+        return f"Patient {self.patient_id} on the panel of provider {self.provider_id}"
 
 
 # ---------------------------------------------------------------------
 # ProviderAlert model for Epic 3
 # ---------------------------------------------------------------------
+def _unread_deltas(alerts, sign=1):
+    """{(user_id, severity): ±count} of the unreviewed alerts in `alerts`."""
+    deltas = {}
+    for alert in alerts:
+        if not alert.reviewed:
+            key = (alert.user_id, alert.severity)
+            deltas[key] = deltas.get(key, 0) + sign
+    return deltas
+
+
+class ProviderAlertQuerySet(models.QuerySet):
+    """
+    Keeps ProviderAlertCounter in step with inserts and reviews.
+    Use mark_reviewed() rather than update(reviewed=...): plain update()
+    bypasses the counters (repair with ProviderAlertCounter.rebuild()).
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            ProviderAlertCounter.apply(_unread_deltas(created))
+        return created
+
+    def mark_reviewed(self):
+        """Mark the unreviewed alerts of this queryset as reviewed. Returns how many."""
+        with transaction.atomic():
+            unread = list(
+                self.filter(reviewed=False).select_for_update().values_list("pk", "user_id", "severity")
+            )
+            deltas = {}
+            for _, user_id, severity in unread:
+                deltas[(user_id, severity)] = deltas.get((user_id, severity), 0) - 1
+            self.model.objects.filter(pk__in=[pk for pk, _, _ in unread]).update(reviewed=True)
+            ProviderAlertCounter.apply(deltas)
+        return len(unread)
+
+    def after(self, cursor=None):
+        """
+        Keyset pagination, newest first: the alerts after `cursor` (see
+        ProviderAlert.cursor), ordered by (created_at, pk) descending.
+        Slice the result ([:size + 1]) to get a page plus a has-more probe.
+        """
+        alerts = self.order_by("-created_at", "-pk")
+        if cursor:
+            created_at, pk = ProviderAlert.parse_cursor(cursor)
+            alerts = alerts.filter(
+                models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, pk__lt=pk)
+            )
+        return alerts
+
+    def page(self, cursor=None, size=25):
+        """One keyset page: (alerts, cursor of the next page or None)."""
+        alerts = list(self.after(cursor)[:size + 1])
+        return alerts[:size], (alerts[size - 1].cursor if len(alerts) > size else None)
+
+
 class ProviderAlert(models.Model):
     """
     Stores AI-generated alerts for healthcare providers
@@ -112,9 +301,106 @@ class ProviderAlert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     reviewed = models.BooleanField(default=False)
 
+    objects = ProviderAlertQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Inbox pages (keyset on created_at) and unread filters
+            models.Index(fields=["user", "reviewed", "-created_at"], name="alert_user_reviewed_created"),
+            models.Index(fields=["user", "-created_at"], name="alert_user_created"),
+        ]
+
+    def __str__(self):
+        return f"{self.alert_type} ({self.severity}) for user {self.user_id}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_reviewed = instance.__dict__.get("reviewed")
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Move the unread counter on insert and when `reviewed` changes."""
+        adding = self._state.adding
+        was_reviewed = getattr(self, "_loaded_reviewed", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                ProviderAlertCounter.apply(_unread_deltas([self]))
+            elif was_reviewed is not None and was_reviewed != self.reviewed:
+                ProviderAlertCounter.apply({(self.user_id, self.severity): -1 if self.reviewed else 1})
+        self._loaded_reviewed = self.reviewed
+
+    @property
+    def cursor(self):
+        """Opaque keyset position of this alert (see ProviderAlertQuerySet.after)."""
+        return f"{self.created_at.isoformat()}~{self.pk}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        created_at, _, pk = cursor.rpartition("~")
+        try:
+            return datetime.fromisoformat(created_at), int(pk)
+        except ValueError:
+            raise ValueError(f"Invalid alert cursor: {cursor!r}")
+
+
+class ProviderAlertCounter(models.Model):
+    """
+    Unreviewed ProviderAlerts per (user, severity), maintained by the
+    ProviderAlert manager and save()/delete hooks, so alert badges read one
+    small row set instead of counting a growing table.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="provider_alert_counters"
+    )
+    severity = models.CharField(max_length=20)
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "severity"], name="unique_alert_counter"),
+        ]
 
     def __str__(self):
-        return f"{self.alert_type} ({self.severity}) for {self.user.username}"
+        return f"{self.unread} unread {self.severity} alert(s) for user {self.user_id}"
+
+    @classmethod
+    def apply(cls, deltas):
+        """Add {(user_id, severity): delta} to the counters (F() increments)."""
+        for (user_id, severity), delta in deltas.items():
+            if delta:
+                add_deltas(cls, {"user_id": user_id, "severity": severity}, {"unread": delta}, create=delta > 0)
+
+    @classmethod
+    def unread_counts(cls, user_id):
+        """(severity, unread) pairs of one user; wrap in dict() (or iterate async)."""
+        return (
+            cls.objects.filter(user_id=user_id, unread__gt=0)
+            .order_by("severity")
+            .values_list("severity", "unread")
+        )
 
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recount from ProviderAlert (backfill / repair). Returns the rows written."""
+        alerts = ProviderAlert.objects.filter(reviewed=False)
+        counters = cls.objects.all()
+        if user_ids is not None:
+            alerts = alerts.filter(user_id__in=list(user_ids))
+            counters = counters.filter(user_id__in=list(user_ids))
+        rows = [
+            cls(user_id=user_id, severity=severity, unread=count)
+            for user_id, severity, count in (
+                alerts.order_by().values("user_id", "severity")
+                .annotate(count=models.Count("pk"))
+                .values_list("user_id", "severity", "count")
+            )
+        ]
+        with transaction.atomic():
+            counters.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
@@ -1,16 +1,22 @@
 # usermanagement/signals.py
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Profile
+from .models import Profile, ProviderAlert, ProviderAlertCounter
 
 User = get_user_model()
 
 @receiver(post_save, sender=User)
-def ensure_profile_exists(sender, instance, created, **kwargs):
-    # Create a profile when a new user is created
+def create_profile(sender, instance, created, **kwargs):
+    # Only new users need a profile; ordinary saves (e.g. the last_login
+    # update on every login) don't query Profile. ProfileModelBackend
+    # creates one for older users that lack it.
     if created:
         Profile.objects.get_or_create(user=instance)
-    else:
-        # For existing users, make sure there's a profile too
-        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_delete, sender=ProviderAlert)
+def alert_deleted(sender, instance, **kwargs):
+    # Deleting an unread alert takes it off the badge
+    if not instance.reviewed:
+        ProviderAlertCounter.apply({(instance.user_id, instance.severity): -1})
@@ -1,3 +1,204 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from healthdata.models import NutritionEntry
+from .models import ConsentingUser, Profile, ProviderAlert, ProviderAlertCounter, ProviderPatient
+from .utils import share_panel_with_provider
+from .views.health_alerts_views import ProviderAlertsView
+
+User = get_user_model()
+
+
+def make_user(username, consented=False):
+    user = User.objects.create_user(username, password="x")
+    if consented:
+        Profile.objects.get(user=user).set_consent(True)
+    return user
+
+
+class PanelSharingTests(TestCase):
+    def setUp(self):
+        self.provider = make_user("dr_who")
+        self.sharing = make_user("amy", consented=True)
+        self.declined = make_user("rory")
+        self.elsewhere = make_user("clara", consented=True)
+        for patient in (self.sharing, self.declined):
+            ProviderPatient.objects.create(provider=self.provider, patient=patient)
+
+    def test_only_panel_patients_are_shared(self):
+        ids = [self.sharing.pk, self.declined.pk, self.elsewhere.pk, 999999]
+        result = share_panel_with_provider(ids, self.provider)
+        self.assertEqual(result["shared"], ["amy"])
+        self.assertEqual((result["denied"], result["unavailable"]), (1, 2))
+        self.assertEqual(ProviderAlert.objects.filter(user=self.provider).count(), 1)
+
+    def test_no_selection_means_the_whole_panel(self):
+        result = share_panel_with_provider(None, self.provider)
+        self.assertEqual((result["shared"], result["denied"], result["unavailable"]), (["amy"], 1, 0))
+
+    def test_summary_ignores_future_days(self):
+        today = timezone.localdate()
+        for day, calories in ((today, 2000), (today - timedelta(days=1), 1000), (today + timedelta(days=3), 9000)):
+            NutritionEntry.objects.create(user=self.sharing, logged_at=day, meal_type="lunch", calories=calories)
+        [alert] = share_panel_with_provider([self.sharing.pk], self.provider)["alerts"]
+        self.assertIn("1500 kcal/day", alert.message)
+
+    def test_view_reports_declined_patients_as_a_count(self):
+        self.client.force_login(self.provider)
+        response = self.client.post(
+            reverse("request-sharing"), {"patient": [self.sharing.pk, self.declined.pk, self.elsewhere.pk]}
+        )
+        text = " ".join(str(message) for message in get_messages(response.wsgi_request))
+        self.assertIn("1 patient(s) have not consented", text)
+        self.assertIn("1 patient(s) are not on your panel", text)
+        self.assertNotIn("rory", text)
+        self.assertNotIn("clara", text)
+
+
+class ConsentTests(TestCase):
+    def setUp(self):
+        self.user = make_user("martha")
+        self.client.force_login(self.user)
+
+    def test_withdrawing_through_the_view_leaves_the_set(self):
+        self.client.post(reverse("consent"), {"consent": "yes"})
+        self.assertTrue(ConsentingUser.includes(self.user.pk))
+        self.client.post(reverse("consent"), {"consent": "no"})
+        self.assertFalse(ConsentingUser.includes(self.user.pk))
+        self.assertFalse(Profile.objects.get(user=self.user).data_sharing_consent)
+
+    def test_stale_instance_still_withdraws(self):
+        stale = Profile.objects.get(user=self.user)  # loaded before consenting
+        self.client.post(reverse("consent"), {"consent": "yes"})
+        stale.set_consent(False)
+        self.assertFalse(ConsentingUser.includes(self.user.pk))
+
+
+class ProfileBackendTests(TestCase):
+    def setUp(self):
+        self.user = make_user("donna")
+        self.client.force_login(self.user)
+
+    def test_profile_loads_with_the_user(self):
+        with self.assertNumQueries(2):  # session, user + profile
+            self.client.get(reverse("consent"))
+
+    def test_each_request_sees_the_current_profile(self):
+        self.client.get(reverse("consent"))
+        Profile.objects.filter(user=self.user).update(data_sharing_consent=True)
+        response = self.client.get(reverse("consent"))
+        self.assertTrue(response.wsgi_request.user.profile.data_sharing_consent)
+
+    def test_changes_made_elsewhere_survive_a_profile_save(self):
+        self.client.get(reverse("consent"))
+        Profile.objects.filter(user=self.user).update(weight_kg=75)
+        self.client.post(reverse("consent"), {"consent": "yes"})
+        self.client.post(reverse("consent"), {"consent": "no"})
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual((float(profile.weight_kg), profile.data_sharing_consent), (75.0, False))
+
+
+class AlertPagingTests(TestCase):
+    def setUp(self):
+        self.provider = make_user("rose")
+        ProviderAlert.objects.bulk_create([
+            ProviderAlert(user=self.provider, alert_type=f"Alert {n}", message="", severity=severity)
+            for n, severity in enumerate(["high", "low", "low", "moderate", "high", "low", "high"])
+        ])
+        # Ties on created_at must be broken by pk
+        tied = timezone.now()
+        ProviderAlert.objects.filter(user=self.provider).update(created_at=tied)
+        ProviderAlert.objects.filter(user=self.provider, alert_type="Alert 6").update(
+            created_at=tied - timedelta(minutes=1)
+        )
+        self.alerts = ProviderAlert.objects.filter(user=self.provider)
+
+    def unread(self):
+        return dict(ProviderAlertCounter.unread_counts(self.provider.pk))
+
+    def test_pages_cover_every_alert_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.alerts.page(cursor, size=3)
+            seen.extend(alert.pk for alert in page)
+            if cursor is None:
+                break
+        expected = list(self.alerts.order_by("-created_at", "-pk").values_list("pk", flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 7)
+
+    def test_counters_follow_inserts_reviews_and_deletes(self):
+        self.assertEqual(self.unread(), {"high": 3, "low": 3, "moderate": 1})
+        self.assertEqual(self.alerts.filter(severity="low").mark_reviewed(), 3)
+        self.assertEqual(self.alerts.filter(severity="low").mark_reviewed(), 0)
+        self.alerts.filter(severity="high").first().delete()
+        self.assertEqual(self.unread(), {"high": 2, "moderate": 1})
+
+        counted = sorted(ProviderAlertCounter.objects.filter(unread__gt=0).values_list("severity", "unread"))
+        ProviderAlertCounter.rebuild([self.provider.pk])
+        self.assertEqual(sorted(ProviderAlertCounter.objects.values_list("severity", "unread")), counted)
+
+    def test_review_view_only_touches_own_alerts(self):
+        alert = self.alerts.filter(severity="moderate").get()
+        self.client.force_login(make_user("mickey"))
+        self.client.post(reverse("provider_alert_review", args=[alert.pk]))
+        self.assertEqual(self.unread()["moderate"], 1)
+
+        self.client.force_login(self.provider)
+        self.client.post(reverse("provider_alert_review", args=[alert.pk]))
+        self.assertNotIn("moderate", self.unread())
+
+    def test_html_and_api_inboxes_page_alike(self):
+        self.client.force_login(self.provider)
+
+        def walk(url, next_page):
+            pages, cursor = [], None
+            while True:
+                ids, cursor = next_page(self.client.get(url, {"cursor": cursor, "size": 3} if cursor else {"size": 3}))
+                pages.append(ids)
+                if cursor is None:
+                    return pages
+
+        with mock.patch.object(ProviderAlertsView, "page_size", 3):
+            html = walk(reverse("provider_alerts"), lambda response: (
+                [alert.pk for alert in response.context["alerts"]], response.context["next_cursor"],
+            ))
+        api = walk(reverse("provider-alerts-list"), lambda response: (
+            [alert["id"] for alert in response.json()["results"]], response.json()["next_cursor"],
+        ))
+        self.assertEqual(html, api)
+        self.assertEqual([len(page) for page in html], [3, 3, 1])
+
+
+class AsyncAlertViewTests(TestCase):
+    def setUp(self):
+        self.provider = make_user("jack")
+        ProviderAlert.objects.bulk_create([
+            ProviderAlert(user=self.provider, alert_type="Sleep:Insufficient", message="", severity="low"),
+            ProviderAlert(user=self.provider, alert_type="Nutrition:LowIntake", message="", severity="moderate"),
+        ])
+
+    async def test_inbox_is_served_by_the_async_view(self):
+        await self.async_client.aforce_login(self.provider)
+        response = await self.async_client.get(reverse("provider_alerts"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["alerts"]), 2)
+        self.assertEqual(response.context["unread"], {"low": 1, "moderate": 1})
+
+    async def test_run_now_awaits_the_async_agent(self):
+        await self.async_client.aforce_login(self.provider)
+        agent = mock.AsyncMock(return_value=[object(), object()])
+        with mock.patch("usermanagement.views.health_alerts_views.aevaluate_user", agent):
+            response = await self.async_client.post(reverse("provider_alerts"), follow=True)
+        agent.assert_awaited_once()
+        self.assertIn("created 2 new alert(s)", " ".join(str(m) for m in response.context["messages"]))
 
-# Create your tests here.
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await self.async_client.get(reverse("provider_alerts"))
+        self.assertEqual(response.status_code, 302)
@@ -1,8 +1,11 @@
-from django.db.models import Avg
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Exists, OuterRef
 from django.utils import timezone
 from datetime import timedelta
-from .models import ProviderAlert
-from healthdata.models import NutritionEntry
+from .models import ConsentingUser, ProviderAlert
+from healthdata.cohort_export import DEFAULT_K, cohort_key
+from healthdata.models import DailyNutritionSummary
+from healthdata.rollups import recent_daily_averages
 
 
 # ---------------------------------------------------------------------
@@ -12,6 +15,10 @@ def share_user_data_with_insurer(user):
     """
     Share AGGREGATE data if user has consented.
 
+    Consenting users are included in the k-anonymized cohort export
+    (healthdata.cohort_export, `manage.py export_insurer_cohorts`); no
+    individual record ever leaves the system.
+
     Args:
         user: Django User instance (from request.user)
 
@@ -29,11 +36,14 @@ def share_user_data_with_insurer(user):
             "message": "User has not consented to data sharing."
         }
 
-    # TODO: Implement actual anonymization and API call to insurer
-    # For now, this is a placeholder simulation
+    age_band, sex, activity_level = cohort_key(profile)
     return {
         "status": "success",
-        "message": "Anonymized data shared successfully with insurer."
+        "message": (
+            f"Your data will be shared with insurers only as averages of your cohort "
+            f"({age_band}, {sex}, {activity_level.replace('_', ' ')}), and only if it has "
+            f"at least {DEFAULT_K} members."
+        ),
     }
 
 
@@ -51,17 +61,12 @@ def detect_health_patterns(user):
     Returns:
         ProviderAlert instance if created, None otherwise
     """
-    # Get last 7 nutrition entries
-    entries = NutritionEntry.objects.filter(
-        user=user
-    ).order_by('-logged_at')[:7]
+    # Average daily calories over the last 7 logged days (daily rollup)
+    days, avg_calories, _ = recent_daily_averages(user, days=7)
 
-    if not entries:
+    if not days:
         return None
 
-    # Calculate average calories
-    avg_calories = sum(e.calories for e in entries) / len(entries)
-
     # Check for concerning low calorie intake
     if avg_calories < 1000:
         # Avoid duplicate alerts (check last 7 days)
@@ -95,53 +100,79 @@ def detect_health_patterns(user):
 # ---------------------------------------------------------------------
 # 🤝 SHARE DATA WITH PROVIDER
 # ---------------------------------------------------------------------
-def share_user_data_with_provider(patient, provider):
+PANEL_SUMMARY_DAYS = 14
+
+
+def share_panel_with_provider(patient_ids, provider, days=PANEL_SUMMARY_DAYS):
     """
-    Share anonymized health data from patient to healthcare provider.
+    Share anonymized nutrition summaries of many patients with a provider.
+
+    Only patients on the provider's panel (ProviderPatient) are considered;
+    other ids are counted as unavailable, whether or not they exist, and
+    patients without consent are only counted, so the result reveals
+    nothing about them.
+
+    Costs three queries however many patients: one for panel membership
+    and consent (against the ConsentingUser set), one grouped aggregate over
+    the daily nutrition rollup for every consenting patient's averages, and
+    one bulk insert of the ProviderAlert rows.
 
     Args:
-        patient: Django User instance (the patient)
+        patient_ids: ids of the patients (Django User pks); None for the
+            provider's whole panel
         provider: Django User instance (the healthcare provider)
+        days: length of the summary window, in days
 
     Returns:
-        dict: {"status": "success/denied/error", "message": "..."}
+        dict: {"shared": [usernames], "denied": count, "unavailable": count,
+               "alerts": [ProviderAlert]}
     """
-    try:
-        patient_profile = patient.profile
-    except Exception as e:
-        return {"status": "error", "message": f"Patient profile not found: {e}"}
-
-    # Check patient consent
-    if not patient_profile.data_sharing_consent:
-        return {
-            "status": "denied",
-            "message": f"{patient.username} has not consented to data sharing."
-        }
-
-    # Gather anonymized summary
-    recent_entries = NutritionEntry.objects.filter(
-        user=patient
-    ).order_by('-logged_at')[:14]
-
-    if recent_entries:
-        avg_calories = sum(e.calories for e in recent_entries) / len(recent_entries)
-        avg_protein = sum(e.protein_g or 0 for e in recent_entries) / len(recent_entries)
-        summary = (
-            f"14-day averages: {avg_calories:.0f} kcal/day, "
-            f"{avg_protein:.1f}g protein/day"
-        )
-    else:
-        summary = "No recent nutrition data available"
-
-    # Create provider alert with summary
-    ProviderAlert.objects.create(
-        user=provider,
-        alert_type="Patient Data Shared",
-        message=f"Data from patient {patient.username}: {summary}",
-        severity="low",
+    patients = (
+        get_user_model().objects
+        .filter(provider_links__provider=provider)
+        .annotate(consented=Exists(ConsentingUser.objects.filter(user_id=OuterRef("pk"))))
+        .order_by("username")
     )
+    if patient_ids is not None:
+        patient_ids = set(patient_ids)
+        patients = patients.filter(pk__in=patient_ids)
+    patients = list(patients.values_list("pk", "username", "consented"))
+    usernames = {user_id: username for user_id, username, consented in patients if consented}
+
+    today = timezone.localdate()
+    since = today - timedelta(days=days)
+    averages = {
+        user_id: (avg_calories, avg_protein)
+        for user_id, avg_calories, avg_protein in (
+            DailyNutritionSummary.objects
+            .filter(user_id__in=list(usernames), date__gt=since, date__lte=today, entry_count__gt=0)
+            .order_by()
+            .values("user_id")
+            .annotate(avg_calories=Avg("calories"), avg_protein=Avg("protein_g"))
+            .values_list("user_id", "avg_calories", "avg_protein")
+        )
+    }
+
+    alerts = []
+    for user_id, username in usernames.items():
+        if user_id in averages:
+            avg_calories, avg_protein = averages[user_id]
+            summary = (
+                f"{days}-day averages: {avg_calories:.0f} kcal/day, "
+                f"{float(avg_protein):.1f}g protein/day"
+            )
+        else:
+            summary = "No recent nutrition data available"
+        alerts.append(ProviderAlert(
+            user=provider,
+            alert_type="Patient Data Shared",
+            message=f"Data from patient {username}: {summary}",
+            severity="low",
+        ))
 
     return {
-        "status": "success",
-        "message": f"Anonymized data from {patient.username} shared with {provider.username}."
-    }
\ No newline at end of file
+        "shared": list(usernames.values()),
+        "denied": len(patients) - len(usernames),
+        "unavailable": len(patient_ids) - len(patients) if patient_ids is not None else 0,
+        "alerts": ProviderAlert.objects.bulk_create(alerts, batch_size=500),
+    }
@@ -1,6 +1,8 @@
 from django.urls import path
 from usermanagement.views.consent_views import ConsentView
-from usermanagement.views.health_alerts_views import ProviderAlertsView, RequestDataSharingView
+from usermanagement.views.health_alerts_views import (
+    ProviderAlertReviewView, ProviderAlertsView, RequestDataSharingView,
+)
 
 urlpatterns = [
     # Consent page (patient)
@@ -8,6 +10,7 @@ urlpatterns = [
 
     # Provider alerts page (provider)
     path('provider/alerts/', ProviderAlertsView.as_view(), name='provider_alerts'),
+    path('provider/alerts/<int:pk>/review/', ProviderAlertReviewView.as_view(), name='provider_alert_review'),
 
     # Request data sharing (button on dashboard)
     path('request-sharing/', RequestDataSharingView.as_view(), name='request-sharing'),
@@ -2,7 +2,6 @@ from django.shortcuts import render, redirect
 from django.views import View
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.utils import timezone
 from usermanagement.utils import share_user_data_with_insurer
 
 
@@ -27,10 +26,8 @@ class ConsentView(LoginRequiredMixin, View):
         # Get consent value from form ('yes' or 'no')
         consent_value = (request.POST.get("consent") or "").strip().lower()
 
-        # Update profile consent flag
-        profile.data_sharing_consent = (consent_value == "yes")
-        profile.consent_timestamp = timezone.now()
-        profile.save()
+        # Update profile consent flag (and the consenting-user set)
+        profile.set_consent(consent_value == "yes")
 
         # Provide feedback
         if profile.data_sharing_consent:
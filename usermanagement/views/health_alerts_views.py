@@ -1,75 +1,105 @@
+from asgiref.sync import sync_to_async
 from django.views import View
 from django.shortcuts import render, redirect
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import AccessMixin
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.contrib.auth import get_user_model
-from usermanagement.models import ProviderAlert
-from usermanagement.utils import detect_health_patterns, share_user_data_with_provider
-from healthdata.ai_agent import evaluate_user
+from usermanagement.models import ProviderAlert, ProviderAlertCounter
+from usermanagement.utils import share_panel_with_provider
+from healthdata.ai_agent import aevaluate_user
 
-User = get_user_model()
 
+class AsyncLoginRequiredMixin(AccessMixin):
+    """LoginRequiredMixin for async views: resolves the user with request.auser()."""
 
-class ProviderAlertsView(LoginRequiredMixin, View):
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
+        # Already loaded: templates reading request.user must not query again
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ProviderAlertsView(AsyncLoginRequiredMixin, View):
     """Display health alerts for the current user (acting as provider)."""
     template_name = "usermanagement/provider_alerts.html"
+    page_size = 25
 
-    def get(self, request):
+    async def get(self, request):
         user = request.user
 
+        # Rules run in the background worker whenever the user's data
+        # changes (healthdata.scheduler); the page only reads their alerts.
 
-        # ✅ Run the new AI agent (creates alerts if needed)
-        evaluate_user(user)
-
-        # Run pattern detection on current user's data
-        detect_health_patterns(user)
-
-        # Get all alerts for current user
-        alerts = ProviderAlert.objects.filter(
-            user=user
-        ).order_by('-created_at')
-
-        return render(request, self.template_name, {"alerts": alerts})
-
-    def post(self, request):
+        # One keyset page of the user's alerts (?cursor=..., ?show=unread)
+        alerts = ProviderAlert.objects.filter(user=user)
+        unread_only = request.GET.get("show") == "unread"
+        if unread_only:
+            alerts = alerts.filter(reviewed=False)
+        try:
+            page, next_cursor = await sync_to_async(alerts.page)(request.GET.get("cursor"), size=self.page_size)
+        except ValueError:
+            page, next_cursor = await sync_to_async(alerts.page)(size=self.page_size)
+
+        unread = {severity: count async for severity, count in ProviderAlertCounter.unread_counts(user.pk)}
+        return render(request, self.template_name, {
+            "alerts": page,
+            "next_cursor": next_cursor,
+            "unread_only": unread_only,
+            "unread": unread,
+            "unread_total": sum(unread.values()),
+        })
+
+    async def post(self, request):
         """
         Clicking 'Run AI now' calls the agent immediately.
         Stays on the same page and shows a toast/flash message.
         """
         user = request.user
-        created = evaluate_user(user)  # your function can return a count or None
+        created = await aevaluate_user(user, force=True)  # your function can return a count or None
 
         if created:
-            messages.success(request, f"AI ran successfully and created {created} new alert(s).")
+            messages.success(request, f"AI ran successfully and created {len(created)} new alert(s).")
         else:
             messages.info(request, "AI ran successfully. No new alerts were needed.")
         return redirect("provider_alerts")
 
-class RequestDataSharingView(LoginRequiredMixin, View):
-    """Simulate requesting data from another user (patient)."""
+class ProviderAlertReviewView(AsyncLoginRequiredMixin, View):
+    """Mark one of the current user's alerts as reviewed."""
+
+    async def post(self, request, pk):
+        alerts = ProviderAlert.objects.filter(user=request.user, pk=pk)
+        if await sync_to_async(alerts.mark_reviewed)():
+            messages.success(request, "Alert marked as reviewed.")
+        return redirect("provider_alerts")
+
+
+class RequestDataSharingView(AsyncLoginRequiredMixin, View):
+    """Request data from patients on the provider's panel (POST `patient` ids, repeatable; none = all)."""
 
-    def post(self, request):
+    async def post(self, request):
         provider = request.user
 
         try:
-            # In production, you'd select a specific patient
-            # For demo: just grab another user
-            patient = User.objects.exclude(id=provider.id).first()
-
-            if not patient:
-                messages.error(request, "No other users found in system.")
-                return redirect('provider_alerts')
-
-            # Attempt to share data
-            result = share_user_data_with_provider(patient, provider)
-
-            # Display result
-            if result["status"] == "success":
-                messages.success(request, result["message"])
-            elif result["status"] == "denied":
-                messages.warning(request, result["message"])
-            else:
-                messages.error(request, result["message"])
+            # No selection: the provider's whole panel
+            patient_ids = [int(pk) for pk in request.POST.getlist("patient") if pk.isdigit()] or None
+
+            # Share the whole panel at once (panel- and consent-aware)
+            result = await sync_to_async(share_panel_with_provider)(patient_ids, provider)
+
+            # Display result (counts only for patients we may not name)
+            if result["shared"]:
+                messages.success(
+                    request,
+                    f"Anonymized data from {len(result['shared'])} patient(s) shared with {provider.username}."
+                )
+            if result["denied"]:
+                messages.warning(request, f"{result['denied']} patient(s) have not consented to data sharing.")
+            if result["unavailable"]:
+                messages.error(request, f"{result['unavailable']} patient(s) are not on your panel.")
+            if not (result["shared"] or result["denied"] or result["unavailable"]):
+                messages.error(request, "No patients on your panel.")
 
         except Exception as e:
             messages.error(request, f"Unexpected error: {e}")